@@ -1,3 +1,5 @@
+import logging
+
 from flask import Flask
 from flask import session
 import os
@@ -13,11 +15,64 @@ def create_app():
     from config import Config
     app.config.from_object(Config)
 
-    # Установка ключа для сессии
-    app.secret_key = "mysecretkey"
+    # Логирование в формате "событие ключ=значение"
+    logging.basicConfig(
+        level=app.config["LOG_LEVEL"],
+        format="%(asctime)s %(levelname)s %(name)s %(message)s"
+    )
+
+    # Пул соединений с базой данных
+    from .services import db_service
+    db_service.init_app(app)
+
+    # Хеширование паролей в ограниченном пуле потоков
+    from .services import passwords
+    passwords.init_app(app)
+
+    # Сессии на сервере: в cookie только id сессии
+    from .services import sessions
+    sessions.init_app(app)
+
+    # Миграции схемы при старте (иначе flask db-migrate)
+    if app.config["MIGRATE_ON_STARTUP"]:
+        from .services import migrations
+        with app.app_context():
+            connection = db_service.get_db_connection()
+            migrations.migrate(connection)
+            migrations.report_missing_indexes(connection)
+        # Под gunicorn с preload_app это мастер-процесс: его соединения
+        # не должны достаться рабочим процессам после fork
+        app.extensions.pop('db_pool').closeall()
+
+    # Реестр подготовленных запросов и статистика по ним
+    from .services import queries
+    queries.init_app(app)
+
+    # Метрики запросов (/metrics)
+    from .services import metrics
+    metrics.init_app(app)
+
+    # Кеш представлений приключений и кампаний
+    from .services import cache
+    cache.init_app(app)
+
+    # Рассылка сбросов кеша между процессами (LISTEN/NOTIFY)
+    from .services import cache_sync
+    cache_sync.init_app(app)
+
+    # Кеш отрендеренных фрагментов шаблонов ({% cache %})
+    from .services import fragment_cache
+    fragment_cache.init_app(app)
+
+    # Команды командной строки (flask import-adventures ...)
+    from . import cli
+    cli.init_app(app)
 
     # Регистрация блюпринтов (маршрутов)
     from .routes.main import main_bp
     app.register_blueprint(main_bp)
 
+    from .routes.api import api_bp
+    app.register_blueprint(api_bp)
+
     return app
@@ -0,0 +1,93 @@
+import asyncio
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart
+from quart.sessions import SessionInterface
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+from app import create_app
+
+
+class AsyncDispatcher:
+    """
+    ASGI-приложение, которое отдаёт асинхронные маршруты Quart-приложению,
+    а все остальные запросы — синхронному Flask-приложению в пуле потоков.
+    """
+
+    def __init__(self, async_app, wsgi_app, max_body_size):
+        self.async_app = async_app
+        self.wsgi_app = AsyncioWSGIMiddleware(wsgi_app, max_body_size=max_body_size)
+        self.async_endpoints = {
+            endpoint for endpoint, view in async_app.view_functions.items()
+            if view is not _sync_only
+        }
+
+    def _is_async(self, scope):
+        adapter = self.async_app.url_map.bind('')
+        try:
+            endpoint, _ = adapter.match(scope['path'], method=scope['method'])
+        except (HTTPException, RequestRedirect):
+            return False
+        return endpoint in self.async_endpoints
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and not self._is_async(scope):
+            await self.wsgi_app(scope, receive, send)
+        else:
+            await self.async_app(scope, receive, send)
+
+
+class AsyncSessionInterface(SessionInterface):
+    """
+    Серверные сессии Flask-приложения для Quart: то же хранилище и тот же
+    cookie, обращения к хранилищу — в пуле потоков.
+    """
+
+    def __init__(self, interface):
+        self.interface = interface
+
+    async def open_session(self, app, request):
+        return await asyncio.to_thread(self.interface.open_session, app, request)
+
+    async def save_session(self, app, session, response):
+        if response is not None:
+            await asyncio.to_thread(self.interface.save_session, app, session, response)
+
+
+def _sync_only(**kwargs):
+    raise RuntimeError("This endpoint is served by the WSGI application")
+
+
+def create_asgi_app():
+    """
+    Создаёт приложение для ASGI-сервера (hypercorn/uvicorn).
+
+    Маршруты чтения обслуживаются асинхронно через psycopg 3, остальные
+    маршруты main_bp — прежним синхронным Flask-приложением, поэтому
+    синхронный режим (`run.py`) продолжает работать без изменений.
+    """
+    flask_app = create_app()
+
+    app = Quart(__name__)
+    app.config.from_mapping(flask_app.config)
+    app.secret_key = flask_app.secret_key
+    app.session_interface = AsyncSessionInterface(flask_app.session_interface)
+
+    from .services import async_db_service
+    async_db_service.init_app(app)
+
+    # Тег {% cache %} в шаблонах, кеш общий с Flask-приложением
+    from .services import fragment_cache
+    fragment_cache.init_app(app, flask_app.extensions.get('fragment_cache'))
+
+    from .routes.async_main import async_main_bp
+    app.register_blueprint(async_main_bp)
+
+    # Правила синхронных маршрутов нужны Quart только для url_for в шаблонах.
+    for rule in flask_app.url_map.iter_rules():
+        if rule.endpoint not in app.view_functions and rule.endpoint != 'static':
+            app.add_url_rule(rule.rule, endpoint=rule.endpoint, view_func=_sync_only,
+                             methods=rule.methods)
+
+    return AsyncDispatcher(app, flask_app, flask_app.config['ASGI_MAX_BODY_SIZE'])
@@ -0,0 +1,174 @@
+import json
+import signal
+import time
+
+import click
+from flask import current_app
+
+from app.services import jobs, migrations, sessions
+from app.services.db_service import delete_adventures, get_db_connection, hash_legacy_passwords
+from app.services.import_service import AdventureImportError, import_adventures, parse_file
+
+
+@click.command('import-adventures')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--author-id', type=int, default=None,
+              help="id пользователя-автора для всех приключений (иначе поле author)")
+@click.option('--batch-size', type=int, default=1000, show_default=True)
+def import_adventures_command(path, author_id, batch_size):
+    """
+    Импортирует приключения из JSON или CSV файла одной транзакцией.
+    """
+    started = time.perf_counter()
+    try:
+        with open(path, encoding='utf-8') as file:
+            records = parse_file(path, file.read())
+        count = import_adventures(records, userid=author_id, batch_size=batch_size)
+    except AdventureImportError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - started
+    click.echo(f"Imported {count} adventures in {elapsed:.2f}s ({count / elapsed:.0f} adventures/sec)")
+
+
+@click.command('delete-adventures')
+@click.argument('adventure_ids', type=int, nargs=-1, required=True)
+def delete_adventures_command(adventure_ids):
+    """
+    Удаляет приключения каскадом (без проверки авторства).
+    """
+    deleted = delete_adventures(adventure_ids)
+    click.echo(f"Deleted {len(deleted)} adventures: {', '.join(map(str, deleted)) or '-'}")
+
+
+@click.command('db-migrate')
+@click.option('--target', type=int, default=None, help="Применить миграции до этой версии включительно")
+def db_migrate_command(target):
+    """
+    Применяет миграции из каталога migrations/.
+    """
+    connection = get_db_connection()
+    try:
+        applied = migrations.migrate(connection, target=target)
+    except migrations.MigrationError as e:
+        raise click.ClickException(str(e))
+    for version, name in applied:
+        click.echo(f"Applied {version:03d}_{name}")
+    if not applied:
+        click.echo("Schema is up to date")
+
+
+@click.command('db-status')
+def db_status_command():
+    """
+    Показывает применённые и ожидающие миграции и недостающие индексы.
+    """
+    connection = get_db_connection()
+    applied = migrations.applied_migrations(connection)
+    for version, name, _ in migrations.list_migrations():
+        if version in applied:
+            click.echo(f"  applied  {version:03d}_{name}  {applied[version][2]:%Y-%m-%d %H:%M}")
+        else:
+            click.echo(f"  pending  {version:03d}_{name}")
+
+    missing = migrations.missing_indexes(connection)
+    for table, columns, query_names in missing:
+        click.echo(f"Missing index on {table} ({', '.join(columns)}), used by {', '.join(query_names)}")
+    if missing:
+        raise SystemExit(1)
+
+
+@click.command('sessions-revoke')
+@click.argument('user_id', type=int)
+def sessions_revoke_command(user_id):
+    """
+    Завершает все сессии пользователя.
+    """
+    click.echo(f"Revoked {sessions.revoke_user_sessions(user_id)} sessions")
+
+
+@click.command('sessions-purge')
+def sessions_purge_command():
+    """
+    Удаляет просроченные сессии (для SESSION_BACKEND = 'postgres').
+    """
+    click.echo(f"Purged {sessions.purge_expired_sessions()} expired sessions")
+
+
+@click.command('passwords-hash-legacy')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+def passwords_hash_legacy_command(batch_size):
+    """
+    Хеширует пароли, оставшиеся в открытом виде с до-хешевых времён.
+    """
+    click.echo(f"Hashed {hash_legacy_passwords(batch_size)} legacy passwords")
+
+
+@click.command('jobs-worker')
+@click.option('--concurrency', type=int, default=1, show_default=True, help="Потоков выполнения задач")
+@click.option('--kind', 'kinds', multiple=True, type=click.Choice(sorted(jobs.JOB_HANDLERS)),
+              help="Выполнять только задачи этого вида (можно повторять)")
+@click.option('--once', is_flag=True, help="Выполнить готовые задачи и выйти")
+def jobs_worker_command(concurrency, kinds, once):
+    """
+    Выполняет фоновые задачи из очереди до SIGINT/SIGTERM.
+    """
+    worker = jobs.JobWorker(current_app._get_current_object(), kinds=kinds, concurrency=concurrency)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    try:
+        worker.run(once=once)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@click.command('jobs-enqueue')
+@click.argument('kind', type=click.Choice(sorted(jobs.JOB_HANDLERS)))
+@click.option('--payload', default='{}', help="Параметры задачи в JSON")
+def jobs_enqueue_command(kind, payload):
+    """
+    Ставит задачу в очередь, например flask jobs-enqueue refresh_catalogue.
+    """
+    try:
+        payload = json.loads(payload)
+    except json.JSONDecodeError as e:
+        raise click.BadParameter(str(e), param_hint='--payload')
+    click.echo(f"Queued job {jobs.enqueue(kind, payload)}")
+
+
+@click.command('jobs-status')
+@click.argument('job_id', type=int)
+def jobs_status_command(job_id):
+    """
+    Показывает состояние задачи.
+    """
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise click.ClickException(f"No job {job_id}")
+    click.echo(f"{job.id} {job.kind} {job.status} attempts={job.attempts}/{job.max_attempts}")
+    if job.last_error:
+        click.echo(f"error: {job.last_error}")
+    if job.result is not None:
+        click.echo(f"result: {json.dumps(job.result)}")
+
+
+@click.command('jobs-purge')
+@click.option('--days', type=int, default=None, help="Хранить завершённые задачи столько дней (JOBS_KEEP_DAYS)")
+def jobs_purge_command(days):
+    """
+    Удаляет давно завершённые задачи.
+    """
+    days = days if days is not None else current_app.config["JOBS_KEEP_DAYS"]
+    click.echo(f"Purged {jobs.purge_jobs(days)} finished jobs")
+
+
+def init_app(app):
+    app.cli.add_command(import_adventures_command)
+    app.cli.add_command(delete_adventures_command)
+    app.cli.add_command(db_migrate_command)
+    app.cli.add_command(db_status_command)
+    app.cli.add_command(sessions_revoke_command)
+    app.cli.add_command(sessions_purge_command)
+    app.cli.add_command(passwords_hash_legacy_command)
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(jobs_enqueue_command)
+    app.cli.add_command(jobs_status_command)
+    app.cli.add_command(jobs_purge_command)
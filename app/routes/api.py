@@ -0,0 +1,356 @@
+import orjson
+import psycopg2
+from flask import Blueprint, current_app, request, session
+
+from app.services.db_service import (
+    add_campaign_characters, add_campaign_players, character_row, create_adventure_rows, create_player_characters,
+    delete_adventure_rows, get_adventure_version, get_adventure_with_version, get_adventures_page,
+    get_all_campaigns, get_campaign, get_campaign_version, is_adventure_author, is_campaign_author, transaction,
+    update_adventures
+)
+from app.services.http_cache import add_validators, make_etag, not_modified
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+@api_bp.errorhandler(ApiError)
+def handle_api_error(error):
+    return json_response({'error': str(error), **error.details}, error.status)
+
+
+def json_response(data, status=200):
+    """
+    Компактный JSON-ответ: orjson, без пробелов и отступов.
+    """
+    body = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return current_app.response_class(body, status=status, mimetype='application/json')
+
+
+def select_fields(item, allowed):
+    """
+    Оставляет в `item` только поля из параметра ?fields=a,b (sparse fieldset).
+    """
+    fields = request.args.get('fields')
+    if not fields:
+        return item
+    requested = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in requested if field not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}", allowed=list(allowed))
+    return {field: item[field] for field in requested}
+
+
+def require_user():
+    user_id = session.get('userid')
+    if not user_id:
+        raise ApiError("Authentication required", 401)
+    return user_id
+
+
+ADVENTURE_LIST_FIELDS = ('id', 'name', 'author', 'npc_count', 'location_count', 'campaign_count', 'updated_at')
+ADVENTURE_FIELDS = ('id', 'name', 'story', 'npcs', 'locations')
+CAMPAIGN_LIST_FIELDS = ('id', 'name')
+CAMPAIGN_FIELDS = ('id', 'name', 'story', 'author', 'is_author', 'npcs', 'locations', 'players', 'characters')
+
+
+@api_bp.route('/adventures', methods=['GET'])
+def list_adventures():
+    limit = request.args.get('limit', current_app.config['ADVENTURES_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['ADVENTURES_PAGE_SIZE']))
+    page, next_cursor, _ = get_adventures_page(
+        request.args.get('q'),
+        request.args.get('search_name'),
+        request.args.get('search_author'),
+        cursor=request.args.get('cursor'),
+        limit=limit,
+        sort=request.args.get('sort')
+    )
+    items = [
+        select_fields(dict(zip(ADVENTURE_LIST_FIELDS, row)), ADVENTURE_LIST_FIELDS)
+        for row in page
+    ]
+    return json_response({'items': items, 'next_cursor': next_cursor})
+
+
+@api_bp.route('/adventures/<int:adventure_id>', methods=['GET'])
+def adventure_detail(adventure_id):
+    version = get_adventure_version(adventure_id)
+    if not version:
+        raise ApiError("Adventure not found", 404)
+    cached_response = not_modified(make_etag('api-adventure', adventure_id, version.revision), version.updated_at)
+    if cached_response:
+        return cached_response
+
+    # ETag ответа — по версии, загруженной вместе с данными
+    adventure, npcs, locations, version = get_adventure_with_version(adventure_id)
+    if not adventure:
+        raise ApiError("Adventure not found", 404)
+    item = select_fields(dict(adventure, npcs=npcs, locations=locations), ADVENTURE_FIELDS)
+    return add_validators(json_response(item), make_etag('api-adventure', adventure_id, version.revision),
+                          version.updated_at)
+
+
+@api_bp.route('/campaigns', methods=['GET'])
+def list_campaigns():
+    user_id = require_user()
+    items = [
+        select_fields({'id': campaign_id, 'name': name}, CAMPAIGN_LIST_FIELDS)
+        for campaign_id, name in get_all_campaigns(user_id)
+    ]
+    return json_response({'items': items})
+
+
+@api_bp.route('/campaigns/<int:campaign_id>', methods=['GET'])
+def campaign_detail(campaign_id):
+    user_id = require_user()
+    version = get_campaign_version(user_id, campaign_id)
+    if not version:
+        raise ApiError("Campaign not found or you are not a member", 404)
+    cached_response = not_modified(make_etag('api-campaign', campaign_id, version.revision), version.updated_at)
+    if cached_response:
+        return cached_response
+
+    campaign = get_campaign(user_id, campaign_id)
+    if not campaign:
+        raise ApiError("Campaign not found or you are not a member", 404)
+    name, story, author = campaign.campaign_info
+    item = select_fields({
+        'id': campaign.campaign_id,
+        'name': name,
+        'story': story,
+        'author': author,
+        'is_author': campaign.is_author,
+        'npcs': [{'name': npc, 'description': description} for npc, description in campaign.npcs],
+        'locations': [
+            {'name': location, 'description': description} for location, description in campaign.locations
+        ],
+        'players': [{'login': login, 'is_author': is_author} for login, is_author in campaign.players],
+        'characters': [
+            {'name': character, 'class': character_class, 'level': level}
+            for character, character_class, level in campaign.characters
+        ],
+    }, CAMPAIGN_FIELDS)
+    version = campaign.version
+    return add_validators(json_response(item), make_etag('api-campaign', campaign_id, version.revision),
+                          version.updated_at)
+
+
+# Операции пакетного изменения: обязательные поля, сущность, к которой
+# относится операция (автором которой должен быть пользователь), строка
+# операции для пакетного запроса и запрос, применяющий все строки вида разом
+OPERATIONS = {
+    'create_npc': (
+        ('adventure_id', 'name'), 'adventure_id',
+        lambda op: (op['adventure_id'], op['name'], op.get('description')),
+        lambda rows: create_adventure_rows('npcs', rows)
+    ),
+    'delete_npc': (
+        ('adventure_id', 'id'), 'adventure_id',
+        lambda op: (op['adventure_id'], int(op['id'])),
+        lambda rows: delete_adventure_rows('npcs', rows)
+    ),
+    'create_location': (
+        ('adventure_id', 'name'), 'adventure_id',
+        lambda op: (op['adventure_id'], op['name'], op.get('description')),
+        lambda rows: create_adventure_rows('locations', rows)
+    ),
+    'delete_location': (
+        ('adventure_id', 'id'), 'adventure_id',
+        lambda op: (op['adventure_id'], int(op['id'])),
+        lambda rows: delete_adventure_rows('locations', rows)
+    ),
+    'update_adventure': (
+        ('adventure_id', 'name', 'story'), 'adventure_id',
+        lambda op: (op['adventure_id'], op['name'], op['story']),
+        update_adventures
+    ),
+    'create_character': (
+        ('campaign_id', 'name', 'level', 'class', 'armor', 'hp'), 'campaign_id',
+        lambda op: character_row(op['campaign_id'], op),
+        create_player_characters
+    ),
+}
+
+# Поля операций по типу значения: текст (или null) и целые числа, которые
+# могут прийти и строкой из формы
+TEXT_FIELDS = ('name', 'description', 'story', 'class', 'skills')
+INTEGER_FIELDS = ('id', 'level', 'armor', 'hp')
+
+# Ошибки базы по данным операции: статус ответа
+DATABASE_ERRORS = {
+    psycopg2.IntegrityError: 409,
+    psycopg2.DataError: 400,
+}
+
+
+def validate_operations(operations):
+    if not isinstance(operations, list) or not operations:
+        raise ApiError("'operations' must be a non-empty list")
+    if len(operations) > current_app.config['API_BATCH_MAX_OPERATIONS']:
+        raise ApiError(f"At most {current_app.config['API_BATCH_MAX_OPERATIONS']} operations per batch")
+
+    for index, operation in enumerate(operations):
+        op = operation.get('op') if isinstance(operation, dict) else None
+        if not isinstance(op, str) or op not in OPERATIONS:
+            raise ApiError("Unknown operation", index=index, known=sorted(OPERATIONS))
+        required, owner_key = OPERATIONS[op][:2]
+        missing = [key for key in required if operation.get(key) in (None, '')]
+        if missing:
+            raise ApiError(f"Missing fields: {', '.join(missing)}", index=index)
+        if not _is_integer(operation[owner_key]):
+            raise ApiError(f"'{owner_key}' must be an integer", index=index)
+        for key in TEXT_FIELDS:
+            if operation.get(key) is not None and not isinstance(operation[key], str):
+                raise ApiError(f"'{key}' must be a string", index=index)
+        for key in INTEGER_FIELDS:
+            value = operation.get(key)
+            if value is not None and not _is_integer(value) and not isinstance(value, str):
+                raise ApiError(f"'{key}' must be an integer", index=index)
+
+
+def _is_integer(value):
+    # bool — подкласс int, но true вместо id почти наверняка ошибка клиента
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def apply_operations(user_id, operations):
+    """
+    Проверяет права на все затронутые приключения и кампании по кешу
+    прав пользователя и применяет операции в одной транзакции: либо все,
+    либо ни одной.
+
+    Операции одного вида выполняются одним запросом, виды — в порядке
+    первого появления в списке. Удаления адресуют строки по id, поэтому
+    от порядка результат не зависит.
+    """
+    validate_operations(operations)
+
+    groups = {}
+    for index, operation in enumerate(operations):
+        _, owner_key, make_row, _ = OPERATIONS[operation['op']]
+        is_author = is_adventure_author if owner_key == 'adventure_id' else is_campaign_author
+        if not is_author(operation[owner_key], user_id):
+            raise ApiError("Forbidden", 403, index=index)
+        try:
+            row = make_row(operation)
+        except (TypeError, ValueError) as e:
+            raise ApiError(str(e), index=index)
+        indexes, rows = groups.setdefault(operation['op'], ([], []))
+        indexes.append(index)
+        rows.append(row)
+
+    failed = None
+    try:
+        with transaction():
+            for kind, (indexes, rows) in groups.items():
+                try:
+                    OPERATIONS[kind][3](rows)
+                except tuple(DATABASE_ERRORS):
+                    failed = kind, indexes, rows
+                    raise
+    except tuple(DATABASE_ERRORS) as e:
+        status = next(status for error, status in DATABASE_ERRORS.items() if isinstance(e, error))
+        # Отложенные ограничения падают при фиксации, вне запросов видов
+        details = {'index': _failed_index(*failed)} if failed else {}
+        raise ApiError(e.diag.message_primary or str(e), status, **details)
+    return [{'index': index, 'op': operation['op'], 'status': 'ok'} for index, operation in enumerate(operations)]
+
+
+class _Probe(Exception):
+    pass
+
+
+def _failed_index(kind, indexes, rows):
+    """
+    Индекс операции, на которой падает пакетный запрос вида `kind`: строки
+    повторяются по одной в откатываемых транзакциях. Выполняется только
+    после ошибки; если по одной строки проходят, ошибка относится ко всем,
+    и возвращается индекс первой.
+    """
+    for index, row in zip(indexes, rows):
+        try:
+            with transaction():
+                OPERATIONS[kind][3]([row])
+                raise _Probe
+        except tuple(DATABASE_ERRORS):
+            return index
+        except _Probe:
+            pass
+    return indexes[0]
+
+
+@api_bp.route('/batch', methods=['POST'])
+def batch():
+    """
+    Применяет список операций над NPC, локациями, приключениями
+    и персонажами одним запросом и одной транзакцией:
+
+        {"operations": [{"op": "create_npc", "adventure_id": 1, "name": "...", "description": "..."},
+                        {"op": "create_character", "campaign_id": 2, "name": "...", "level": 1, ...}]}
+    """
+    user_id = require_user()
+    payload = request.get_json(silent=True) or {}
+    results = apply_operations(user_id, payload.get('operations'))
+    return json_response({'results': results})
+
+
+@api_bp.route('/adventures/<int:adventure_id>/npcs', methods=['POST'])
+def add_npc(adventure_id):
+    user_id = require_user()
+    operation = dict(request.get_json(silent=True) or {}, op='create_npc', adventure_id=adventure_id)
+    apply_operations(user_id, [operation])
+    return json_response({'status': 'created'}, 201)
+
+
+@api_bp.route('/adventures/<int:adventure_id>/locations', methods=['POST'])
+def add_location(adventure_id):
+    user_id = require_user()
+    operation = dict(request.get_json(silent=True) or {}, op='create_location', adventure_id=adventure_id)
+    apply_operations(user_id, [operation])
+    return json_response({'status': 'created'}, 201)
+
+
+@api_bp.route('/campaigns/<int:campaign_id>/characters', methods=['POST'])
+def add_character(campaign_id):
+    user_id = require_user()
+    operation = dict(request.get_json(silent=True) or {}, op='create_character', campaign_id=campaign_id)
+    apply_operations(user_id, [operation])
+    return json_response({'status': 'created'}, 201)
+
+
+@api_bp.route('/campaigns/<int:campaign_id>/onboard', methods=['POST'])
+def onboard(campaign_id):
+    """
+    Добавляет в кампанию игроков и персонажей одним запросом и одной
+    транзакцией:
+
+        {"players": ["login", ...],
+         "characters": [{"name": "...", "level": 1, "class": "...", "armor": 12, "hp": 10}]}
+
+    Ошибки отдельных элементов (неизвестный логин, неверные поля
+    персонажа) возвращаются в результатах, остальные элементы добавляются.
+    """
+    user_id = require_user()
+    payload = request.get_json(silent=True) or {}
+    players = payload.get('players', [])
+    characters = payload.get('characters', [])
+    if not isinstance(players, list) or not all(isinstance(login, str) for login in players):
+        raise ApiError("'players' must be a list of logins")
+    if not isinstance(characters, list):
+        raise ApiError("'characters' must be a list")
+    if len(players) + len(characters) > current_app.config['API_BATCH_MAX_OPERATIONS']:
+        raise ApiError(f"At most {current_app.config['API_BATCH_MAX_OPERATIONS']} items per batch")
+    if not is_campaign_author(campaign_id, user_id):
+        raise ApiError("Forbidden", 403)
+
+    with transaction():
+        player_results = add_campaign_players(campaign_id, players) if players else []
+        character_results = add_campaign_characters(campaign_id, characters) if characters else []
+    return json_response({'players': player_results, 'characters': character_results})
@@ -0,0 +1,98 @@
+import asyncio
+
+from quart import Blueprint, render_template, request, jsonify, redirect, url_for, session, current_app
+
+from app.services import async_db_service as db
+
+# Асинхронные варианты маршрутов чтения из main_bp. Имя блюпринта то же,
+# чтобы url_for('main.…') в шаблонах работал одинаково в обоих режимах.
+async_main_bp = Blueprint('main', __name__)
+
+
+@async_main_bp.route('/me', methods=['GET'])
+async def me():
+    return jsonify({key: session[key] for key in ('userid', 'login', 'role') if key in session})
+
+
+@async_main_bp.route('/adventures', methods=['GET'])
+async def adventures():
+    search_query = request.args.get('q', None)
+    search_name = request.args.get('search_name', None)
+    search_author = request.args.get('search_author', None)
+
+    page, next_cursor = await db.get_adventures_page(
+        search_query,
+        search_name,
+        search_author,
+        cursor=request.args.get('cursor'),
+        limit=current_app.config['ADVENTURES_PAGE_SIZE'],
+        sort=request.args.get('sort')
+    )
+
+    return await render_template('adventures.html',
+                                 adventures=page,
+                                 user_role=session.get('role', None),
+                                 search_query=search_query,
+                                 search_name=search_name,
+                                 search_author=search_author,
+                                 sort=request.args.get('sort'),
+                                 next_cursor=next_cursor)
+
+
+@async_main_bp.route('/adventures/<int:adventure_id>', methods=['GET'])
+async def view_adventure(adventure_id):
+    (adventure, npcs, locations), is_author = await asyncio.gather(
+        db.get_adventure(adventure_id),
+        db.is_adventure_author(adventure_id, session.get('userid', None))
+    )
+
+    if not adventure:
+        return """
+            <h1 style="width:100%; text-align: center;">No such adventure :(</h1>
+            """, 404
+
+    return await render_template(
+        'adventure_detail.html',
+        adventure=adventure,
+        npcs=npcs,
+        locations=locations,
+        user_is_logged_in=True,
+        user_role=session.get('role', None),
+        is_author=is_author
+    )
+
+
+@async_main_bp.route('/campaigns', methods=['GET'])
+async def campaigns():
+    if not session:
+        return redirect(url_for('main.login'))
+
+    my_campaigns = await db.get_all_campaigns(session.get('userid'))
+
+    return await render_template(
+        'campaigns.html',
+        campaigns=my_campaigns,
+    )
+
+
+@async_main_bp.route('/campaigns/<int:campaign_id>', methods=['GET'])
+async def campaign_detail(campaign_id):
+    if not session:
+        return redirect(url_for('main.login'))
+
+    campaign = await db.get_campaign(session.get('userid'), campaign_id)
+    if not campaign:
+        return """
+        <h1 style="width:100%; text-align: center;">This campaign not exist or you not a member of campaign</h1>
+        """, 400
+
+    return await render_template(
+        'campaign_detail.html',
+        campaign_info=campaign.campaign_info,
+        npcs=campaign.npcs,
+        locations=campaign.locations,
+        players=campaign.players,
+        characters=campaign.characters,
+        is_author=campaign.is_author,
+        campaign_id=campaign.campaign_id
+    )
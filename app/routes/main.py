@@ -1,12 +1,33 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, session
+import csv
+import functools
+import hmac
+import io
+import logging
+import re
+
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, session, current_app
+from flask import Response, make_response, stream_template, stream_with_context
+from markupsafe import escape
 from app.services.db_service import *
+from app.services.fragment_cache import get_fragment_cache_stats
+from app.services.http_cache import add_validators, make_etag, not_modified
+from app.services.import_service import AdventureImportError, parse_file, validate_records
+from app.services.jobs import get_job, submit
+from app.services.metrics import render_metrics
+from app.services.passwords import PasswordHasherBusy
+from app.services.queries import get_query_stats, get_slow_query_plans
 
 main_bp = Blueprint('main', __name__)
 
+logger = logging.getLogger(__name__)
+
+# Ключи сессии, которые отдаёт /me; служебные (версия прав и т.п.) не выводятся
+ME_SESSION_KEYS = ('userid', 'login', 'role')
+
 
 @main_bp.route('/me', methods=['GET'])
 def me():
-    return jsonify(session)
+    return jsonify({key: session[key] for key in ME_SESSION_KEYS if key in session})
 
 
 @main_bp.route('/logout', methods=['GET'])
@@ -32,6 +53,8 @@ def register():
     try:
         create_user(name, password, role)
         return redirect(url_for('main.login'))
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -49,9 +72,10 @@ def login():
 
     user = validate_user(name, password)
     if user:
-        session['userid'] = user[0]
-        session['login'] = user[1]
-        session['role'] = user[3]
+        session.regenerate()
+        session['userid'] = user.id
+        session['login'] = user.login
+        session['role'] = user.role
         return redirect(url_for('main.adventures'))
     else:
         return jsonify({"error": "Invalid credentials"}), 401
@@ -59,16 +83,71 @@ def login():
 
 @main_bp.route('/adventures', methods=['GET'])
 def adventures():
+    search_query = request.args.get('q', None)
     search_name = request.args.get('search_name', None)
     search_author = request.args.get('search_author', None)
-    all_adventures = get_all_adventures(search_name, search_author)
+    sort = request.args.get('sort', None)
+
+    # Пока удаление пользователя не выполнено, страница не кешируется клиентом
+    job = pending_job(session.get('userid'))
+    version = get_catalogue_version()
+    if version and not job:
+        cached_response = not_modified(make_etag('adventures', version.revision), version.updated_at)
+        if cached_response:
+            return cached_response
+
+    page, next_cursor, _ = get_adventures_page(
+        search_query,
+        search_name,
+        search_author,
+        cursor=request.args.get('cursor'),
+        limit=current_app.config['ADVENTURES_PAGE_SIZE'],
+        sort=sort,
+        version=version
+    )
 
     user_role = session.get('role', None)
-    return render_template('adventures.html',
-                           adventures=all_adventures,
-                           user_role=user_role,
-                           search_name=search_name,
-                           search_author=search_author)
+    response = Response(stream_template('adventures.html',
+                                        adventures=page,
+                                        user_role=user_role,
+                                        search_query=search_query,
+                                        search_name=search_name,
+                                        search_author=search_author,
+                                        sort=sort,
+                                        next_cursor=next_cursor,
+                                        pending_job=job,
+                                        revision=version.revision if version else None))
+    # Версия прочитана до строк страницы (и входит в ключ её кеша),
+    # поэтому страница не старее версии из ETag
+    if job or not version:
+        return response
+    return add_validators(response, make_etag('adventures', version.revision), version.updated_at)
+
+
+@main_bp.route('/adventures/export.csv', methods=['GET'])
+def export_adventures():
+    search_name = request.args.get('search_name', None)
+    search_author = request.args.get('search_author', None)
+    rows = iter_adventures(search_name, search_author,
+                           itersize=current_app.config['ADVENTURES_EXPORT_ITERSIZE'])
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['adventureid', 'adventurename', 'author', 'npcs', 'locations', 'campaigns', 'updated_at'])
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() > 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': 'attachment; filename=adventures.csv'}
+    )
 
 
 @main_bp.route('/adventures/new', methods=['GET', 'POST'])
@@ -99,9 +178,34 @@ def new_adventure():
     return render_template('new_adventure.html')
 
 
+@main_bp.route('/adventures/import', methods=['POST'])
+def import_adventures_upload():
+    if session.get('role') != 'master':
+        return redirect(url_for('main.adventures'))
+
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({"error": "File is required"}), 400
+
+    try:
+        records = parse_file(upload.filename, upload.read().decode('utf-8'))
+        validate_records(records)
+    except (AdventureImportError, UnicodeDecodeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    user_id = session['userid']
+    return job_accepted(submit('import_adventures', {'records': records, 'user_id': user_id}, user_id=user_id))
+
+
 @main_bp.route('/adventures/<int:adventure_id>', methods=['GET'])
 def view_adventure(adventure_id):
-    adventure, npcs, locations = get_adventure(adventure_id)
+    version = get_adventure_version(adventure_id)
+    if version:
+        cached_response = not_modified(make_etag('adventure', adventure_id, version.revision), version.updated_at)
+        if cached_response:
+            return cached_response
+
+    adventure, npcs, locations, adventure_version = get_adventure_with_version(adventure_id)
 
     if not adventure:
         return """
@@ -112,14 +216,18 @@ def view_adventure(adventure_id):
     if 'role' in session.keys():
         role = session['role']
 
-    return render_template(
+    response = make_response(render_template(
         'adventure_detail.html',
         adventure=adventure,
         npcs=npcs,
         locations=locations,
         user_is_logged_in=True,
         user_role=role,
-        is_author=is_adventure_author(adventure_id, session.get('userid', None))
+        is_author=is_adventure_author(adventure_id, session.get('userid', None)),
+        revision=adventure_version.revision
+    ))
+    return add_validators(
+        response, make_etag('adventure', adventure_id, adventure_version.revision), adventure_version.updated_at
     )
 
 
@@ -129,8 +237,29 @@ def delete_adv(adventure_id):
     if not user_id:
         return redirect('/login')
 
-    delete_adventure(adventure_id, user_id)
-    return redirect(url_for('main.adventures'))
+    # Каскад выполняет воркер; права проверяются здесь и ещё раз при удалении
+    if not is_adventure_author(adventure_id, user_id):
+        return redirect(url_for('main.adventures'))
+    job_id = submit('delete_adventures', {'adventure_ids': [adventure_id], 'user_id': user_id}, user_id=user_id)
+    return redirect(url_for('main.adventures', job=job_id))
+
+
+@main_bp.route('/admin/adventures/delete', methods=['POST'])
+def bulk_delete_adventures():
+    if session.get('role') != current_app.config['ADMIN_ROLE']:
+        return jsonify({"error": "Forbidden"}), 403
+
+    if request.is_json:
+        adventure_ids = (request.get_json(silent=True) or {}).get('adventure_ids', [])
+    else:
+        adventure_ids = request.form.getlist('adventureid[]')
+
+    try:
+        adventure_ids = [int(adventure_id) for adventure_id in adventure_ids]
+    except (TypeError, ValueError):
+        return jsonify({"error": "adventure_ids must be a list of integers"}), 400
+
+    return job_accepted(submit('delete_adventures', {'adventure_ids': adventure_ids}, user_id=session['userid']))
 
 
 @main_bp.route('/adventures/<int:adventure_id>/edit', methods=['GET'])
@@ -140,14 +269,35 @@ def edit_adventure_form(adventure_id):
         return redirect('/adventures')
 
     adventure, npcs, locations = get_adventure(adventure_id)
-    print(type(locations), locations)
-    print(type(npcs), npcs)
+    logger.debug("edit adventure form adventure_id=%s npcs=%d locations=%d",
+                 adventure_id, len(npcs), len(locations))
     if not adventure:
         return "Приключение не найдено", 404
 
     return render_template('edit_adventure.html', adventure=adventure, npcs=npcs, locations=locations)
 
 
+def submitted_rows(prefix):
+    """
+    Строки NPC или локаций из формы редактора: поля {prefix}_id[],
+    {prefix}_name[], {prefix}_description[] и отмеченные {prefix}_delete[].
+    Строки без имени пропускаются. None, если таблицы в форме нет.
+    """
+    if f'{prefix}_id[]' not in request.form:
+        return None
+    deleted = set(request.form.getlist(f'{prefix}_delete[]'))
+    rows = []
+    for row_id, name, description in zip(
+        request.form.getlist(f'{prefix}_id[]'),
+        request.form.getlist(f'{prefix}_name[]'),
+        request.form.getlist(f'{prefix}_description[]')
+    ):
+        if (row_id and row_id in deleted) or not name.strip():
+            continue
+        rows.append({'id': int(row_id) if row_id else None, 'name': name.strip(), 'description': description})
+    return rows
+
+
 @main_bp.route('/adventures/<int:adventure_id>/edit', methods=['POST'])
 def edit_adventure(adventure_id):
     user_id = session.get('userid')
@@ -159,7 +309,14 @@ def edit_adventure(adventure_id):
         'adventurename': request.form.get('adventurename'),
         'story': request.form.get('story')
     }
-    update_adventure(adventure_id, adventure)
+    try:
+        npcs, locations = submitted_rows('npc'), submitted_rows('location')
+        changes = save_adventure(adventure_id, adventure, npcs, locations)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if changes is None:
+        return "Приключение не найдено", 404
+    logger.debug("adventure saved adventure_id=%s changes=%s", adventure_id, changes)
 
     return redirect(f'/adventures/{adventure_id}/edit')
 
@@ -176,6 +333,7 @@ def campaigns():
     return render_template(
         'campaigns.html',
         campaigns=my_campaigns,
+        pending_job=pending_job(user_id),
     )
 
 
@@ -204,58 +362,94 @@ def campaign_detail(campaign_id):
 
     user_id = session.get('userid')
 
-    campaign_info, npcs, locations, players, characters, is_author, campaign_id = get_campaign(user_id, campaign_id)
-    if not campaign_info:
+    version = get_campaign_version(user_id, campaign_id)
+    if version:
+        cached_response = not_modified(make_etag('campaign', campaign_id, version.revision), version.updated_at)
+        if cached_response:
+            return cached_response
+
+    campaign = get_campaign(user_id, campaign_id)
+    if not campaign:
         return """
         <h1 style="width:100%; text-align: center;">This campaign not exist or you not a member of campaign</h1>
         """, 400
 
-    return render_template(
+    response = make_response(render_template(
         'campaign_detail.html',
-        campaign_info=campaign_info,
-        npcs=npcs,
-        locations=locations,
-        players=players,
-        characters=characters,
-        is_author=is_author,
-        campaign_id=campaign_id
+        campaign_info=campaign.campaign_info,
+        npcs=campaign.npcs,
+        locations=campaign.locations,
+        players=campaign.players,
+        characters=campaign.characters,
+        is_author=campaign.is_author,
+        campaign_id=campaign.campaign_id,
+        revision=campaign.version.revision
+    ))
+    return add_validators(
+        response, make_etag('campaign', campaign_id, campaign.version.revision), campaign.version.updated_at
     )
 
 
+@main_bp.route('/campaigns/<int:campaign_id>/delete', methods=['POST'])
+def delete_campaign_route(campaign_id):
+    user_id = session.get('userid')
+    if not user_id:
+        return redirect(url_for('main.login'))
+
+    if not is_campaign_author(campaign_id, user_id):
+        return redirect(url_for('main.campaigns'))
+    job_id = submit('delete_campaign', {'campaign_id': campaign_id}, user_id=user_id)
+    return redirect(url_for('main.campaigns', job=job_id))
+
+
 @main_bp.route('/campaigns/<int:campaign_id>/add_player', methods=['POST'])
 def add_player(campaign_id):
-    if not session and session.get('role') != 'master':
-        return
+    user_id = session.get('userid')
+    if not user_id:
+        return redirect(url_for('main.login'))
+    if not is_campaign_author(campaign_id, user_id):
+        return redirect(f'/campaigns/{campaign_id}')
 
-    username = request.form.get('username')
-    create_users_campaigns(username, campaign_id)
+    # Несколько логинов через запятую или с новой строки добавляются разом
+    usernames = [
+        username.strip()
+        for value in request.form.getlist('username')
+        for username in re.split(r'[,\n]', value)
+        if username.strip()
+    ]
+    results = add_campaign_players(campaign_id, usernames)
+
+    not_found = [result['login'] for result in results if result['status'] == 'not_found']
+    if not_found:
+        return f"""
+        <h1 style="width:100%; text-align: center;">Users not found: {escape(', '.join(not_found))}</h1>
+        """, 400
 
     return redirect(f'/campaigns/{campaign_id}')
 
 
 @main_bp.route('/campaigns/<int:campaign_id>/add_character', methods=['POST'])
 def add_character(campaign_id):
-    if not session and session.get('role') != 'master':
+    user_id = session.get('userid')
+    if not user_id:
+        return redirect(url_for('main.login'))
+    if not is_campaign_author(campaign_id, user_id):
         return redirect(f'/campaigns/{campaign_id}')
 
-    character_name = request.form.get('charactername')
-    character_description = request.form.get('characterdescription')
-    character_level = int(request.form.get('characterlevel'))
-    character_class = request.form.get('characterclass')
-    character_skills = request.form.get('characterskills')
-    character_armor = int(request.form.get('characterarmor'))
-    character_hp = int(request.form.get('characterhp'))
-
-    create_player_character(
-        campaign_id,
-        character_name,
-        character_description,
-        character_level,
-        character_class,
-        character_skills,
-        character_armor,
-        character_hp
-    )
+    character = {
+        'name': request.form.get('charactername'),
+        'description': request.form.get('characterdescription'),
+        'level': request.form.get('characterlevel'),
+        'class': request.form.get('characterclass'),
+        'skills': request.form.get('characterskills'),
+        'armor': request.form.get('characterarmor'),
+        'hp': request.form.get('characterhp'),
+    }
+    result, = add_campaign_characters(campaign_id, [character])
+    if result['status'] == 'invalid':
+        return f"""
+        <h1 style="width:100%; text-align: center;">{escape(result['error'])}</h1>
+        """, 400
 
     return redirect(f'/campaigns/{campaign_id}')
 
@@ -271,22 +465,22 @@ def add_npc():
 
 
 @main_bp.route('/npc/delete', methods=['POST'])
-def delete_npc_by_name():
-    name = request.form.get('name')
-    description = request.form.get('description')
+def delete_npc_by_id():
+    npc_id = request.form.get('npcid', type=int)
     adventure_id = request.form.get('adventureid')
 
-    delete_npc(adventure_id, name, description)
+    if npc_id is not None:
+        delete_npc(adventure_id, npc_id)
     return redirect(f'/adventures/{adventure_id}/edit')
 
 
 @main_bp.route('/locations/delete', methods=['POST'])
-def delete_location_by_name():
-    name = request.form.get('name')
-    description = request.form.get('description')
+def delete_location_by_id():
+    location_id = request.form.get('locationid', type=int)
     adventure_id = request.form.get('adventureid')
 
-    delete_location(adventure_id, name, description)
+    if location_id is not None:
+        delete_location(adventure_id, location_id)
     return redirect(f'/adventures/{adventure_id}/edit')
 
 
@@ -301,3 +495,114 @@ def add_location():
     return redirect(f'/adventures/{adventure_id}/edit')
 
 
+def job_accepted(job_id):
+    """
+    Ответ 202 на запрос, поставивший задачу в очередь: статус задачи
+    опрашивается по адресу из Location.
+    """
+    status_url = url_for('main.job_status', job_id=job_id)
+    response = jsonify({"job_id": job_id, "status_url": status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+
+def pending_job(user_id):
+    """
+    Невыполненная задача пользователя из параметра ?job= (после удаления
+    страница показывает, что оно ещё идёт или не удалось), иначе None.
+    """
+    job_id = request.args.get('job', type=int)
+    if not job_id or not user_id:
+        return None
+    job = get_job(job_id)
+    if job is None or job.user_id != user_id or job.status == 'done':
+        return None
+    return job
+
+
+@main_bp.route('/jobs/<int:job_id>', methods=['GET'])
+def job_status(job_id):
+    user_id = session.get('userid')
+    if not user_id:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    job = get_job(job_id)
+    if job is None or (job.user_id != user_id and session.get('role') != current_app.config['ADMIN_ROLE']):
+        return jsonify({"error": "Job not found"}), 404
+
+    response = jsonify({
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "retry_at": job.run_after.isoformat() if job.status == 'queued' and job.attempts else None,
+        "error": job.last_error,
+        "result": job.result,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    })
+    if job.status in ('queued', 'running'):
+        response.headers['Retry-After'] = '1'
+    return response
+
+
+def stats_access_required(view):
+    """
+    Служебные эндпоинты раскрывают устройство системы и параметры запросов
+    (в планах): доступ только у ADMIN_ROLE или по токену STATS_TOKEN.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        token = current_app.config['STATS_TOKEN']
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if token and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+            return view(*args, **kwargs)
+        if session.get('role') == current_app.config['ADMIN_ROLE']:
+            return view(*args, **kwargs)
+        return jsonify({"error": "Forbidden"}), 403
+
+    return wrapper
+
+
+@main_bp.route('/stats/pool', methods=['GET'])
+@stats_access_required
+def pool_stats():
+    return jsonify(get_pool_stats())
+
+
+@main_bp.route('/stats/cache', methods=['GET'])
+@stats_access_required
+def cache_stats():
+    return jsonify(get_cache_stats())
+
+
+@main_bp.route('/stats/fragments', methods=['GET'])
+@stats_access_required
+def fragment_cache_stats():
+    return jsonify(get_fragment_cache_stats())
+
+
+@main_bp.route('/stats/queries', methods=['GET'])
+@stats_access_required
+def query_stats():
+    return jsonify(get_query_stats())
+
+
+@main_bp.route('/stats/queries/plans', methods=['GET'])
+@stats_access_required
+def query_plans():
+    return jsonify(get_slow_query_plans())
+
+
+@main_bp.route('/metrics', methods=['GET'])
+@stats_access_required
+def metrics():
+    """
+    Метрики текущего рабочего процесса (см. `render_metrics`).
+    """
+    return Response(
+        render_metrics(get_pool_stats(), get_cache_stats(), get_fragment_cache_stats()),
+        mimetype='text/plain; version=0.0.4'
+    )
@@ -0,0 +1,194 @@
+import base64
+import json
+from datetime import datetime
+
+SEARCH_TEXT_CONFIG = 'simple'
+
+# Порядки выдачи каталога: ключ сортировки (по убыванию, кроме 'id')
+SORT_ORDERS = {
+    'id': None,
+    'popular': 'c.campaign_count',
+    'recent': 'c.updated_at',
+}
+
+# Колонки строки выдачи; при полнотекстовом поиске следом идёт ранг
+CATALOGUE_COLUMNS = (
+    "c.adventureid", "c.adventurename", "c.author",
+    "c.npc_count", "c.location_count", "c.campaign_count", "c.updated_at",
+)
+
+
+def encode_cursor(values):
+    """
+    Упаковывает значения ключа сортировки последней строки в непрозрачный курсор.
+    """
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class AdventureQuery:
+    """
+    Построитель запроса к каталогу приключений (сводная таблица
+    adventure_catalogue, миграция 005).
+
+    Фильтры комбинируются произвольно. Выдача сортируется по порядку из
+    SORT_ORDERS, если он задан, иначе по релевантности (если задан
+    полнотекстовый запрос) или по adventureid, и листается keyset-курсором
+    по ключу сортировки.
+    """
+
+    def __init__(self):
+        self._conditions = []
+        self._params = []
+        self._text = None
+        self._sort = None
+        self._cursor = None
+        self._limit = None
+
+    def name_contains(self, term):
+        if term:
+            self._conditions.append("c.adventurename ILIKE %s")
+            self._params.append(f"%{_escape_like(term)}%")
+        return self
+
+    def author_contains(self, term):
+        if term:
+            self._conditions.append("c.author ILIKE %s")
+            self._params.append(f"%{_escape_like(term)}%")
+        return self
+
+    def matching(self, text):
+        if text and text.strip():
+            self._text = text.strip()
+        return self
+
+    def sorted_by(self, order):
+        if order in SORT_ORDERS and order != 'id':
+            self._sort = order
+        return self
+
+    def after(self, cursor):
+        self._cursor = decode_cursor(cursor) if isinstance(cursor, str) else cursor
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    @property
+    def ranked(self):
+        return self._text is not None and self._sort is None
+
+    def build(self):
+        """
+        Возвращает пару (sql, params) для cursor.execute.
+        """
+        columns = list(CATALOGUE_COLUMNS)
+        cursor = self._cursor_key()
+        conditions = list(self._conditions)
+        params = []
+        where_params = list(self._params)
+
+        if self._text is not None:
+            conditions.insert(
+                0, f"a.search_vector @@ websearch_to_tsquery('{SEARCH_TEXT_CONFIG}', %s)"
+            )
+            where_params.insert(0, self._text)
+
+        if self.ranked:
+            rank = (
+                f"ts_rank(a.search_vector, "
+                f"websearch_to_tsquery('{SEARCH_TEXT_CONFIG}', %s))::float8"
+            )
+            columns.append(f"{rank} AS rank")
+            params.append(self._text)
+            order_by = "rank DESC, c.adventureid DESC"
+            if cursor:
+                conditions.append(f"({rank}, c.adventureid) < (%s, %s)")
+                where_params += [self._text, *cursor]
+        elif self._sort is not None:
+            key = SORT_ORDERS[self._sort]
+            order_by = f"{key} DESC, c.adventureid DESC"
+            if cursor:
+                conditions.append(f"({key}, c.adventureid) < (%s, %s)")
+                where_params += list(cursor)
+        else:
+            order_by = "c.adventureid"
+            if cursor:
+                conditions.append("c.adventureid > %s")
+                where_params += list(cursor)
+
+        sql = f"SELECT {', '.join(columns)}\nFROM adventure_catalogue c\n"
+        if self._text is not None:
+            sql += "JOIN adventures a ON a.adventureid = c.adventureid\n"
+        if conditions:
+            sql += f"WHERE {' AND '.join(conditions)}\n"
+        sql += f"ORDER BY {order_by}"
+        params += where_params
+
+        if self._limit:
+            sql += "\nLIMIT %s"
+            params.append(self._limit)
+
+        return sql, tuple(params)
+
+    def _cursor_key(self):
+        """
+        Значения курсора, проверенные под текущий порядок выдачи, или None.
+
+        Курсор приходит от клиента: подделанный или оставшийся от другой
+        сортировки курсор не должен ронять запрос, он открывает первую страницу.
+        """
+        values = self._cursor
+        if not isinstance(values, (list, tuple)):
+            return None
+        if self.ranked:
+            if len(values) == 2 and _is_number(values[0]) and _is_int(values[1]):
+                return float(values[0]), values[1]
+        elif self._sort == 'recent':
+            if len(values) == 2 and isinstance(values[0], str) and _is_int(values[1]):
+                try:
+                    return datetime.fromisoformat(values[0]), values[1]
+                except ValueError:
+                    return None
+        elif self._sort is not None:
+            if len(values) == 2 and _is_int(values[0]) and _is_int(values[1]):
+                return tuple(values)
+        elif len(values) == 1 and _is_int(values[0]):
+            return tuple(values)
+        return None
+
+    def cursor_for(self, row):
+        """
+        Курсор, указывающий на строку выдачи `row`.
+        """
+        if self.ranked:
+            return encode_cursor([row[len(CATALOGUE_COLUMNS)], row[0]])
+        if self._sort == 'popular':
+            return encode_cursor([row[5], row[0]])
+        if self._sort == 'recent':
+            return encode_cursor([row[6].isoformat(), row[0]])
+        return encode_cursor([row[0]])
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _is_number(value):
+    return _is_int(value) or isinstance(value, float)
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
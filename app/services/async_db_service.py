@@ -0,0 +1,170 @@
+import asyncio
+
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+from quart import current_app
+
+from app.services.adventure_search import AdventureQuery
+from app.services.db_service import (
+    ADVENTURE_VIEW_SQL, CampaignView, adventure_view_from_row
+)
+
+
+def create_pool(config):
+    conninfo = make_conninfo(
+        host=config["POSTGRES_HOST"],
+        port=config["POSTGRES_PORT"],
+        dbname=config["POSTGRES_DB"],
+        user=config["POSTGRES_USER"],
+        password=config["POSTGRES_PASSWORD"],
+    )
+    return AsyncConnectionPool(
+        conninfo,
+        min_size=config["POSTGRES_POOL_MIN_SIZE"],
+        max_size=config["POSTGRES_POOL_MAX_SIZE"] + config["POSTGRES_POOL_MAX_OVERFLOW"],
+        timeout=config["POSTGRES_POOL_TIMEOUT"],
+        max_lifetime=config["POSTGRES_POOL_MAX_LIFETIME"],
+        open=False,
+    )
+
+
+def init_app(app):
+    """
+    Открывает асинхронный пул при старте ASGI-сервера и закрывает при остановке.
+    """
+    @app.before_serving
+    async def open_pool():
+        app.extensions['async_db_pool'] = create_pool(app.config)
+        await app.extensions['async_db_pool'].open()
+
+    @app.after_serving
+    async def close_pool():
+        await app.extensions['async_db_pool'].close()
+
+
+async def fetchall(sql, params=()):
+    async with current_app.extensions['async_db_pool'].connection() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(sql, params)
+            return await cursor.fetchall()
+
+
+async def fetchone(sql, params=()):
+    async with current_app.extensions['async_db_pool'].connection() as connection:
+        async with connection.cursor() as cursor:
+            await cursor.execute(sql, params)
+            return await cursor.fetchone()
+
+
+async def get_adventures_page(search_query=None, search_name=None, search_author=None, cursor=None, limit=50,
+                              sort=None):
+    query = (
+        AdventureQuery()
+        .matching(search_query)
+        .name_contains(search_name)
+        .author_contains(search_author)
+        .sorted_by(sort)
+        .after(cursor)
+        .limit(limit + 1)
+    )
+    rows = await fetchall(*query.build())
+    next_cursor = query.cursor_for(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+async def get_adventure(adventure_id):
+    row = await fetchone(ADVENTURE_VIEW_SQL.sql, (adventure_id,))
+    if not row:
+        return None, [], []
+    return adventure_view_from_row(row)
+
+
+async def is_adventure_author(adventure_id, user_id):
+    row = await fetchone(
+        "SELECT userid FROM adventures WHERE adventureid = %s",
+        (adventure_id,)
+    )
+    return row is not None and row[0] == user_id
+
+
+async def get_all_campaigns(user_id):
+    return await fetchall(
+        """
+        SELECT c.campaignid, a.adventurename
+        FROM campaigns c
+        JOIN adventures a ON c.adventureid = a.adventureid
+        JOIN users_campaigns uc ON uc.campaignid = c.campaignid
+        WHERE uc.userid = %s
+        """,
+        (user_id,)
+    )
+
+
+async def get_campaign(user_id, campaign_id):
+    """
+    Асинхронная загрузка страницы кампании.
+
+    Участие пользователя и сведения о приключении, NPC, локации, игроки
+    и персонажи запрашиваются параллельно на отдельных соединениях пула.
+    """
+    header, npcs, locations, players, characters = await asyncio.gather(
+        fetchone(
+            """
+            SELECT uc.isauthor, a.adventurename, a.story, u.userlogin
+            FROM users_campaigns uc
+            JOIN campaigns c ON c.campaignid = uc.campaignid
+            JOIN adventures a ON a.adventureid = c.adventureid
+            JOIN users u ON u.userid = a.userid
+            WHERE uc.userid = %s AND uc.campaignid = %s
+            """,
+            (user_id, campaign_id)
+        ),
+        fetchall(
+            """
+            SELECT n.npcname, n.npcdescription
+            FROM npcs n
+            JOIN campaigns c ON c.adventureid = n.adventureid
+            WHERE c.campaignid = %s
+            """,
+            (campaign_id,)
+        ),
+        fetchall(
+            """
+            SELECT l.locationname, l.locationdescription
+            FROM locations l
+            JOIN campaigns c ON c.adventureid = l.adventureid
+            WHERE c.campaignid = %s
+            """,
+            (campaign_id,)
+        ),
+        fetchall(
+            """
+            SELECT u.userlogin, uc.isauthor
+            FROM users_campaigns uc
+            JOIN users u ON uc.userid = u.userid
+            WHERE uc.campaignid = %s
+            """,
+            (campaign_id,)
+        ),
+        fetchall(
+            """
+            SELECT charactername, characterclass, characterlevel
+            FROM player_characters
+            WHERE campaignid = %s
+            """,
+            (campaign_id,)
+        ),
+    )
+
+    if not header:
+        return None
+    is_author, adventure_name, story, author = header
+    return CampaignView(
+        campaign_info=(adventure_name, story, author),
+        npcs=npcs,
+        locations=locations,
+        players=players,
+        characters=characters,
+        is_author=is_author,
+        campaign_id=campaign_id
+    )
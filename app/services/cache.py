@@ -0,0 +1,267 @@
+import functools
+import hashlib
+import inspect
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, g
+
+_MISSING = object()
+
+_invalidation_listeners = []
+
+
+class MemoryCache:
+    """
+    Кеш в памяти процесса: LRU с ограничением числа записей и TTL.
+
+    Счётчики версий пространств имён хранятся отдельно от записей
+    и не вытесняются.
+    """
+
+    def __init__(self, max_entries=10000, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'evictions': 0, 'expirations': 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            self._stats['sets'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def version(self, namespace):
+        with self._lock:
+            return self._versions.setdefault(namespace, time.time_ns())
+
+    def bump_version(self, namespace):
+        with self._lock:
+            self._versions[namespace] = max(
+                time.time_ns(), self._versions.get(namespace, 0) + 1
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+        return stats
+
+
+class RedisCache:
+    """
+    Кеш в Redis-совместимом сервере. Значения сериализуются pickle.
+
+    Требует пакет `redis`; сервер должен быть доступен только приложению.
+    """
+
+    def __init__(self, url, default_ttl=300, prefix='dnd:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, key, default=None):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(
+            self.prefix + key,
+            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+            ex=ttl or None
+        )
+        self._count('sets')
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def version(self, namespace):
+        key = f"{self.prefix}version:{namespace}"
+        version = self.client.get(key)
+        if version is None:
+            # Начальное значение от времени: если счётчик вытеснят, он не
+            # вернётся к уже использованной версии.
+            self.client.set(key, time.time_ns(), nx=True)
+            version = self.client.get(key)
+        return int(version)
+
+    def bump_version(self, namespace):
+        key = f"{self.prefix}version:{namespace}"
+        if not self.client.incr(key) > 1:
+            self.client.set(key, time.time_ns())
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        info = self.client.info('stats')
+        stats['evictions'] = info.get('evicted_keys', 0)
+        stats['expirations'] = info.get('expired_keys', 0)
+        return stats
+
+
+class NullCache:
+    """
+    Отключённый кеш: всегда промах.
+    """
+
+    def get(self, key, default=None):
+        return default
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def version(self, namespace):
+        return 0
+
+    def bump_version(self, namespace):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+def create_cache(config):
+    backend = config["CACHE_BACKEND"]
+    if backend == 'memory':
+        return MemoryCache(config["CACHE_MAX_ENTRIES"], config["CACHE_DEFAULT_TTL"])
+    if backend == 'redis':
+        return RedisCache(config["CACHE_REDIS_URL"], config["CACHE_DEFAULT_TTL"],
+                          config["CACHE_KEY_PREFIX"])
+    if backend in (None, 'null'):
+        return NullCache()
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+
+def init_app(app):
+    app.extensions['cache'] = create_cache(app.config)
+
+
+def get_cache():
+    return current_app.extensions['cache']
+
+
+def get_cache_stats():
+    return get_cache().stats()
+
+
+def add_invalidation_listener(listener):
+    """
+    Подписывает `listener(namespaces)` на каждый сброс кеша в этом процессе.
+    """
+    if listener not in _invalidation_listeners:
+        _invalidation_listeners.append(listener)
+
+
+def invalidate(*namespaces):
+    """
+    Делает недействительными все записи указанных пространств имён.
+    """
+    cache = get_cache()
+    for namespace in namespaces:
+        cache.bump_version(namespace)
+    for listener in _invalidation_listeners:
+        listener(namespaces)
+
+
+def cached(*namespaces, ttl=None):
+    """
+    Read-through кеширование результата функции.
+
+    `namespaces` — шаблоны пространств имён, подставляемые из аргументов
+    функции, например 'adventure:{adventure_id}'. Ключ записи включает
+    текущие версии этих пространств, поэтому `invalidate` сбрасывает
+    все зависящие от них записи сразу. `ttl` — секунды или имя ключа
+    конфигурации приложения.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+
+            versions = [
+                cache.version(namespace.format(**arguments))
+                for namespace in namespaces
+            ]
+            digest = hashlib.sha1(
+                repr((versions, tuple(arguments.items()))).encode()
+            ).hexdigest()
+            key = f"{func.__module__}.{func.__name__}:{digest}"
+
+            value = cache.get(key, _MISSING)
+            if value is _MISSING:
+                # Заполнение кеша читает с основного сервера: отстающая
+                # реплика положила бы старые данные под новую версию
+                g.cache_filling = g.get('cache_filling', 0) + 1
+                try:
+                    value = func(*args, **kwargs)
+                finally:
+                    g.cache_filling -= 1
+                cache.set(key, value, current_app.config[ttl] if isinstance(ttl, str) else ttl)
+            return value
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import select
+import socket
+import threading
+
+import psycopg2
+from flask import current_app
+
+from app.services.cache import MemoryCache, add_invalidation_listener
+from app.services.db_pool import PoolTimeout
+from app.services.db_service import _connect_kwargs, get_pool
+from app.services.queries import register, run
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY, по которому процессы передают друг другу сброс кеша
+CACHE_CHANNEL = 'cache_invalidate'
+
+# Payload NOTIFY ограничен 8000 байт: длинные списки пространств
+# имён (пакетное удаление) отправляются несколькими уведомлениями
+MAX_PAYLOAD_BYTES = 7000
+
+NOTIFY_CACHE_SQL = register('cache_notify', """
+    SELECT pg_notify('cache_invalidate', %s)
+""")
+
+_listener_lock = threading.Lock()
+
+
+def _origin():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _chunks(namespaces):
+    chunk, size = [], 0
+    for namespace in namespaces:
+        if chunk and size + len(namespace) + 4 > MAX_PAYLOAD_BYTES:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(namespace)
+        size += len(namespace) + 4
+    if chunk:
+        yield chunk
+
+
+def _enabled(app):
+    # Redis общий для всех процессов, рассылка нужна только кешу в памяти
+    return app.config["CACHE_SYNC"] and isinstance(app.extensions.get('cache'), MemoryCache)
+
+
+def publish(namespaces):
+    """
+    Рассылает сброс пространств имён остальным процессам.
+
+    Вызывается после фиксации изменений; ошибка только пишется в лог:
+    изменения уже сохранены, а записи других процессов в худшем случае
+    доживут до истечения TTL. NOTIFY отправляется на отдельном соединении
+    из пула: соединение запроса может держать незавершённую транзакцию,
+    которую рассылка не должна ни фиксировать, ни откатывать.
+    """
+    if not _enabled(current_app):
+        return
+    origin = _origin()
+    try:
+        pool = get_pool()
+        connection = pool.getconn()
+    except (PoolTimeout, psycopg2.Error):
+        logger.exception("cache invalidation not published namespaces=%d", len(namespaces))
+        return
+    try:
+        with connection.cursor() as cursor:
+            for chunk in _chunks(namespaces):
+                run(cursor, NOTIFY_CACHE_SQL, (json.dumps({'origin': origin, 'namespaces': chunk}),))
+        connection.commit()
+    except psycopg2.Error:
+        logger.exception("cache invalidation not published namespaces=%d", len(namespaces))
+    finally:
+        # putconn откатывает неудавшуюся транзакцию
+        pool.putconn(connection)
+
+
+class CacheSyncListener:
+    """
+    Поток, применяющий к кешу процесса сбросы, сделанные другими процессами.
+
+    Слушает CACHE_CHANNEL на отдельном соединении (не из пула: оно занято
+    всё время жизни процесса). Пока соединения нет, уведомления теряются,
+    поэтому после каждого (пере)подключения кеш процесса очищается целиком.
+    """
+
+    def __init__(self, app, retry_interval=5.0):
+        self.app = app
+        self.cache = app.extensions['cache']
+        self.retry_interval = retry_interval
+        self.pid = os.getpid()
+        self.origin = _origin()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='cache-sync', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def apply(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            logger.warning("cache sync: malformed payload %r", payload[:100])
+            return
+        if message.get('origin') == self.origin:
+            return
+        for namespace in message.get('namespaces', ()):
+            self.cache.bump_version(namespace)
+
+    def _run(self):
+        config = self.app.config
+        kwargs = _connect_kwargs(config, config["POSTGRES_HOST"], config["POSTGRES_PORT"])
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(**kwargs)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CACHE_CHANNEL}")
+                self.cache.clear()
+                logger.info("cache sync listening pid=%d", self.pid)
+                while not self._stopping.is_set():
+                    if select.select([connection], [], [], self.retry_interval)[0]:
+                        connection.poll()
+                        while connection.notifies:
+                            self.apply(connection.notifies.pop(0).payload)
+            except psycopg2.Error:
+                logger.exception("cache sync lost listener connection pid=%d", self.pid)
+                self._stopping.wait(self.retry_interval)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def start_listener(app):
+    """
+    Запускает слушателя сбросов в текущем процессе, если он ещё не запущен
+    (None, если рассылка не нужна).
+
+    После fork поток родителя в потомке не существует, поэтому слушатель
+    создаётся заново для каждого pid.
+    """
+    if not _enabled(app):
+        return None
+    listener = app.extensions.get('cache_sync')
+    if listener is not None and listener.pid == os.getpid():
+        return listener
+    with _listener_lock:
+        listener = app.extensions.get('cache_sync')
+        if listener is None or listener.pid != os.getpid():
+            listener = CacheSyncListener(app, app.config["CACHE_SYNC_RETRY_INTERVAL"])
+            listener.start()
+            app.extensions['cache_sync'] = listener
+    return listener
+
+
+def init_app(app):
+    """
+    Включает рассылку сбросов между процессами для кеша в памяти.
+    """
+    add_invalidation_listener(publish)
+
+    @app.before_request
+    def start_cache_sync():
+        start_listener(app)
@@ -0,0 +1,245 @@
+import os
+import threading
+import time
+
+import psycopg2
+
+
+class PoolTimeout(Exception):
+    """
+    Пул не смог выдать соединение за отведённое время.
+    """
+
+
+class ConnectionPool:
+    """
+    Ограниченный потокобезопасный пул соединений с PostgreSQL.
+
+    Держит до `max_size` постоянных соединений и до `max_overflow` временных,
+    которые закрываются при возврате. Перед выдачей соединение проверяется
+    (`pre_ping`), а соединения старше `max_lifetime` секунд пересоздаются.
+    """
+
+    def __init__(self, connect_kwargs, min_size=1, max_size=10, max_overflow=5,
+                 timeout=30.0, max_lifetime=3600.0, pre_ping=True):
+        self.connect_kwargs = connect_kwargs
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self.pid = os.getpid()
+
+        self._condition = threading.Condition()
+        self._idle = []
+        self._created_at = {}
+        self._overflow = set()
+        self._size = 0
+        self._closed = False
+
+        self._stats = {
+            'checkouts': 0,
+            'checkins': 0,
+            'connects': 0,
+            'recycled': 0,
+            'failed_pings': 0,
+            'overflow_checkouts': 0,
+            'timeouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+
+        for _ in range(min_size):
+            connection = self._connect()
+            self._idle.append(connection)
+            self._size += 1
+
+    def _connect(self):
+        connection = psycopg2.connect(**self.connect_kwargs)
+        self._created_at[id(connection)] = time.monotonic()
+        self._stats['connects'] += 1
+        return connection
+
+    def _discard(self, connection):
+        self._created_at.pop(id(connection), None)
+        self._overflow.discard(id(connection))
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _is_expired(self, connection):
+        if not self.max_lifetime:
+            return False
+        created_at = self._created_at.get(id(connection), 0)
+        return time.monotonic() - created_at > self.max_lifetime
+
+    def _is_healthy(self, connection):
+        if connection.closed:
+            return False
+        if not self.pre_ping:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            self._stats['failed_pings'] += 1
+            return False
+
+    def getconn(self):
+        """
+        Берёт соединение из пула, при необходимости ожидая освобождения.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        overflow = False
+
+        with self._condition:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._size < self.max_size + self.max_overflow:
+                    overflow = self._size >= self.max_size
+                    self._size += 1
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No connection available within {self.timeout} seconds"
+                    )
+                self._condition.wait(remaining)
+
+        try:
+            if connection is None:
+                connection = self._connect()
+                if overflow:
+                    self._overflow.add(id(connection))
+            elif self._is_expired(connection):
+                self._stats['recycled'] += 1
+                self._discard(connection)
+                connection = self._connect()
+            elif not self._is_healthy(connection):
+                self._discard(connection)
+                connection = self._connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+        waited = time.monotonic() - started
+        with self._condition:
+            self._stats['checkouts'] += 1
+            if overflow:
+                self._stats['overflow_checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return connection
+
+    def putconn(self, connection):
+        """
+        Возвращает соединение в пул, откатывая незавершённую транзакцию.
+        """
+        broken = connection.closed
+        if not broken:
+            try:
+                connection.rollback()
+            except psycopg2.Error:
+                broken = True
+
+        with self._condition:
+            self._stats['checkins'] += 1
+            if broken or self._closed or id(connection) in self._overflow:
+                self._discard(connection)
+                self._size -= 1
+            else:
+                self._idle.append(connection)
+            self._condition.notify()
+
+    def closeall(self):
+        with self._condition:
+            self._closed = True
+            for connection in self._idle:
+                self._discard(connection)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+            stats['overflow'] = len(self._overflow)
+            stats['max_size'] = self.max_size
+            stats['max_overflow'] = self.max_overflow
+        return stats
+
+
+class ReplicaSet:
+    """
+    Пулы соединений с репликами для чтения.
+
+    Реплики выбираются по кругу. Реплика, из пула которой не удалось
+    получить соединение (сервер недоступен или пул исчерпан), пропускается
+    `retry_after` секунд. Если недоступны все, `getconn` возвращает None
+    и читать нужно с основного сервера.
+    """
+
+    def __init__(self, pools, retry_after=10.0):
+        self.pools = pools
+        self.retry_after = retry_after
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._next = 0
+        self._down_until = [0.0] * len(pools)
+        self._stats = {'checkouts': 0, 'failovers': 0, 'exhausted': 0}
+
+    def getconn(self):
+        """
+        Возвращает пару (пул, соединение) или None.
+        """
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.pools)
+
+        for offset in range(len(self.pools)):
+            index = (start + offset) % len(self.pools)
+            if self._down_until[index] > time.monotonic():
+                continue
+            pool = self.pools[index]
+            try:
+                connection = pool.getconn()
+            except (psycopg2.Error, PoolTimeout):
+                with self._lock:
+                    self._down_until[index] = time.monotonic() + self.retry_after
+                    self._stats['failovers'] += 1
+                continue
+            with self._lock:
+                self._stats['checkouts'] += 1
+            return pool, connection
+
+        with self._lock:
+            self._stats['exhausted'] += 1
+        return None
+
+    def closeall(self):
+        for pool in self.pools:
+            pool.closeall()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['down'] = sum(1 for until in self._down_until if until > now)
+        stats['replicas'] = [pool.stats() for pool in self.pools]
+        return stats
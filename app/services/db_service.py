@@ -1,172 +1,753 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple
+
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from flask import current_app
+from flask import current_app, g, has_request_context, session
+
+from app.services.adventure_search import AdventureQuery
+from app.services.cache import cached, get_cache_stats, invalidate
+from app.services.db_pool import ConnectionPool, ReplicaSet
+from app.services.passwords import hash_password, verify_password
+from app.services.queries import PreparingConnection, register, run, run_sql, run_values
+
+logger = logging.getLogger(__name__)
+
+_pool_lock = threading.Lock()
+
+
+def get_pool(app=None):
+    """
+    Возвращает пул соединений приложения (по умолчанию текущего),
+    создавая его при первом обращении.
+
+    Пул пересоздаётся, если процесс был форкнут после его создания:
+    соединения libpq нельзя разделять между процессами.
+    """
+    app = app or current_app._get_current_object()
+    pool = app.extensions.get('db_pool')
+    if pool is not None and pool.pid == os.getpid():
+        return pool
+
+    with _pool_lock:
+        pool = app.extensions.get('db_pool')
+        if pool is None or pool.pid != os.getpid():
+            config = app.config
+            pool = ConnectionPool(
+                connect_kwargs=_connect_kwargs(config, config["POSTGRES_HOST"], config["POSTGRES_PORT"]),
+                min_size=config["POSTGRES_POOL_MIN_SIZE"],
+                max_size=config["POSTGRES_POOL_MAX_SIZE"],
+                max_overflow=config["POSTGRES_POOL_MAX_OVERFLOW"],
+                timeout=config["POSTGRES_POOL_TIMEOUT"],
+                max_lifetime=config["POSTGRES_POOL_MAX_LIFETIME"],
+                pre_ping=config["POSTGRES_POOL_PRE_PING"],
+            )
+            app.extensions['db_pool'] = pool
+    return pool
+
+
+def _connect_kwargs(config, host, port):
+    return {
+        'host': host,
+        'port': port,
+        'dbname': config["POSTGRES_DB"],
+        'user': config["POSTGRES_USER"],
+        'password': config["POSTGRES_PASSWORD"],
+        'connection_factory': PreparingConnection,
+    }
+
+
+def get_replica_set(app=None):
+    """
+    Пулы реплик из POSTGRES_REPLICAS или None, если реплики не настроены.
+    Как и основной пул, пересоздаются после fork.
+    """
+    app = app or current_app._get_current_object()
+    config = app.config
+    if not config["POSTGRES_REPLICAS"]:
+        return None
+    replica_set = app.extensions.get('db_replicas')
+    if replica_set is not None and replica_set.pid == os.getpid():
+        return replica_set
+
+    with _pool_lock:
+        replica_set = app.extensions.get('db_replicas')
+        if replica_set is None or replica_set.pid != os.getpid():
+            pools = []
+            for replica in config["POSTGRES_REPLICAS"]:
+                host, _, port = replica.partition(':')
+                pools.append(ConnectionPool(
+                    connect_kwargs=dict(
+                        _connect_kwargs(config, host, port or config["POSTGRES_PORT"]),
+                        connect_timeout=config["POSTGRES_REPLICA_CONNECT_TIMEOUT"],
+                    ),
+                    # Без соединений при создании: реплика может быть недоступна
+                    min_size=0,
+                    max_size=config["POSTGRES_POOL_MAX_SIZE"],
+                    max_overflow=config["POSTGRES_POOL_MAX_OVERFLOW"],
+                    timeout=config["POSTGRES_REPLICA_POOL_TIMEOUT"],
+                    max_lifetime=config["POSTGRES_POOL_MAX_LIFETIME"],
+                    pre_ping=config["POSTGRES_POOL_PRE_PING"],
+                ))
+            replica_set = ReplicaSet(pools, retry_after=config["POSTGRES_REPLICA_RETRY"])
+            app.extensions['db_replicas'] = replica_set
+    return replica_set
+
+
+def _can_read_replica():
+    """
+    Читать с реплики можно вне транзакции, если ни этот запрос, ни сессия
+    в последние REPLICA_READ_YOUR_WRITES_SECONDS ничего не записывали:
+    иначе пользователь может не увидеть собственных изменений. Промахи
+    общего кеша (`cached`) всегда читаются с основного сервера.
+    """
+    if g.get('db_transaction_depth') or g.get('db_wrote') or g.get('cache_filling'):
+        return False
+    if has_request_context():
+        window = current_app.config["REPLICA_READ_YOUR_WRITES_SECONDS"]
+        if time.time() - session.get('db_wrote_at', 0) < window:
+            return False
+    return True
+
+
+def _mark_write():
+    g.db_wrote = True
+    # Отметка нужна только вошедшим пользователям: анонимному запросу
+    # она создала бы новую сессию (и строку в хранилище сессий)
+    if has_request_context() and 'userid' in session:
+        session['db_wrote_at'] = time.time()
+
+
+def get_db_connection(read_only=False):
+    """
+    Возвращает соединение текущего запроса.
+
+    Соединение берётся из пула один раз на запрос (контекст приложения)
+    и возвращается в пул в `close_db_connection`. С `read_only` запрос
+    получает соединение с одной из реплик, если они настроены, доступны
+    и сессия недавно не писала; иначе — с основным сервером.
+    """
+    if read_only and _can_read_replica():
+        if 'db_replica' not in g:
+            replica_set = get_replica_set()
+            g.db_replica = replica_set.getconn() if replica_set else None
+        if g.db_replica is not None:
+            return g.db_replica[1]
+
+    if 'db_connection' not in g:
+        g.db_connection = get_pool().getconn()
+    return g.db_connection
+
+
+def close_db_connection(exception=None):
+    connection = g.pop('db_connection', None)
+    if connection is not None:
+        get_pool().putconn(connection)
+    replica = g.pop('db_replica', None)
+    if replica is not None:
+        pool, connection = replica
+        pool.putconn(connection)
+
+
+def get_pool_stats():
+    stats = get_pool().stats()
+    replica_set = get_replica_set()
+    if replica_set is not None:
+        stats['replica_set'] = replica_set.stats()
+    return stats
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db_connection)
+
+
+@contextmanager
+def transaction():
+    """
+    Объединяет вызовы функций db_service в одну транзакцию.
+
+    Внутри блока функции не фиксируют транзакцию сами, а сброс кеша
+    откладывается до фиксации внешнего блока. Ошибка откатывает всё.
+    Блоки могут быть вложенными: фиксирует только внешний.
+    """
+    connection = get_db_connection()
+    depth = g.get('db_transaction_depth', 0)
+    if depth == 0:
+        g.db_pending_invalidations = []
+    g.db_transaction_depth = depth + 1
+    try:
+        yield connection
+        if depth == 0:
+            connection.commit()
+            _mark_write()
+    except Exception:
+        if depth == 0:
+            connection.rollback()
+        raise
+    finally:
+        g.db_transaction_depth = depth
+        namespaces = g.pop('db_pending_invalidations', []) if depth == 0 else []
+    if namespaces:
+        invalidate(*namespaces)
+
+
+def commit(connection):
+    """
+    Фиксирует транзакцию, если вызов не внутри блока `transaction()`.
+    """
+    if not g.get('db_transaction_depth'):
+        connection.commit()
+        _mark_write()
+
+
+def rollback(connection):
+    """
+    Откатывает транзакцию, если вызов не внутри блока `transaction()`:
+    вложенный вызов оставляет откат внешнему блоку, который получит
+    ту же ошибку.
+    """
+    if not g.get('db_transaction_depth'):
+        connection.rollback()
+
+
+def invalidate_after_commit(*namespaces):
+    """
+    Сбрасывает пространства имён кеша сразу или, внутри `transaction()`,
+    после фиксации внешнего блока.
+    """
+    g.pop('user_grants', None)
+    if g.get('db_transaction_depth'):
+        g.db_pending_invalidations.extend(namespaces)
+    else:
+        invalidate(*namespaces)
+
 
+ADVENTURE_CAMPAIGN_IDS_SQL = register('adventure_campaign_ids', """
+    SELECT campaignid FROM campaigns WHERE adventureid = %s
+""")
 
-def get_db_connection():
-    config = current_app.config
-    connection = psycopg2.connect(
-        host=config["POSTGRES_HOST"],
-        port=config["POSTGRES_PORT"],
-        dbname=config["POSTGRES_DB"],
-        user=config["POSTGRES_USER"],
-        password=config["POSTGRES_PASSWORD"]
+
+def adventure_cache_namespaces(cursor, adventure_id):
+    """
+    Пространства имён кеша, зависящие от содержимого приключения:
+    само приключение, каталог и все кампании по нему.
+    """
+    run(cursor, ADVENTURE_CAMPAIGN_IDS_SQL, (adventure_id,))
+    campaign_namespaces = [f'campaign:{row[0]}' for row in cursor.fetchall()]
+    return [f'adventure:{adventure_id}', 'adventures', *campaign_namespaces]
+
+
+ADVENTURES_CAMPAIGN_IDS_SQL = register('adventures_campaign_ids', """
+    SELECT campaignid FROM campaigns WHERE adventureid = ANY(%s)
+""")
+
+
+def adventures_cache_namespaces(cursor, adventure_ids):
+    """
+    То же, что `adventure_cache_namespaces`, для нескольких приключений
+    одним запросом.
+    """
+    adventure_ids = sorted(set(adventure_ids))
+    run(cursor, ADVENTURES_CAMPAIGN_IDS_SQL, (adventure_ids,))
+    campaign_namespaces = [f'campaign:{row[0]}' for row in cursor.fetchall()]
+    return [*(f'adventure:{adventure_id}' for adventure_id in adventure_ids), 'adventures', *campaign_namespaces]
+
+
+class UserGrants(NamedTuple):
+    """
+    Права пользователя: id приключений, автором которых он является,
+    и кампании, в которых он состоит (campaign_id -> автор ли кампании).
+    """
+    adventure_ids: frozenset
+    campaigns: dict
+
+
+USER_GRANTS_SQL = register('user_grants', """
+    SELECT 'adventure', adventureid, TRUE FROM adventures WHERE userid = %(user_id)s
+    UNION ALL
+    SELECT 'campaign', campaignid, isauthor FROM users_campaigns WHERE userid = %(user_id)s
+""")
+
+
+@cached('grants:{user_id}', ttl='AUTHZ_CACHE_TTL')
+def _load_user_grants(user_id, revision):
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, USER_GRANTS_SQL, {'user_id': user_id})
+            rows = cursor.fetchall()
+    except Exception:
+        rollback(connection)
+        raise
+    return UserGrants(
+        adventure_ids=frozenset(entity_id for kind, entity_id, _ in rows if kind == 'adventure'),
+        campaigns={entity_id: is_author for kind, entity_id, is_author in rows if kind == 'campaign'}
     )
-    return connection
+
+
+def get_user_grants(user_id):
+    """
+    Права пользователя одним запросом, с кешированием на AUTHZ_CACHE_TTL
+    и на время HTTP-запроса.
+
+    Кеш сбрасывается `invalidate_grants` при создании и удалении
+    приключений, кампаний и участия. Для текущего пользователя ключ
+    дополнительно включает ревизию из сессии, поэтому собственные
+    изменения видны сразу и в других процессах с кешем в памяти.
+    """
+    if not user_id:
+        return UserGrants(frozenset(), {})
+    memo = g.setdefault('user_grants', {})
+    if user_id not in memo:
+        revision = session.get('grants_revision') if session.get('userid') == user_id else None
+        memo[user_id] = _load_user_grants(user_id, revision)
+    return memo[user_id]
+
+
+def invalidate_grants(*user_ids):
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    if has_request_context() and session.get('userid') in user_ids:
+        session['grants_revision'] = time.time_ns()
+    invalidate_after_commit(*(f'grants:{user_id}' for user_id in user_ids))
+
+
+def is_adventure_author(adventure_id, user_id):
+    try:
+        return int(adventure_id) in get_user_grants(user_id).adventure_ids
+    except (TypeError, ValueError):
+        return False
+
+
+def is_campaign_member(campaign_id, user_id):
+    return int(campaign_id) in get_user_grants(user_id).campaigns
+
+
+def is_campaign_author(campaign_id, user_id):
+    return bool(get_user_grants(user_id).campaigns.get(int(campaign_id)))
+
+
+CREATE_USER_SQL = register('create_user', """
+    INSERT INTO users (userlogin, userpassword, userrole)
+    VALUES (%s, %s, %s)
+""")
 
 
 def create_user(name, password, role):
+    password_hash = hash_password(password)
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO users (userlogin, userpassword, userrole) 
-                VALUES (%s, %s, %s)
-                """,
-                (name, password, role)
-            )
-        connection.commit()
-    finally:
-        connection.close()
+            run(cursor, CREATE_USER_SQL, (name, password_hash, role))
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+
+
+class User(NamedTuple):
+    id: int
+    login: str
+    role: str
+
+
+VALIDATE_USER_SQL = register('validate_user', """
+    SELECT userid, userlogin, userpassword, userrole FROM users WHERE userlogin = %s
+""")
+
+# Пересчёт хеша при входе; условие на старый хеш — чтобы параллельный
+# вход или смена пароля не были перезаписаны
+REHASH_PASSWORD_SQL = register('rehash_password', """
+    UPDATE users SET userpassword = %s WHERE userid = %s AND userpassword = %s
+""")
 
 
 def validate_user(name, password):
-    connection = get_db_connection()
+    """
+    Пользователь с таким логином и паролем или None.
+
+    Хеш пароля проверяется в пуле хеширования; хеш с устаревшими
+    параметрами (или пароль, хранившийся открытым текстом) заменяется новым.
+    """
+    connection = get_db_connection(read_only=True)
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT * FROM users WHERE userlogin = %s AND userpassword = %s
-                """,
-                (name, password)
-            )
-            user = cursor.fetchone()
-        return user
-    finally:
-        connection.close()
+            run(cursor, VALIDATE_USER_SQL, (name,))
+            row = cursor.fetchone()
+        if row is None:
+            verify_password(password, None)
+            return None
+
+        user_id, login, password_hash, role = row
+        valid, needs_rehash = verify_password(password, password_hash)
+        if not valid:
+            return None
+        if needs_rehash:
+            primary = get_db_connection()
+            with primary.cursor() as cursor:
+                run(cursor, REHASH_PASSWORD_SQL, (hash_password(password), user_id, password_hash))
+            commit(primary)
+        return User(user_id, login, role)
+    except Exception:
+        rollback(connection)
+        raise
+
+
+LEGACY_PASSWORDS_SQL = register('legacy_passwords', """
+    SELECT userid, userpassword
+    FROM users
+    WHERE userid > %s AND userpassword NOT LIKE 'scrypt$%%'
+    ORDER BY userid
+    LIMIT %s
+""")
 
 
-def get_all_adventures(search_name=None, search_author=None):
+def hash_legacy_passwords(batch_size=500):
+    """
+    Заменяет пароли, хранящиеся открытым текстом (до появления хеширования),
+    их хешами — не дожидаясь входа пользователя.
+
+    Пачки по `batch_size` фиксируются по отдельности: таблица не блокируется
+    надолго, прерванный проход можно повторить. Пароль, сменившийся за время
+    прохода, не перезаписывается. Возвращает число захешированных паролей.
+    """
     connection = get_db_connection()
-    try:
-        with connection.cursor() as cursor:
-            if search_name and not search_author:
-                cursor.execute(
-                    """
-                    SELECT a.adventureid, a.adventurename, u.userlogin AS author
-                    FROM adventures a
-                    JOIN users u ON a.userid = u.userid
-                    WHERE a.adventurename LIKE %s
-                    """,
-                    (f"%{search_name}%",)
-                )
-            elif search_author and not search_name:
-                cursor.execute(
+    hashed = 0
+    last_id = 0
+    while True:
+        try:
+            with connection.cursor() as cursor:
+                run(cursor, LEGACY_PASSWORDS_SQL, (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                run_values(
+                    cursor,
+                    'hash_legacy_passwords',
                     """
-                    SELECT a.adventureid, a.adventurename, u.userlogin AS author
-                    FROM adventures a
-                    JOIN users u ON a.userid = u.userid
-                    WHERE u.userlogin LIKE %s
+                    UPDATE users u SET userpassword = v.password_hash
+                    FROM (VALUES %s) AS v (userid, password_hash, userpassword)
+                    WHERE u.userid = v.userid AND u.userpassword = v.userpassword
                     """,
-                    (f"%{search_author}%",)
+                    [(user_id, hash_password(password), password) for user_id, password in rows],
+                    page_size=batch_size
                 )
-            elif search_name and search_author:
-                cursor.execute(
-                    """
-                    SELECT a.adventureid, a.adventurename, u.userlogin AS author
-                    FROM adventures a
-                    JOIN users u ON a.userid = u.userid
-                    WHERE a.adventurename LIKE %s AND u.userlogin LIKE %s
-                    """,
-                    (f"%{search_name}%", f"%{search_author}%")
-                )
-            else:
-                cursor.execute(
-                    """
-                    SELECT a.adventureid, a.adventurename, u.userlogin AS author
-                    FROM adventures a
-                    JOIN users u ON a.userid = u.userid
-                    """
-                )
-            adventures = cursor.fetchall()
+                hashed += cursor.rowcount
+            commit(connection)
+        except Exception:
+            rollback(connection)
+            raise
+        last_id = rows[-1][0]
+    return hashed
+
+
+@cached('adventures')
+def get_all_adventures(search_name=None, search_author=None, cursor=None, limit=None):
+    query = (
+        AdventureQuery()
+        .name_contains(search_name)
+        .author_contains(search_author)
+        .after(cursor)
+        .limit(limit)
+    )
+    sql, params = query.build()
+
+    connection = get_db_connection(read_only=True)
+    try:
+        with connection.cursor() as db_cursor:
+            run_sql(db_cursor, 'all_adventures', sql, params)
+            adventures = db_cursor.fetchall()
         return adventures
-    finally:
-        connection.close()
+    except Exception:
+        rollback(connection)
+        raise
 
 
-def get_adventure(adventure_id):
-    connection = get_db_connection()
+class CataloguePage(NamedTuple):
+    """
+    Страница каталога: строки, курсор следующей страницы и версия
+    каталога, под которой страница загружена (для ETag страницы).
+    """
+    rows: list
+    next_cursor: object
+    version: object
+
+
+@cached('adventures')
+def get_adventures_page(search_query=None, search_name=None, search_author=None, cursor=None, limit=50,
+                        sort=None, version=None):
+    """
+    Страница каталога приключений с keyset-пагинацией.
+
+    `sort` — 'popular' (по числу кампаний), 'recent' (по времени изменения)
+    или 'id'. Без него выдача по `search_query` ранжируется полнотекстовым
+    поиском по названию, автору, сюжету, NPC и локациям, иначе сортируется
+    по id. Возвращает CataloguePage: строки (id, название, автор, NPC,
+    локации, кампании, изменено[, ранг]) из сводной таблицы каталога,
+    курсор следующей страницы (None, если страница последняя) и `version`.
+
+    `version` — версия каталога (`get_catalogue_version`), прочитанная
+    вызывающим до страницы: строки не старее её, поэтому ETag из неё не
+    закрепит у клиента устаревшую страницу. Она входит в ключ кеша.
+    """
+    query = (
+        AdventureQuery()
+        .matching(search_query)
+        .name_contains(search_name)
+        .author_contains(search_author)
+        .sorted_by(sort)
+        .after(cursor)
+        .limit(limit + 1)
+    )
+    sql, params = query.build()
+
+    connection = get_db_connection(read_only=True)
     try:
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT * FROM get_adventure_details(%s)", (adventure_id,))
-            details = cursor.fetchall()
-    finally:
-        connection.close()
+        with connection.cursor() as db_cursor:
+            run_sql(db_cursor, 'adventures_page', sql, params)
+            rows = db_cursor.fetchall()
+    except Exception:
+        rollback(connection)
+        raise
 
+    next_cursor = query.cursor_for(rows[limit - 1]) if len(rows) > limit else None
+    return CataloguePage(rows[:limit], next_cursor, version)
+
+
+def iter_adventures(search_name=None, search_author=None, itersize=1000):
+    """
+    Построчно отдаёт весь каталог через серверный (именованный) курсор,
+    не загружая его в память целиком. Предназначено для выгрузок.
+    """
+    query = AdventureQuery().name_contains(search_name).author_contains(search_author)
+    sql, params = query.build()
+
+    connection = get_db_connection(read_only=True)
+    try:
+        with connection.cursor(name='adventures_export') as db_cursor:
+            db_cursor.itersize = itersize
+            run_sql(db_cursor, 'adventures_export', sql, params)
+            for row in db_cursor:
+                yield row
+    except Exception:
+        rollback(connection)
+        raise
+
+
+ADVENTURE_VIEW_SQL = register('adventure_view', """
+    SELECT a.adventureid,
+           a.adventurename,
+           a.story,
+           (SELECT coalesce(json_agg(json_build_array(n.npcid, n.npcname, n.npcdescription)
+                                     ORDER BY n.npcid), '[]')
+            FROM npcs n
+            WHERE n.adventureid = a.adventureid) AS npcs,
+           (SELECT coalesce(json_agg(json_build_array(l.locationid, l.locationname, l.locationdescription)
+                                     ORDER BY l.locationid), '[]')
+            FROM locations l
+            WHERE l.adventureid = a.adventureid) AS locations,
+           a.revision,
+           a.updated_at
+    FROM adventures a
+    WHERE a.adventureid = %s
+""")
+
+
+def adventure_view_from_row(row):
+    adventure_id, name, story, npc_rows, location_rows = row[:5]
     adventure = {
-        'id': details[0][0],
-        'name': details[0][1],
-        'story': details[0][2]
+        'id': adventure_id,
+        'name': name,
+        'story': story
     }
-    npcs = []
-    locations = []
-    for row in details:
-        if row[3]:
-            if not {'name': row[3], 'description': row[4]} in npcs:
-                npcs.append({'name': row[3], 'description': row[4]})
-        if row[5]:
-            if not {'name': row[5], 'description': row[6]} in locations:
-                locations.append({'name': row[5], 'description': row[6]})
+    npcs = [
+        {'id': npc_id, 'name': npc_name, 'description': npc_description}
+        for npc_id, npc_name, npc_description in npc_rows
+        if npc_name
+    ]
+    locations = [
+        {'id': location_id, 'name': location_name, 'description': location_description}
+        for location_id, location_name, location_description in location_rows
+        if location_name
+    ]
     return adventure, npcs, locations
 
 
-def is_adventure_author(adventure_id, user_id):
-    connection = get_db_connection()
+@cached('adventure:{adventure_id}')
+def get_adventure_with_version(adventure_id):
+    """
+    Загружает приключение с NPC и локациями одним запросом.
+
+    NPC и локации агрегируются раздельно, без декартова произведения,
+    в порядке id. Возвращает (приключение, NPC, локации, версия): версия
+    прочитана тем же запросом, что и данные, и годится для ETag страницы.
+    Для несуществующего приключения — (None, [], [], None).
+    """
+    connection = get_db_connection(read_only=True)
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                "SELECT userid FROM adventures WHERE adventureid = %s",
-                (adventure_id,)
-            )
-            result = cursor.fetchone()
-            return (result == user_id) or (result[0] == user_id)
-    finally:
-        connection.close()
+            run(cursor, ADVENTURE_VIEW_SQL, (adventure_id,))
+            row = cursor.fetchone()
+    except Exception:
+        rollback(connection)
+        raise
 
+    if not row:
+        return None, [], [], None
+    return (*adventure_view_from_row(row), version_from_row(row[5:]))
+
+
+def get_adventure(adventure_id):
+    """
+    Приключение, NPC и локации (см. `get_adventure_with_version`).
+    """
+    return get_adventure_with_version(adventure_id)[:3]
+
+
+DELETE_ADVENTURES_SQL = register('delete_adventures', """
+    WITH doomed AS (
+        SELECT adventureid
+        FROM adventures
+        WHERE adventureid = ANY(%(adventure_ids)s)
+          AND (%(user_id)s::integer IS NULL OR userid = %(user_id)s::integer)
+    ), doomed_campaigns AS (
+        SELECT c.campaignid
+        FROM campaigns c
+        JOIN doomed d ON c.adventureid = d.adventureid
+    ), deleted_memberships AS (
+        DELETE FROM users_campaigns uc
+        USING doomed_campaigns dc
+        WHERE uc.campaignid = dc.campaignid
+        RETURNING uc.userid
+    ), deleted_characters AS (
+        DELETE FROM player_characters pc
+        USING doomed_campaigns dc
+        WHERE pc.campaignid = dc.campaignid
+    ), deleted_campaigns AS (
+        DELETE FROM campaigns c
+        USING doomed_campaigns dc
+        WHERE c.campaignid = dc.campaignid
+        RETURNING c.campaignid
+    ), deleted_npcs AS (
+        DELETE FROM npcs n
+        USING doomed d
+        WHERE n.adventureid = d.adventureid
+    ), deleted_locations AS (
+        DELETE FROM locations l
+        USING doomed d
+        WHERE l.adventureid = d.adventureid
+    ), deleted_adventures AS (
+        DELETE FROM adventures a
+        USING doomed d
+        WHERE a.adventureid = d.adventureid
+        RETURNING a.adventureid, a.userid
+    )
+    SELECT coalesce((SELECT array_agg(adventureid) FROM deleted_adventures), '{}'),
+           coalesce((SELECT array_agg(campaignid) FROM deleted_campaigns), '{}'),
+           coalesce((SELECT array_agg(DISTINCT userid) FROM (
+               SELECT userid FROM deleted_adventures
+               UNION SELECT userid FROM deleted_memberships
+           ) affected), '{}')
+""")
+
+
+def delete_adventures(adventure_ids, user_id=None):
+    """
+    Удаляет приключения со всеми кампаниями, участниками, персонажами,
+    NPC и локациями одним запросом в одной транзакции.
+
+    Если задан `user_id`, удаляются только приключения этого автора,
+    остальные id молча пропускаются. Возвращает список удалённых id.
+    """
+    adventure_ids = [int(adventure_id) for adventure_id in adventure_ids]
+    if not adventure_ids:
+        return []
 
-def delete_adventure(adventure_id, user_id):
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            if is_adventure_author(adventure_id, user_id):
-                cursor.execute(
-                    "SELECT campaignid FROM campaigns WHERE adventureid = %s",
-                    (adventure_id,)
-                )
-                campaign_ids = [row[0] for row in cursor.fetchall()]
-
-                for campaign_id in campaign_ids:
-                    delete_campaign(campaign_id)
+            run(cursor, DELETE_ADVENTURES_SQL, {'adventure_ids': adventure_ids, 'user_id': user_id})
+            deleted_adventure_ids, deleted_campaign_ids, affected_user_ids = cursor.fetchone()
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
 
-                cursor.execute(
-                    "DELETE FROM npcs WHERE adventureid = %s",
-                    (adventure_id,)
-                )
+    if deleted_adventure_ids:
+        invalidate_after_commit(
+            'adventures',
+            *(f'adventure:{adventure_id}' for adventure_id in deleted_adventure_ids),
+            *(f'campaign:{campaign_id}' for campaign_id in deleted_campaign_ids)
+        )
+        invalidate_grants(*affected_user_ids)
+    return deleted_adventure_ids
 
-                cursor.execute(
-                    "DELETE FROM locations WHERE adventureid = %s",
-                    (adventure_id,)
-                )
 
-                cursor.execute(
-                    "DELETE FROM adventures WHERE adventureid = %s",
-                    (adventure_id,)
-                )
+def delete_adventure(adventure_id, user_id):
+    return bool(delete_adventures([adventure_id], user_id))
+
+
+def insert_adventures(cursor, adventures):
+    """
+    Пакетно вставляет приключения вместе с NPC и локациями.
+
+    `adventures` — список словарей с ключами userid, name, story, npcs и
+    locations (последние два — списки пар (название, описание)).
+    Использует текущую транзакцию курсора и не фиксирует её.
+    Возвращает id созданных приключений в порядке входного списка.
+    """
+    if not adventures:
+        return []
+
+    rows = run_values(
+        cursor,
+        'insert_adventures',
+        """
+        INSERT INTO adventures (userid, adventurename, story)
+        VALUES %s RETURNING adventureid
+        """,
+        [(adventure['userid'], adventure['name'], adventure['story']) for adventure in adventures],
+        page_size=len(adventures),
+        fetch=True
+    )
+    adventure_ids = [row[0] for row in rows]
 
-                connection.commit()
-    finally:
-        connection.close()
+    npcs = []
+    locations = []
+    for adventure_id, adventure in zip(adventure_ids, adventures):
+        npcs.extend(
+            (adventure_id, name, description)
+            for name, description in adventure.get('npcs', ())
+            if name and name.strip()
+        )
+        locations.extend(
+            (adventure_id, name, description)
+            for name, description in adventure.get('locations', ())
+            if name and name.strip()
+        )
+
+    if npcs:
+        run_values(
+            cursor,
+            'insert_npcs',
+            "INSERT INTO npcs (adventureid, npcname, npcdescription) VALUES %s",
+            npcs,
+            page_size=1000
+        )
+    if locations:
+        run_values(
+            cursor,
+            'insert_locations',
+            "INSERT INTO locations (adventureid, locationname, locationdescription) VALUES %s",
+            locations,
+            page_size=1000
+        )
+    return adventure_ids
 
 
 def create_adventure(userid, adventure_name, story, npc_data, npc_descriptions, location_data, location_descriptions):
@@ -176,282 +757,534 @@ def create_adventure(userid, adventure_name, story, npc_data, npc_descriptions,
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO adventures (userid, adventurename, story)
-                VALUES (%s, %s, %s) RETURNING adventureid
-                """,
-                (userid, adventure_name, story)
-            )
-            print(userid, adventure_name, story)
-            adventure_id = cursor.fetchone()[0]
-
-            for npc_name, npc_description in zip(npc_data, npc_descriptions):
-                if npc_name.strip():
-                    cursor.execute(
-                        """
-                        INSERT INTO npcs (adventureid, npcname, npcdescription)
-                        VALUES (%s, %s, %s)
-                        """,
-                        (adventure_id, npc_name, npc_description)
-                    )
-
-            for location_name, location_description in zip(location_data,
-                                                           location_descriptions):
-                if location_name.strip():
-                    cursor.execute(
-                        """
-                        INSERT INTO locations (adventureid, locationname, locationdescription)
-                        VALUES (%s, %s, %s)
-                        """,
-                        (adventure_id, location_name, location_description)
-                    )
+            insert_adventures(cursor, [{
+                'userid': userid,
+                'name': adventure_name,
+                'story': story,
+                'npcs': list(zip(npc_data, npc_descriptions)),
+                'locations': list(zip(location_data, location_descriptions)),
+            }])
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit('adventures')
+    invalidate_grants(userid)
 
-        connection.commit()
-    finally:
-        connection.close()
+
+UPDATE_ADVENTURE_SQL = register('update_adventure', """
+    UPDATE adventures
+    SET adventurename = %s, story = %s
+    WHERE adventureid = %s
+""")
 
 
 def update_adventure(adventure_id, form_data):
     connection = get_db_connection()
-
     try:
         with connection.cursor() as cursor:
             adventure_name = form_data.get('adventurename', [None])
             adventure_story = form_data.get('story', [None])
             if adventure_name and adventure_story:
-                cursor.execute(
-                    """
-                    UPDATE adventures
-                    SET adventurename = %s, story = %s
-                    WHERE adventureid = %s
-                    """,
-                    (adventure_name, adventure_story, adventure_id)
-                )
-            connection.commit()
+                run(cursor, UPDATE_ADVENTURE_SQL, (adventure_name, adventure_story, adventure_id))
+            namespaces = adventure_cache_namespaces(cursor, adventure_id)
+            commit(connection)
     except Exception:
-        connection.rollback()
+        rollback(connection)
         raise
-    finally:
-        connection.close()
+    invalidate_after_commit(*namespaces)
+
+
+CREATE_NPC_SQL = register('create_npc', """
+    INSERT INTO npcs (adventureid, npcname, npcdescription) VALUES (%s, %s, %s)
+""")
 
 
 def create_npc(adventure_id, name, description):
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO npcs (adventureid, npcname, npcdescription) VALUES (%s, %s, %s)",
-                (adventure_id, name, description)
-            )
-            connection.commit()
-    finally:
-        connection.close()
+            run(cursor, CREATE_NPC_SQL, (adventure_id, name, description))
+            namespaces = adventure_cache_namespaces(cursor, adventure_id)
+            commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(*namespaces)
+
 
+DELETE_NPC_SQL = register('delete_npc', """
+    DELETE FROM npcs
+    WHERE adventureid = %s
+      AND npcid = %s
+""")
 
-def delete_npc(adventure_id, name, description):
+
+def delete_npc(adventure_id, npc_id):
     connection = get_db_connection()
-    print(adventure_id, name, description)
+    logger.info("delete npc adventure_id=%s npc_id=%s", adventure_id, npc_id)
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                DELETE FROM npcs
-                WHERE adventureid = %s
-                  AND npcname = %s
-                  """,
-                (adventure_id, name)
-            )
-            connection.commit()
-    finally:
-        connection.close()
+            run(cursor, DELETE_NPC_SQL, (adventure_id, npc_id))
+            namespaces = adventure_cache_namespaces(cursor, adventure_id)
+            commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(*namespaces)
+
+
+CREATE_LOCATION_SQL = register('create_location', """
+    INSERT INTO locations (adventureid, locationname, locationdescription) VALUES (%s, %s, %s)
+""")
 
 
 def create_location(adventure_id, name, description):
-    print('create_location была вызвана')
+    logger.info("create location adventure_id=%s name=%r", adventure_id, name)
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO locations (adventureid, locationname, locationdescription) VALUES (%s, %s, %s)",
-                (adventure_id, name, description)
-            )
-            connection.commit()
-    finally:
-        connection.close()
+            run(cursor, CREATE_LOCATION_SQL, (adventure_id, name, description))
+            namespaces = adventure_cache_namespaces(cursor, adventure_id)
+            commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(*namespaces)
+
 
+DELETE_LOCATION_SQL = register('delete_location', """
+    DELETE FROM locations
+    WHERE adventureid = %s
+      AND locationid = %s
+""")
 
-def delete_location(adventure_id, location_name, location_description):
+
+def delete_location(adventure_id, location_id):
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute("""
-                            DELETE FROM locations
-                            WHERE adventureid = %s
-                              AND locationname = %s
-                              AND locationdescription = %s
-                        """, (adventure_id, location_name, location_description))
-            connection.commit()
-    finally:
-        connection.close()
-
-
-def get_all_campaigns(user_id):
+            run(cursor, DELETE_LOCATION_SQL, (adventure_id, location_id))
+            namespaces = adventure_cache_namespaces(cursor, adventure_id)
+            commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(*namespaces)
+
+
+# Дочерние строки приключения, которые редактор сохраняет целиком:
+# вид -> (таблица, id, имя, описание)
+ADVENTURE_ROW_TABLES = {
+    'npcs': ('npcs', 'npcid', 'npcname', 'npcdescription'),
+    'locations': ('locations', 'locationid', 'locationname', 'locationdescription'),
+}
+
+LOCK_ADVENTURE_SQL = register('lock_adventure', """
+    SELECT adventureid FROM adventures WHERE adventureid = %s FOR UPDATE
+""")
+
+ADVENTURE_ROWS_SQL = {
+    kind: register(f'adventure_{kind}', f"""
+        SELECT {id_column}, {name_column}, {description_column}
+        FROM {table}
+        WHERE adventureid = %s
+    """)
+    for kind, (table, id_column, name_column, description_column) in ADVENTURE_ROW_TABLES.items()
+}
+
+DELETE_ADVENTURE_ROWS_SQL = {
+    kind: register(f'delete_adventure_{kind}', f"""
+        DELETE FROM {table} WHERE adventureid = %s AND {id_column} = ANY(%s)
+    """)
+    for kind, (table, id_column, _, _) in ADVENTURE_ROW_TABLES.items()
+}
+
+
+def _row_values(name, description):
+    """
+    Имя и описание строки для сравнения: пустое описание из формы
+    и NULL в базе — одно и то же.
+    """
+    return name, description or None
+
+
+def _save_adventure_rows(cursor, kind, adventure_id, rows):
+    """
+    Приводит строки вида `kind` к набору `rows`: строки с id обновляются
+    (если изменились), без id — добавляются, отсутствующие в наборе —
+    удаляются. Каждое действие — один пакетный запрос.
+    """
+    table, id_column, name_column, description_column = ADVENTURE_ROW_TABLES[kind]
+    run(cursor, ADVENTURE_ROWS_SQL[kind], (adventure_id,))
+    current = {row_id: _row_values(name, description) for row_id, name, description in cursor.fetchall()}
+
+    inserts, updates, kept = [], [], set()
+    for row in rows:
+        values = _row_values(row['name'], row.get('description'))
+        if row.get('id') is None:
+            inserts.append((adventure_id, *values))
+            continue
+        if row['id'] not in current:
+            raise ValueError(f"{kind} {row['id']} does not belong to adventure {adventure_id}")
+        kept.add(row['id'])
+        if current[row['id']] != values:
+            updates.append((row['id'], adventure_id, *values))
+    deletes = [row_id for row_id in current if row_id not in kept]
+
+    if deletes:
+        run(cursor, DELETE_ADVENTURE_ROWS_SQL[kind], (adventure_id, deletes))
+    if updates:
+        run_values(
+            cursor,
+            f'update_adventure_{kind}',
+            f"""
+            UPDATE {table} AS t
+            SET {name_column} = v.name, {description_column} = v.description
+            FROM (VALUES %s) AS v (id, adventureid, name, description)
+            WHERE t.{id_column} = v.id AND t.adventureid = v.adventureid
+            """,
+            updates,
+            template='(%s, %s, %s::text, %s::text)',
+            page_size=1000
+        )
+    if inserts:
+        run_values(
+            cursor,
+            f'insert_{kind}',
+            f"INSERT INTO {table} (adventureid, {name_column}, {description_column}) VALUES %s",
+            inserts,
+            page_size=1000
+        )
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(deletes)}
+
+
+def save_adventure(adventure_id, adventure, npcs=None, locations=None):
+    """
+    Сохраняет приключение из редактора одной транзакцией.
+
+    `adventure` — название и сюжет ('adventurename', 'story'), `npcs`
+    и `locations` — полный желаемый набор строк [{'id', 'name',
+    'description'}], id None у новых. None вместо набора оставляет
+    строки как есть. Возвращает число добавленных, изменённых
+    и удалённых строк по видам; None, если приключения нет.
+    """
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT c.campaignid, a.adventurename
-                FROM campaigns c
-                JOIN adventures a ON c.adventureid = a.adventureid
-                JOIN users_campaigns uc ON uc.campaignid = c.campaignid
-                WHERE uc.userid = %s
-                """,
-                (user_id,)
-            )
-            campaigns = cursor.fetchall()
-    finally:
-        connection.close()
-    return campaigns
+            run(cursor, LOCK_ADVENTURE_SQL, (adventure_id,))
+            if cursor.fetchone() is None:
+                return None
+
+            if adventure.get('adventurename') and adventure.get('story'):
+                run(cursor, UPDATE_ADVENTURE_SQL, (adventure['adventurename'], adventure['story'], adventure_id))
+            changes = {
+                kind: _save_adventure_rows(cursor, kind, adventure_id, rows)
+                for kind, rows in (('npcs', npcs), ('locations', locations))
+                if rows is not None
+            }
+            namespaces = adventure_cache_namespaces(cursor, adventure_id)
+            commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(*namespaces)
+    return changes
 
 
-def create_campaign(user_id, adventure_id):
+def _apply_adventure_batch(name, sql, rows, adventure_ids, **kwargs):
+    """
+    Выполняет пакетный запрос `sql` (execute_values) над строками `rows`
+    и сбрасывает кеш приключений `adventure_ids`.
+    """
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute("CALL create_campaign_with_user(%s, %s)", (adventure_id, user_id))
-        connection.commit()
-    finally:
-        connection.close()
+            run_values(cursor, name, sql, rows, page_size=len(rows), **kwargs)
+            namespaces = adventures_cache_namespaces(cursor, adventure_ids)
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(*namespaces)
+
+
+def create_adventure_rows(kind, rows):
+    """
+    Добавляет NPC или локации (`kind` из ADVENTURE_ROW_TABLES) одним
+    INSERT; `rows` — [(id приключения, имя, описание)].
+    """
+    table, _, name_column, description_column = ADVENTURE_ROW_TABLES[kind]
+    _apply_adventure_batch(
+        f'insert_{kind}',
+        f"INSERT INTO {table} (adventureid, {name_column}, {description_column}) VALUES %s",
+        rows,
+        [row[0] for row in rows]
+    )
 
 
-def get_campaign(user_id, campaign_id):
-    connection = get_db_connection()
+def delete_adventure_rows(kind, rows):
+    """
+    Удаляет NPC или локации одним DELETE; `rows` — [(id приключения, id строки)].
+    """
+    table, id_column, _, _ = ADVENTURE_ROW_TABLES[kind]
+    _apply_adventure_batch(
+        f'delete_{kind}_by_id',
+        f"""
+        DELETE FROM {table} AS t
+        USING (VALUES %s) AS v (adventureid, id)
+        WHERE t.adventureid = v.adventureid AND t.{id_column} = v.id
+        """,
+        rows,
+        [row[0] for row in rows],
+        template='(%s::integer, %s::integer)'
+    )
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute(
-                """
-                SELECT uc.isauthor
-                FROM users_campaigns uc
-                WHERE uc.userid = %s AND uc.campaignid = %s
-                """,
-                (user_id, campaign_id)
-            )
-            user_campaign_data = cursor.fetchone()
 
-            if not user_campaign_data:
-                return None
+def update_adventures(rows):
+    """
+    Меняет название и сюжет приключений одним UPDATE; `rows` — [(id
+    приключения, название, сюжет)]. Из нескольких строк одного
+    приключения действует последняя.
+    """
+    latest = {row[0]: row for row in rows}
+    _apply_adventure_batch(
+        'update_adventures',
+        """
+        UPDATE adventures AS a
+        SET adventurename = v.name, story = v.story
+        FROM (VALUES %s) AS v (adventureid, name, story)
+        WHERE a.adventureid = v.adventureid
+        """,
+        list(latest.values()),
+        list(latest),
+        template='(%s::integer, %s::text, %s::text)'
+    )
 
-            is_author = user_campaign_data[
-                0]
 
-            cursor.execute(
-                """
-                SELECT a.adventurename, a.story, u.userlogin
-                FROM campaigns c
-                JOIN adventures a ON c.adventureid = a.adventureid
-                JOIN users u ON a.userid = u.userid
-                WHERE c.campaignid = %s
-                """,
-                (campaign_id,)
-            )
-            campaign_info = cursor.fetchone()
+ALL_CAMPAIGNS_SQL = register('all_campaigns', """
+    SELECT c.campaignid, a.adventurename
+    FROM campaigns c
+    JOIN adventures a ON c.adventureid = a.adventureid
+    JOIN users_campaigns uc ON uc.campaignid = c.campaignid
+    WHERE uc.userid = %s
+""")
 
-            if not campaign_info:
-                return None
 
-            cursor.execute(
-                """
-                SELECT npcname, npcdescription
-                FROM npcs
-                WHERE adventureid = (SELECT adventureid FROM campaigns WHERE campaignid = %s)
-                """,
-                (campaign_id,)
-            )
-            npcs = cursor.fetchall()
+def get_all_campaigns(user_id):
+    connection = get_db_connection(read_only=True)
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, ALL_CAMPAIGNS_SQL, (user_id,))
+            campaigns = cursor.fetchall()
+    except Exception:
+        rollback(connection)
+        raise
+    return campaigns
 
-            cursor.execute(
-                """
-                SELECT locationname, locationdescription
-                FROM locations
-                WHERE adventureid = (SELECT adventureid FROM campaigns WHERE campaignid = %s)
-                """,
-                (campaign_id,)
-            )
-            locations = cursor.fetchall()
 
-            cursor.execute(
-                """
-                SELECT u.userlogin, uc.isauthor
-                FROM users_campaigns uc
-                JOIN users u ON uc.userid = u.userid
-                WHERE uc.campaignid = %s
-                """,
-                (campaign_id,)
-            )
-            players = cursor.fetchall()
+def create_campaign(user_id, adventure_id):
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run_sql(cursor, 'create_campaign', "CALL create_campaign_with_user(%s, %s)", (adventure_id, user_id))
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    # Число кампаний по приключению показывается в каталоге
+    invalidate_after_commit('adventures')
+    invalidate_grants(user_id)
+
+
+class CampaignView(NamedTuple):
+    """
+    Всё, что нужно странице кампании, загруженное одним запросом.
+
+    `campaign_info` — (название, сюжет, логин автора приключения),
+    `npcs` и `locations` — пары (название, описание), `players` —
+    (логин, автор ли), `characters` — (имя, класс, уровень), `version` —
+    EntityVersion, прочитанная тем же запросом.
+    """
+    campaign_info: tuple
+    npcs: list
+    locations: list
+    players: list
+    characters: list
+    is_author: bool
+    campaign_id: int
+    version: object = None
+
+
+CAMPAIGN_VIEW_SQL = register('campaign_view', """
+    SELECT a.adventurename,
+           a.story,
+           u.userlogin,
+           (SELECT coalesce(json_agg(json_build_array(n.npcname, n.npcdescription)), '[]')
+            FROM npcs n
+            WHERE n.adventureid = c.adventureid) AS npcs,
+           (SELECT coalesce(json_agg(json_build_array(l.locationname, l.locationdescription)), '[]')
+            FROM locations l
+            WHERE l.adventureid = c.adventureid) AS locations,
+           (SELECT coalesce(json_agg(json_build_array(pu.userlogin, puc.isauthor)), '[]')
+            FROM users_campaigns puc
+            JOIN users pu ON puc.userid = pu.userid
+            WHERE puc.campaignid = c.campaignid) AS players,
+           (SELECT coalesce(json_agg(json_build_array(
+                       pc.charactername, pc.characterclass, pc.characterlevel)), '[]')
+            FROM player_characters pc
+            WHERE pc.campaignid = c.campaignid) AS characters,
+           c.revision,
+           a.revision,
+           greatest(c.updated_at, a.updated_at)
+    FROM campaigns c
+    JOIN adventures a ON a.adventureid = c.adventureid
+    JOIN users u ON u.userid = a.userid
+    WHERE c.campaignid = %s
+""")
+
+
+def campaign_view_from_row(row, campaign_id, is_author=False):
+    adventure_name, story, author, npcs, locations, players, characters = row[:7]
+    return CampaignView(
+        campaign_info=(adventure_name, story, author),
+        npcs=[tuple(npc) for npc in npcs],
+        locations=[tuple(location) for location in locations],
+        players=[tuple(player) for player in players],
+        characters=[tuple(character) for character in characters],
+        is_author=is_author,
+        campaign_id=campaign_id,
+        version=version_from_row(row[7:])
+    )
 
-            cursor.execute(
-                """
-                SELECT charactername, characterclass, characterlevel
-                FROM player_characters
-                WHERE campaignid = %s
-                """,
-                (campaign_id,)
-            )
-            characters = cursor.fetchall()
 
-    finally:
-        connection.close()
+@cached('campaign:{campaign_id}')
+def _load_campaign(campaign_id):
+    connection = get_db_connection(read_only=True)
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, CAMPAIGN_VIEW_SQL, (campaign_id,))
+            row = cursor.fetchone()
+    except Exception:
+        rollback(connection)
+        raise
+    return campaign_view_from_row(row, campaign_id) if row else None
 
-    return campaign_info, npcs, locations, players, characters, is_author, campaign_id
+
+def get_campaign(user_id, campaign_id):
+    """
+    Загружает страницу кампании за один запрос.
+
+    Участие проверяется по правам пользователя в памяти, а сама страница
+    кешируется одна на кампанию для всех участников. Возвращает
+    CampaignView или None, если кампании нет или пользователь не состоит в ней.
+    """
+    grants = get_user_grants(user_id)
+    if int(campaign_id) not in grants.campaigns:
+        return None
+    campaign = _load_campaign(int(campaign_id))
+    if campaign is None:
+        return None
+    return campaign._replace(is_author=grants.campaigns[int(campaign_id)])
+
+
+DELETE_CAMPAIGN_SQL = register('delete_campaign', """
+    WITH deleted_memberships AS (
+        DELETE FROM users_campaigns WHERE campaignid = %(campaign_id)s
+        RETURNING userid
+    ), deleted_characters AS (
+        DELETE FROM player_characters WHERE campaignid = %(campaign_id)s
+    ), deleted_campaign AS (
+        DELETE FROM campaigns WHERE campaignid = %(campaign_id)s
+    )
+    SELECT coalesce(array_agg(userid), '{}') FROM deleted_memberships
+""")
 
 
 def delete_campaign(campaign_id):
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
-                "DELETE FROM users_campaigns WHERE campaignid = %s",
-                (campaign_id,)
-            )
+            run(cursor, DELETE_CAMPAIGN_SQL, {'campaign_id': campaign_id})
+            member_ids = cursor.fetchone()[0]
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(f'campaign:{campaign_id}', 'adventures')
+    invalidate_grants(*member_ids)
 
-            cursor.execute(
-                "DELETE FROM player_characters WHERE campaignid = %s",
-                (campaign_id,)
-            )
 
-            cursor.execute(
-                "DELETE FROM campaigns WHERE campaignid = %s",
-                (campaign_id,)
-            )
-            connection.commit()
-    finally:
-        connection.close()
+CAMPAIGN_PLAYERS_RESOLVE_SQL = register('campaign_players_resolve', """
+    SELECT userlogin, userid FROM users WHERE userlogin = ANY(%s)
+""")
+
+
+def add_campaign_players(campaign_id, usernames):
+    """
+    Добавляет в кампанию игроков по списку логинов.
 
+    Логины разрешаются одним запросом, участия вставляются одним
+    многострочным INSERT; уже состоящие в кампании пропускаются.
+    Возвращает результат по каждому логину в порядке списка:
+    {'index', 'login', 'status'} со статусом 'added', 'already_member',
+    'not_found' или 'invalid' (пустой логин).
+    """
+    logins = [str(username).strip() for username in usernames]
 
-def create_users_campaigns(username, campaign_id):
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute("SELECT userid FROM users WHERE userlogin = %s",
-                           (username,))
-            user = cursor.fetchone()
-
-            if not user:
-                return "User not found", 404
-
-            user_id_to_add = user[0]
+            user_ids = {}
+            if any(logins):
+                run(cursor, CAMPAIGN_PLAYERS_RESOLVE_SQL, ([login for login in set(logins) if login],))
+                user_ids = dict(cursor.fetchall())
+            added_ids = set()
+            if user_ids:
+                rows = run_values(
+                    cursor,
+                    'add_campaign_players',
+                    """
+                    INSERT INTO users_campaigns (userid, campaignid, isauthor) VALUES %s
+                    ON CONFLICT (userid, campaignid) DO NOTHING
+                    RETURNING userid
+                    """,
+                    [(user_id, campaign_id, False) for user_id in set(user_ids.values())],
+                    page_size=len(user_ids),
+                    fetch=True
+                )
+                added_ids = {row[0] for row in rows}
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
 
-            cursor.execute(
-                "INSERT INTO users_campaigns (userid, campaignid, isauthor) VALUES (%s, %s, FALSE)",
-                (user_id_to_add, campaign_id)
-            )
-        connection.commit()
-    finally:
-        connection.close()
+    results = []
+    reported = set()
+    for index, login in enumerate(logins):
+        user_id = user_ids.get(login)
+        if not login:
+            status = 'invalid'
+        elif user_id is None:
+            status = 'not_found'
+        elif user_id in added_ids and user_id not in reported:
+            status = 'added'
+        else:
+            status = 'already_member'
+        reported.add(user_id)
+        results.append({'index': index, 'login': login, 'status': status})
+
+    if added_ids:
+        invalidate_after_commit(f'campaign:{campaign_id}')
+        invalidate_grants(*added_ids)
+    return results
+
+
+CREATE_PLAYER_CHARACTER_SQL = register('create_player_character', """
+    INSERT INTO player_characters (campaignid, charactername, characterdescription, characterlevel,
+                                   characterclass, characterskills, characterarmor, characterhp)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+""")
 
 
 def create_player_character(
@@ -467,16 +1300,238 @@ def create_player_character(
     connection = get_db_connection()
     try:
         with connection.cursor() as cursor:
-            cursor.execute(
+            run(cursor, CREATE_PLAYER_CHARACTER_SQL, (
+                campaign_id, charactername, characterdescription,
+                characterlevel, characterclass,
+                characterskills, characterarmor, characterhp
+            ))
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(f'campaign:{campaign_id}')
+
+
+# Обязательные поля персонажа в пакетном добавлении
+CHARACTER_REQUIRED_FIELDS = ('name', 'level', 'class', 'armor', 'hp')
+
+
+def character_row(campaign_id, character):
+    """
+    Строка player_characters из словаря персонажа с ключами name,
+    description, level, class, skills, armor, hp. ValueError — поля
+    не заданы или не числа.
+    """
+    if not isinstance(character, dict):
+        raise ValueError("Character must be an object")
+    missing = [key for key in CHARACTER_REQUIRED_FIELDS if character.get(key) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+    try:
+        level, armor, hp = int(character['level']), int(character['armor']), int(character['hp'])
+    except (TypeError, ValueError):
+        raise ValueError("level, armor and hp must be integers")
+    return (
+        campaign_id, character['name'], character.get('description'), level,
+        character['class'], character.get('skills'), armor, hp
+    )
+
+
+def add_campaign_characters(campaign_id, characters):
+    """
+    Добавляет в кампанию персонажей одним многострочным INSERT.
+
+    Персонажи с неверными полями не вставляются и возвращаются с ошибкой,
+    остальные добавляются. Результат по каждому персонажу в порядке
+    списка: {'index', 'name', 'status': 'created', 'id'} или
+    {'index', 'name', 'status': 'invalid', 'error'}.
+    """
+    results = []
+    rows = []
+    for index, character in enumerate(characters):
+        name = character.get('name') if isinstance(character, dict) else None
+        try:
+            rows.append(character_row(campaign_id, character))
+        except ValueError as e:
+            results.append({'index': index, 'name': name, 'status': 'invalid', 'error': str(e)})
+            continue
+        results.append({'index': index, 'name': name, 'status': 'created'})
+
+    if not rows:
+        return results
+
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            created = run_values(
+                cursor,
+                'add_campaign_characters',
                 """
                 INSERT INTO player_characters (campaignid, charactername, characterdescription, characterlevel,
                                                characterclass, characterskills, characterarmor, characterhp)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES %s RETURNING characterid
                 """,
-                (campaign_id, charactername, characterdescription,
-                 characterlevel, characterclass,
-                 characterskills, characterarmor, characterhp)
+                rows,
+                page_size=len(rows),
+                fetch=True
             )
-        connection.commit()
-    finally:
-        connection.close()
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+
+    character_ids = iter(row[0] for row in created)
+    for result in results:
+        if result['status'] == 'created':
+            result['id'] = next(character_ids)
+    invalidate_after_commit(f'campaign:{campaign_id}')
+    return results
+
+
+def create_player_characters(rows):
+    """
+    Добавляет персонажей в кампании одним INSERT; `rows` — строки
+    `character_row`.
+    """
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run_values(
+                cursor,
+                'create_player_characters',
+                """
+                INSERT INTO player_characters (campaignid, charactername, characterdescription, characterlevel,
+                                               characterclass, characterskills, characterarmor, characterhp)
+                VALUES %s
+                """,
+                rows,
+                page_size=len(rows)
+            )
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit(*sorted({f'campaign:{row[0]}' for row in rows}))
+
+
+class EntityVersion(NamedTuple):
+    """
+    Версия страницы для условных запросов: `revision` входит в ETag,
+    `updated_at` отдаётся как Last-Modified.
+
+    Отдельные get_*_version нужны только для быстрого ответа 304; ответ
+    с телом берёт версию, загруженную вместе с его данными.
+    """
+    revision: str
+    updated_at: object
+
+
+ADVENTURE_VERSION_SQL = register('adventure_version', """
+    SELECT revision, updated_at FROM adventures WHERE adventureid = %s
+""")
+
+CAMPAIGN_VERSION_SQL = register('campaign_version', """
+    SELECT c.revision, a.revision, greatest(c.updated_at, a.updated_at)
+    FROM campaigns c
+    JOIN adventures a ON a.adventureid = c.adventureid
+    WHERE c.campaignid = %s
+""")
+
+# Версия каталога — сумма счётчиков catalogue_version (миграция 010):
+# 16 строк вместо агрегата по всему каталогу
+CATALOGUE_VERSION_SQL = register('catalogue_version', """
+    SELECT sum(revision), max(changed_at) FROM catalogue_version
+""")
+
+
+def version_from_row(row):
+    """
+    EntityVersion из колонок (ревизия, ..., время изменения) или None.
+    """
+    if not row:
+        return None
+    *revisions, updated_at = row
+    return EntityVersion('.'.join(map(str, revisions)), updated_at)
+
+
+def _fetch_version(query, params):
+    connection = get_db_connection(read_only=True)
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, query, params)
+            row = cursor.fetchone()
+    except Exception:
+        rollback(connection)
+        raise
+    return version_from_row(row)
+
+
+def get_adventure_version(adventure_id):
+    return _fetch_version(ADVENTURE_VERSION_SQL, (adventure_id,))
+
+
+def get_campaign_version(user_id, campaign_id):
+    """
+    Версия страницы кампании для участника: меняется и при правке кампании
+    (игроки, персонажи), и при правке её приключения. None, если
+    пользователь не состоит в кампании.
+    """
+    if not is_campaign_member(campaign_id, user_id):
+        return None
+    return _fetch_version(CAMPAIGN_VERSION_SQL, (campaign_id,))
+
+
+def get_catalogue_version():
+    return _fetch_version(CATALOGUE_VERSION_SQL, ())
+
+
+REFRESH_ADVENTURE_CATALOGUE_SQL = register('refresh_adventure_catalogue', """
+    WITH refreshed AS (
+        INSERT INTO adventure_catalogue (
+            adventureid, adventurename, author, npc_count, location_count, campaign_count, updated_at
+        )
+        SELECT a.adventureid,
+               a.adventurename,
+               u.userlogin,
+               (SELECT count(*) FROM npcs n WHERE n.adventureid = a.adventureid),
+               (SELECT count(*) FROM locations l WHERE l.adventureid = a.adventureid),
+               (SELECT count(*) FROM campaigns c WHERE c.adventureid = a.adventureid),
+               a.updated_at
+        FROM adventures a
+        JOIN users u ON u.userid = a.userid
+        ON CONFLICT (adventureid) DO UPDATE
+        SET adventurename = EXCLUDED.adventurename,
+            author = EXCLUDED.author,
+            npc_count = EXCLUDED.npc_count,
+            location_count = EXCLUDED.location_count,
+            campaign_count = EXCLUDED.campaign_count
+        WHERE (adventure_catalogue.adventurename, adventure_catalogue.author, adventure_catalogue.npc_count,
+               adventure_catalogue.location_count, adventure_catalogue.campaign_count)
+              IS DISTINCT FROM
+              (EXCLUDED.adventurename, EXCLUDED.author, EXCLUDED.npc_count,
+               EXCLUDED.location_count, EXCLUDED.campaign_count)
+        RETURNING adventureid
+    )
+    SELECT count(*) FROM refreshed
+""")
+
+
+def refresh_adventure_catalogue():
+    """
+    Пересчитывает сводку каталога по исходным таблицам и исправляет
+    разошедшиеся строки (например, после правки данных в обход триггеров).
+    Полный проход по приключениям — запускается фоновой задачей.
+    Возвращает число исправленных строк.
+    """
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, REFRESH_ADVENTURE_CATALOGUE_SQL, ())
+            refreshed = cursor.fetchone()[0]
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    if refreshed:
+        invalidate_after_commit('adventures')
+    return refreshed
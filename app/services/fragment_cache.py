@@ -0,0 +1,83 @@
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from app.services.cache import MemoryCache
+
+
+class FragmentCacheExtension(Extension):
+    """
+    Тег {% cache %} для кеширования отрендеренных фрагментов шаблона:
+
+        {% cache 'adventure-tables', adventure.id, revision %}
+            ... тяжёлые таблицы ...
+        {% endcache %}
+
+    Ключ — все переданные значения: имя фрагмента и то, от чего зависит
+    его содержимое (id и версия сущности, параметры выдачи). Версия должна
+    быть загружена тем же запросом, что и данные фрагмента, иначе под новой
+    версией может закешироваться старое содержимое. Если одно из значений
+    None, фрагмент рендерится без кеша. Внутри блока нельзя
+    использовать данные сессии — они попадут в кеш для всех пользователей.
+
+    Кеш берётся из окружения шаблонов (`fragment_cache`), а не из
+    current_app: тот же тег работает в асинхронном окружении Quart.
+    """
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def _render_cached(self, key, caller):
+        cache = self.environment.fragment_cache
+        if cache is None or any(part is None for part in key):
+            return caller()
+
+        cache_key = repr(tuple(key))
+        fragment = cache.get(cache_key)
+        if self.environment.is_async:
+            # В асинхронном окружении caller() — корутина, результат
+            # вызова метода шаблон дожидается сам
+            return self._render_cached_async(cache, cache_key, fragment, caller)
+        if fragment is None:
+            fragment = str(caller())
+            cache.set(cache_key, fragment)
+        return Markup(fragment)
+
+    @staticmethod
+    async def _render_cached_async(cache, cache_key, fragment, caller):
+        if fragment is None:
+            fragment = str(await caller())
+            cache.set(cache_key, fragment)
+        return Markup(fragment)
+
+
+def init_app(app, cache=None):
+    """
+    Подключает тег {% cache %} к шаблонам приложения. `cache` — кеш
+    фрагментов другого приложения того же процесса: ASGI-режим делит
+    его с Flask-приложением.
+    """
+    if cache is None and app.config["FRAGMENT_CACHE_ENABLED"]:
+        cache = MemoryCache(app.config["FRAGMENT_CACHE_MAX_ENTRIES"], app.config["FRAGMENT_CACHE_TTL"])
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = cache
+    if cache is not None:
+        app.extensions['fragment_cache'] = cache
+
+
+def get_fragment_cache_stats():
+    cache = current_app.extensions.get('fragment_cache')
+    return cache.stats() if cache is not None else {}
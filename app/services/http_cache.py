@@ -0,0 +1,48 @@
+import hashlib
+
+from flask import current_app, request, session
+
+
+def make_etag(*parts):
+    """
+    Сильный ETag страницы по версии данных и всему, от чего зависит HTML:
+    пути, параметрам запроса и пользователю сессии.
+    """
+    key = (
+        current_app.config["HTTP_CACHE_SALT"],
+        request.path,
+        request.query_string,
+        session.get('userid'),
+        session.get('role'),
+    ) + parts
+    return hashlib.sha1(repr(key).encode()).hexdigest()
+
+
+def not_modified(etag, last_modified=None):
+    """
+    Ответ 304, если у клиента актуальная версия страницы, иначе None.
+
+    If-None-Match проверяется в первую очередь; If-Modified-Since —
+    только если клиент не прислал ETag (точность Last-Modified — секунда).
+    """
+    if request.if_none_match:
+        if not request.if_none_match.contains(etag):
+            return None
+    elif last_modified is None or request.if_modified_since is None:
+        return None
+    elif last_modified.replace(microsecond=0) > request.if_modified_since:
+        return None
+
+    response = current_app.response_class(status=304)
+    return add_validators(response, etag, last_modified)
+
+
+def add_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Страница зависит от сессии и должна перепроверяться при каждом показе
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
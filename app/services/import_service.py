@@ -0,0 +1,172 @@
+import csv
+import io
+import json
+
+from app.services.db_service import (
+    commit, get_db_connection, insert_adventures, invalidate_after_commit, invalidate_grants, rollback
+)
+from app.services.queries import run_sql
+
+
+class AdventureImportError(ValueError):
+    """
+    Файл импорта имеет неверный формат или ссылается на неизвестных авторов.
+    """
+
+
+def parse_json(text):
+    """
+    Разбирает JSON-массив приключений:
+
+        [{"name": "...", "story": "...", "author": "login",
+          "npcs": [{"name": "...", "description": "..."}],
+          "locations": [{"name": "...", "description": "..."}]}]
+
+    Поле author необязательно, если автор задаётся при импорте.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise AdventureImportError(f"Invalid JSON: {e}") from e
+    if not isinstance(data, list):
+        raise AdventureImportError("Expected a JSON array of adventures")
+
+    records = []
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            raise AdventureImportError(f"Adventure #{index} is not an object")
+        for field in ('author', 'name', 'story'):
+            _check_text(item.get(field), f"Adventure #{index}: {field}")
+        records.append({
+            'author': item.get('author'),
+            'name': item.get('name'),
+            'story': item.get('story'),
+            'npcs': _parse_items(item, 'npcs', index),
+            'locations': _parse_items(item, 'locations', index),
+        })
+    return records
+
+
+def _check_text(value, label):
+    if value is not None and not isinstance(value, str):
+        raise AdventureImportError(f"{label} must be a string")
+
+
+def _parse_items(item, key, index):
+    """
+    Пары (имя, описание) из списка NPC или локаций приключения #index.
+    """
+    items = item.get(key)
+    if items is None:
+        return []
+    if not isinstance(items, list):
+        raise AdventureImportError(f"Adventure #{index}: {key} must be an array")
+    pairs = []
+    for position, entry in enumerate(items):
+        label = f"Adventure #{index}: {key}[{position}]"
+        if not isinstance(entry, dict):
+            raise AdventureImportError(f"{label} is not an object")
+        _check_text(entry.get('name'), f"{label} name")
+        _check_text(entry.get('description'), f"{label} description")
+        pairs.append((entry.get('name'), entry.get('description')))
+    return pairs
+
+
+def parse_csv(text):
+    """
+    Разбирает CSV с колонками type, adventure, author, story, name, description.
+
+    Строка с type=adventure задаёт приключение (adventure, author, story),
+    строки npc и location добавляют к приключению с тем же названием
+    (и автором) элемент name/description.
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    required = {'type', 'adventure'}
+    if not reader.fieldnames or not required <= set(reader.fieldnames):
+        raise AdventureImportError("CSV must have at least 'type' and 'adventure' columns")
+
+    records = {}
+    for line_number, row in enumerate(reader, start=2):
+        key = (row.get('author') or None, row['adventure'])
+        kind = row['type']
+        if kind == 'adventure':
+            records[key] = {
+                'author': key[0],
+                'name': row['adventure'],
+                'story': row.get('story'),
+                'npcs': [],
+                'locations': [],
+            }
+        elif kind in ('npc', 'location'):
+            if key not in records:
+                raise AdventureImportError(f"Line {line_number}: {kind} refers to unknown adventure")
+            records[key][kind + 's'].append((row.get('name'), row.get('description')))
+        else:
+            raise AdventureImportError(f"Line {line_number}: unknown type '{kind}'")
+    return list(records.values())
+
+
+def parse_file(filename, text):
+    if filename.lower().endswith('.csv'):
+        return parse_csv(text)
+    return parse_json(text)
+
+
+def resolve_authors(cursor, records, userid=None):
+    """
+    Проставляет userid записям: либо заданный, либо по логину из поля author
+    одним запросом на все логины.
+    """
+    if userid is not None:
+        for record in records:
+            record['userid'] = userid
+        return records
+
+    logins = {record['author'] for record in records}
+    if None in logins:
+        raise AdventureImportError("Every adventure needs an author when no default author is given")
+    run_sql(
+        cursor,
+        'import_resolve_authors',
+        "SELECT userlogin, userid FROM users WHERE userlogin = ANY(%s)",
+        (list(logins),)
+    )
+    user_ids = dict(cursor.fetchall())
+    missing = logins - user_ids.keys()
+    if missing:
+        raise AdventureImportError(f"Unknown authors: {', '.join(sorted(missing))}")
+
+    for record in records:
+        record['userid'] = user_ids[record['author']]
+    return records
+
+
+def validate_records(records):
+    for index, record in enumerate(records):
+        if not record.get('name') or not record.get('story'):
+            raise AdventureImportError(f"Adventure #{index}: name and story are required")
+
+
+def import_adventures(records, userid=None, batch_size=1000):
+    """
+    Импортирует приключения с NPC и локациями в одной транзакции.
+
+    Если задан `userid`, все приключения создаются от его имени,
+    иначе автор берётся из поля author каждой записи. Возвращает
+    число созданных приключений.
+    """
+    validate_records(records)
+
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            resolve_authors(cursor, records, userid)
+            for start in range(0, len(records), batch_size):
+                insert_adventures(cursor, records[start:start + batch_size])
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    invalidate_after_commit('adventures')
+    invalidate_grants(*{record['userid'] for record in records})
+    return len(records)
@@ -0,0 +1,505 @@
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from typing import NamedTuple
+
+import psycopg2
+from flask import current_app, g
+from psycopg2.extras import Json
+
+from app.services.cache_sync import start_listener
+from app.services.db_service import (
+    _connect_kwargs, commit, delete_adventures, delete_campaign, get_db_connection, refresh_adventure_catalogue,
+    rollback, transaction
+)
+from app.services.import_service import import_adventures
+from app.services.queries import register, run
+
+logger = logging.getLogger(__name__)
+
+# Канал NOTIFY, по которому воркеры узнают о новых задачах без опроса
+JOBS_CHANNEL = 'jobs'
+
+# Ключ pg_advisory_xact_lock: воркеры выбирают задачи по очереди, чтобы
+# подсчёт выполняющихся задач и захват следующей были атомарны
+JOBS_CLAIM_LOCK = 7243001
+
+
+class JobLost(RuntimeError):
+    """
+    Задачу, пока она выполнялась, вернули в очередь как зависшую:
+    результат этого выполнения не фиксируется.
+    """
+
+
+class Job(NamedTuple):
+    id: int
+    kind: str
+    status: str
+    user_id: object
+    attempts: int
+    max_attempts: int
+    run_after: object
+    last_error: object
+    result: object
+    created_at: object
+    finished_at: object
+
+
+# Обработчики задач: kind -> функция(payload), возвращающая результат
+# для поля result (JSON). Ошибка ValueError (неверные данные) завершает
+# задачу сразу, остальные ошибки повторяются с задержкой.
+JOB_HANDLERS = {}
+
+
+def handler(kind):
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+@handler('delete_adventures')
+def _delete_adventures_job(payload):
+    return {'deleted': delete_adventures(payload['adventure_ids'], payload.get('user_id'))}
+
+
+@handler('delete_campaign')
+def _delete_campaign_job(payload):
+    delete_campaign(payload['campaign_id'])
+    return {'deleted': payload['campaign_id']}
+
+
+@handler('import_adventures')
+def _import_adventures_job(payload):
+    return {'imported': import_adventures(payload['records'], userid=payload.get('user_id'))}
+
+
+@handler('refresh_catalogue')
+def _refresh_catalogue_job(payload):
+    return {'refreshed': refresh_adventure_catalogue()}
+
+
+ENQUEUE_JOB_SQL = register('job_enqueue', """
+    WITH job AS (
+        INSERT INTO jobs (kind, payload, userid, max_attempts)
+        VALUES (%(kind)s, %(payload)s, %(user_id)s, %(max_attempts)s)
+        RETURNING jobid, kind
+    )
+    SELECT jobid, pg_notify('jobs', kind) FROM job
+""")
+
+GET_JOB_SQL = register('job_get', """
+    SELECT jobid, kind, status, userid, attempts, max_attempts, run_after,
+           last_error, result, created_at, finished_at
+    FROM jobs
+    WHERE jobid = %s
+""")
+
+JOB_CLAIM_LOCK_SQL = register('job_claim_lock', """
+    SELECT pg_advisory_xact_lock(%s)
+""")
+
+# Задача, воркер которой давно не подавал признаков жизни, возвращается
+# в очередь (или завершается ошибкой, если попытки исчерпаны)
+REQUEUE_STALE_JOBS_SQL = register('job_requeue_stale', """
+    UPDATE jobs
+    SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+        finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE now() END,
+        last_error = 'worker ' || locked_by || ' stopped responding',
+        locked_by = NULL,
+        locked_at = NULL
+    WHERE status = 'running' AND locked_at < now() - make_interval(secs => %s)
+""")
+
+RUNNING_JOBS_SQL = register('job_running', """
+    SELECT kind, count(*) FROM jobs WHERE status = 'running' GROUP BY kind
+""")
+
+CLAIM_JOB_SQL = register('job_claim', """
+    UPDATE jobs
+    SET status = 'running', attempts = attempts + 1, locked_by = %(worker)s, locked_at = now()
+    WHERE jobid = (
+        SELECT jobid FROM jobs
+        WHERE status = 'queued' AND run_after <= now() AND kind = ANY(%(kinds)s)
+        ORDER BY run_after, jobid
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING jobid, kind, payload, attempts
+""")
+
+CLAIM_JOB_BY_ID_SQL = register('job_claim_by_id', """
+    UPDATE jobs
+    SET status = 'running', attempts = attempts + 1, locked_by = %(worker)s, locked_at = now()
+    WHERE jobid = %(job_id)s AND status = 'queued'
+    RETURNING jobid, kind, payload, attempts
+""")
+
+HEARTBEAT_JOBS_SQL = register('job_heartbeat', """
+    UPDATE jobs SET locked_at = now() WHERE status = 'running' AND locked_by = %s
+""")
+
+HEARTBEAT_WORKER_SQL = register('job_worker_heartbeat', """
+    INSERT INTO job_workers (workerid, kinds, heartbeat_at)
+    VALUES (%(worker)s, %(kinds)s, now())
+    ON CONFLICT (workerid) DO UPDATE SET kinds = EXCLUDED.kinds, heartbeat_at = now()
+""")
+
+UNREGISTER_WORKER_SQL = register('job_worker_unregister', """
+    DELETE FROM job_workers WHERE workerid = %s
+""")
+
+PURGE_STALE_WORKERS_SQL = register('job_worker_purge_stale', """
+    DELETE FROM job_workers WHERE heartbeat_at < now() - make_interval(secs => %s)
+""")
+
+WORKER_ALIVE_SQL = register('job_worker_alive', """
+    SELECT EXISTS (
+        SELECT 1 FROM job_workers
+        WHERE %(kind)s = ANY(kinds) AND heartbeat_at >= now() - make_interval(secs => %(stale_after)s)
+    )
+""")
+
+COMPLETE_JOB_SQL = register('job_complete', """
+    UPDATE jobs
+    SET status = 'done', result = %(result)s, last_error = NULL,
+        finished_at = now(), locked_by = NULL, locked_at = NULL
+    WHERE jobid = %(job_id)s AND status = 'running' AND locked_by = %(worker)s
+""")
+
+# Повтор через backoff * 2^(попытка - 1) секунд, но не позже backoff_max
+FAIL_JOB_SQL = register('job_fail', """
+    UPDATE jobs
+    SET status = CASE WHEN %(retry)s AND attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+        finished_at = CASE WHEN %(retry)s AND attempts < max_attempts THEN NULL ELSE now() END,
+        run_after = now() + make_interval(secs => least(%(backoff)s * 2 ^ (attempts - 1), %(backoff_max)s)),
+        last_error = %(error)s,
+        locked_by = NULL,
+        locked_at = NULL
+    WHERE jobid = %(job_id)s AND status = 'running' AND locked_by = %(worker)s
+    RETURNING status, run_after
+""")
+
+PURGE_JOBS_SQL = register('job_purge', """
+    DELETE FROM jobs
+    WHERE status IN ('done', 'failed') AND finished_at < now() - make_interval(days => %s)
+""")
+
+
+def enqueue(kind, payload, user_id=None, max_attempts=None):
+    """
+    Ставит задачу в очередь и возвращает её id.
+
+    Внутри `transaction()` задача появляется в очереди только вместе
+    с остальными изменениями блока; воркеры получают NOTIFY при фиксации.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, ENQUEUE_JOB_SQL, {
+                'kind': kind,
+                'payload': Json(payload),
+                'user_id': user_id,
+                'max_attempts': max_attempts or current_app.config["JOBS_MAX_ATTEMPTS"],
+            })
+            job_id = cursor.fetchone()[0]
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    return job_id
+
+
+def worker_alive(kind):
+    """
+    Есть ли воркер, который недавно подавал признаки жизни и берёт задачи `kind`.
+    """
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, WORKER_ALIVE_SQL, {'kind': kind, 'stale_after': current_app.config["JOBS_STALE_AFTER"]})
+            alive = cursor.fetchone()[0]
+    except Exception:
+        rollback(connection)
+        raise
+    return alive
+
+
+def submit(kind, payload, user_id=None):
+    """
+    Ставит задачу в очередь и возвращает её id; выполняет её jobs-worker.
+
+    С JOBS_RUN_INLINE (только разработка и тесты) задача, для вида которой
+    нет живых воркеров, сразу выполняется в текущем процессе; лимиты
+    JOBS_CONCURRENCY к такому выполнению не применяются. Внутри
+    `transaction()` задача всегда только ставится в очередь.
+    """
+    job_id = enqueue(kind, payload, user_id=user_id)
+    if (current_app.config["JOBS_RUN_INLINE"] and not g.get('db_transaction_depth')
+            and not worker_alive(kind)):
+        logger.warning("no live job workers, running inline job_id=%s kind=%s", job_id, kind)
+        JobWorker(current_app._get_current_object(), kinds=[kind]).run_job(job_id)
+    return job_id
+
+
+def get_job(job_id):
+    """
+    Состояние задачи для опроса статуса (с основного сервера: реплика
+    может отставать от воркера). None, если задачи нет.
+    """
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, GET_JOB_SQL, (job_id,))
+            row = cursor.fetchone()
+    except Exception:
+        rollback(connection)
+        raise
+    return Job(*row) if row else None
+
+
+def purge_jobs(older_than_days):
+    """
+    Удаляет завершённые задачи старше `older_than_days` дней; возвращает их число.
+    """
+    connection = get_db_connection()
+    try:
+        with connection.cursor() as cursor:
+            run(cursor, PURGE_JOBS_SQL, (older_than_days,))
+            purged = cursor.rowcount
+        commit(connection)
+    except Exception:
+        rollback(connection)
+        raise
+    return purged
+
+
+class JobWorker:
+    """
+    Выполняет задачи очереди в `concurrency` потоках.
+
+    Лимиты JOBS_CONCURRENCY общие для всех воркеров: задача берётся,
+    только если задач её вида выполняется меньше лимита. Обработчик
+    и отметка о завершении фиксируются одной транзакцией, поэтому
+    прерванная задача не оставляет половины изменений и выполняется
+    заново. Пока задачи идут, воркер продлевает им locked_at; задачи
+    воркера, молчащего дольше JOBS_STALE_AFTER секунд, возвращаются
+    в очередь.
+    """
+
+    def __init__(self, app, kinds=None, concurrency=1, poll_interval=None):
+        config = app.config
+        self.app = app
+        self.kinds = list(kinds or JOB_HANDLERS)
+        unknown = set(self.kinds) - JOB_HANDLERS.keys()
+        if unknown:
+            raise ValueError(f"Unknown job kinds: {', '.join(sorted(unknown))}")
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval or config["JOBS_POLL_INTERVAL"]
+        self.limits = {
+            kind: config["JOBS_CONCURRENCY"].get(kind, config["JOBS_DEFAULT_CONCURRENCY"])
+            for kind in self.kinds
+        }
+        self.stale_after = config["JOBS_STALE_AFTER"]
+        self.backoff = config["JOBS_RETRY_BACKOFF"]
+        self.backoff_max = config["JOBS_RETRY_BACKOFF_MAX"]
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+
+    def stop(self):
+        """
+        Просит воркер остановиться после текущих задач.
+        """
+        self._stopping.set()
+        self._wakeup.set()
+
+    def run(self, once=False):
+        """
+        Выполняет задачи до `stop()`. С `once` — только уже готовые
+        к выполнению задачи, в одном потоке, и возвращается.
+        """
+        if once:
+            while self.run_one():
+                pass
+            return
+
+        # Сбросы кеша от веб-процессов: обработчики читают через тот же кеш
+        start_listener(self.app)
+        threads = [
+            threading.Thread(target=self._loop, name=f'job-worker-{number}', daemon=True)
+            for number in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        logger.info("job worker started worker=%s threads=%d kinds=%s",
+                    self.worker_id, self.concurrency, ','.join(self.kinds))
+        try:
+            self._listen()
+        finally:
+            self.stop()
+            for thread in threads:
+                thread.join()
+            self._unregister()
+        logger.info("job worker stopped worker=%s", self.worker_id)
+
+    def run_one(self):
+        """
+        Берёт и выполняет одну задачу; False — подходящих задач нет.
+        """
+        with self.app.app_context():
+            claimed = self._claim()
+        if claimed is None:
+            return False
+        with self.app.app_context():
+            self._execute(*claimed)
+        return True
+
+    def run_job(self, job_id):
+        """
+        Выполняет в текущем контексте приложения задачу `job_id`, если она
+        ещё в очереди; False — её уже взял другой воркер.
+        """
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                run(cursor, CLAIM_JOB_BY_ID_SQL, {'worker': self.worker_id, 'job_id': job_id})
+                claimed = cursor.fetchone()
+            commit(connection)
+        except Exception:
+            connection.rollback()
+            raise
+        if claimed is None:
+            return False
+        self._execute(*claimed)
+        return True
+
+    def _loop(self):
+        while not self._stopping.is_set():
+            try:
+                if self.run_one():
+                    continue
+            except Exception:
+                logger.exception("job worker error worker=%s", self.worker_id)
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _claim(self):
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                run(cursor, JOB_CLAIM_LOCK_SQL, (JOBS_CLAIM_LOCK,))
+                run(cursor, REQUEUE_STALE_JOBS_SQL, (self.stale_after,))
+                run(cursor, PURGE_STALE_WORKERS_SQL, (self.stale_after,))
+                run(cursor, RUNNING_JOBS_SQL, ())
+                running = dict(cursor.fetchall())
+                kinds = [kind for kind in self.kinds if running.get(kind, 0) < self.limits[kind]]
+                row = None
+                if kinds:
+                    run(cursor, CLAIM_JOB_SQL, {'worker': self.worker_id, 'kinds': kinds})
+                    row = cursor.fetchone()
+            commit(connection)
+        except Exception:
+            connection.rollback()
+            raise
+        return row
+
+    def _execute(self, job_id, kind, payload, attempt):
+        started = time.perf_counter()
+        try:
+            with transaction() as connection:
+                result = JOB_HANDLERS[kind](payload)
+                with connection.cursor() as cursor:
+                    run(cursor, COMPLETE_JOB_SQL, {
+                        'job_id': job_id, 'worker': self.worker_id, 'result': Json(result),
+                    })
+                    if cursor.rowcount == 0:
+                        raise JobLost(f"Job {job_id} was taken over while running")
+        except JobLost:
+            logger.warning("job lost job_id=%s kind=%s attempt=%d", job_id, kind, attempt)
+            return
+        except Exception as e:
+            self._fail(job_id, kind, attempt, e)
+            return
+        logger.info("job done job_id=%s kind=%s attempt=%d elapsed=%.3f",
+                    job_id, kind, attempt, time.perf_counter() - started)
+
+    def _fail(self, job_id, kind, attempt, error):
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                run(cursor, FAIL_JOB_SQL, {
+                    'job_id': job_id,
+                    'worker': self.worker_id,
+                    'retry': not isinstance(error, ValueError),
+                    'backoff': self.backoff,
+                    'backoff_max': self.backoff_max,
+                    'error': f"{type(error).__name__}: {error}",
+                })
+                row = cursor.fetchone()
+            commit(connection)
+        except Exception:
+            connection.rollback()
+            raise
+        status, run_after = row if row else ('lost', None)
+        logger.warning("job failed job_id=%s kind=%s attempt=%d status=%s retry_at=%s error=%r",
+                       job_id, kind, attempt, status, run_after, error, exc_info=error)
+
+    def _unregister(self):
+        # Без строки в job_workers веб-процессы сразу начинают выполнять
+        # задачи сами, не дожидаясь JOBS_STALE_AFTER
+        with self.app.app_context():
+            connection = get_db_connection()
+            try:
+                with connection.cursor() as cursor:
+                    run(cursor, UNREGISTER_WORKER_SQL, (self.worker_id,))
+                commit(connection)
+            except psycopg2.Error:
+                connection.rollback()
+                logger.exception("job worker not unregistered worker=%s", self.worker_id)
+
+    def _listen(self):
+        """
+        Ждёт NOTIFY о новых задачах и будит потоки; заодно продлевает
+        locked_at задач этого воркера. При потере соединения
+        переподключается, а потоки тем временем опрашивают очередь сами.
+
+        Соединение отдельное, не из пула: слушатель держит его всё время
+        работы воркера и не должен занимать место потоков задач.
+        """
+        config = self.app.config
+        kwargs = _connect_kwargs(config, config["POSTGRES_HOST"], config["POSTGRES_PORT"])
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(**kwargs)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {JOBS_CHANNEL}")
+                next_heartbeat = 0
+                while not self._stopping.is_set():
+                    if select.select([connection], [], [], self.poll_interval)[0]:
+                        connection.poll()
+                        if connection.notifies:
+                            connection.notifies.clear()
+                            self._wakeup.set()
+                    if time.monotonic() >= next_heartbeat:
+                        with connection.cursor() as cursor:
+                            run(cursor, HEARTBEAT_JOBS_SQL, (self.worker_id,))
+                            run(cursor, HEARTBEAT_WORKER_SQL, {'worker': self.worker_id, 'kinds': self.kinds})
+                        next_heartbeat = time.monotonic() + self.stale_after / 3
+            except Exception:
+                # Отказ в подключении или обрыв соединения: слушатель и
+                # продление задач не должны останавливаться
+                logger.exception("job worker lost listener connection worker=%s", self.worker_id)
+                self._stopping.wait(self.poll_interval)
+            finally:
+                if connection is not None:
+                    connection.close()
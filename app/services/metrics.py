@@ -0,0 +1,265 @@
+import logging
+import os
+import socket
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request, template_rendered, before_render_template
+
+from app.services import queries
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм, секунды и число запросов к БД
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.buckets = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.buckets[index] += 1
+                break
+
+
+class RequestMetrics:
+    """
+    Метрики запросов по эндпоинтам: время ответа, время в БД, число
+    запросов к БД, время рендеринга шаблонов и размер ответа.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, method, status, duration, db_time, query_count, render_time, size,
+               over_budget):
+        key = (endpoint, method)
+        with self._lock:
+            metrics = self._endpoints.get(key)
+            if metrics is None:
+                metrics = self._endpoints[key] = {
+                    'statuses': {},
+                    'duration': Histogram(DURATION_BUCKETS),
+                    'db_time': Histogram(DURATION_BUCKETS),
+                    'queries': Histogram(QUERY_COUNT_BUCKETS),
+                    'render_time': Histogram(DURATION_BUCKETS),
+                    'response_bytes': 0,
+                    'over_budget': 0,
+                }
+            metrics['statuses'][status] = metrics['statuses'].get(status, 0) + 1
+            metrics['duration'].observe(duration)
+            metrics['db_time'].observe(db_time)
+            metrics['queries'].observe(query_count)
+            metrics['render_time'].observe(render_time)
+            metrics['response_bytes'] += size
+            metrics['over_budget'] += int(over_budget)
+
+    def render(self):
+        """
+        Метрики в текстовом формате Prometheus.
+        """
+        lines = []
+        with self._lock:
+            items = sorted(self._endpoints.items())
+
+            lines += _header('dnd_http_requests_total', 'counter', 'HTTP requests by endpoint and status.')
+            for (endpoint, method), metrics in items:
+                for status, count in sorted(metrics['statuses'].items()):
+                    lines.append(_sample('dnd_http_requests_total', count,
+                                         endpoint=endpoint, method=method, status=status))
+
+            for name, field, help_text in (
+                ('dnd_http_request_duration_seconds', 'duration', 'Wall time of request handling.'),
+                ('dnd_http_request_db_seconds', 'db_time', 'Time spent in database queries per request.'),
+                ('dnd_http_request_queries', 'queries', 'Database queries per request.'),
+                ('dnd_http_template_render_seconds', 'render_time', 'Template rendering time per request.'),
+            ):
+                lines += _header(name, 'histogram', help_text)
+                for (endpoint, method), metrics in items:
+                    lines += _histogram(name, metrics[field], endpoint=endpoint, method=method)
+
+            lines += _header('dnd_http_response_bytes_total', 'counter', 'Response body bytes sent.')
+            for (endpoint, method), metrics in items:
+                lines.append(_sample('dnd_http_response_bytes_total', metrics['response_bytes'],
+                                     endpoint=endpoint, method=method))
+
+            lines += _header('dnd_http_query_budget_exceeded_total', 'counter',
+                             'Requests that ran more database queries than the budget.')
+            for (endpoint, method), metrics in items:
+                lines.append(_sample('dnd_http_query_budget_exceeded_total', metrics['over_budget'],
+                                     endpoint=endpoint, method=method))
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+request_metrics = RequestMetrics()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+_process_labels = {}
+
+
+def _process_label_text():
+    """
+    Метки host и pid процесса, которые получает каждая серия. После fork
+    (preload_app в gunicorn) вычисляются заново.
+    """
+    pid = os.getpid()
+    if _process_labels.get('pid') != pid:
+        _process_labels.clear()
+        _process_labels.update(
+            pid=pid, text=f'host="{_escape(socket.gethostname())}",pid="{pid}"'
+        )
+    return _process_labels['text']
+
+
+def _sample(name, value, **labels):
+    label_text = ','.join([_process_label_text(), *(f'{key}="{_escape(label)}"' for key, label in labels.items())])
+    return f"{name}{{{label_text}}} {value}"
+
+
+def _header(name, kind, help_text):
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+
+
+def _histogram(name, histogram, scale=1, **labels):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.buckets):
+        cumulative += count
+        lines.append(_sample(f"{name}_bucket", cumulative, **labels, le=bound * scale))
+    lines.append(_sample(f"{name}_bucket", histogram.count, **labels, le='+Inf'))
+    lines.append(_sample(f"{name}_sum", round(histogram.sum * scale, 6), **labels))
+    lines.append(_sample(f"{name}_count", histogram.count, **labels))
+    return lines
+
+
+def _on_query(name, duration, rows):
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_db_time += duration
+        g.metrics_queries.append(name)
+
+
+def _before_render(app, template, context, **extra):
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_render_started = time.perf_counter()
+
+
+def _on_rendered(app, template, context, **extra):
+    if has_request_context() and 'metrics_render_started' in g:
+        g.metrics_render_time += time.perf_counter() - g.pop('metrics_render_started')
+
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_db_time = 0.0
+    g.metrics_queries = []
+    g.metrics_render_time = 0.0
+
+
+def finish_request(response):
+    """
+    Записывает метрики запроса. Для потоковых ответов учитывается время
+    до начала отдачи тела, а размер — только если он известен заранее.
+    """
+    if 'metrics_started' not in g:
+        return response
+
+    duration = time.perf_counter() - g.metrics_started
+    endpoint = request.endpoint or 'unmatched'
+    query_count = len(g.metrics_queries)
+    budget = current_app.config["METRICS_QUERY_BUDGET"]
+    over_budget = budget is not None and query_count > budget
+
+    if over_budget:
+        repeated = {}
+        for name in g.metrics_queries:
+            repeated[name] = repeated.get(name, 0) + 1
+        logger.warning(
+            "query budget exceeded endpoint=%s queries=%d budget=%d top=%s",
+            endpoint, query_count, budget,
+            ','.join(f"{name}x{count}" for name, count in
+                     sorted(repeated.items(), key=lambda item: -item[1])[:5])
+        )
+
+    request_metrics.record(
+        endpoint, request.method, response.status_code, duration, g.metrics_db_time,
+        query_count, g.metrics_render_time, response.content_length or 0, over_budget
+    )
+    logger.debug(
+        "request endpoint=%s method=%s status=%d duration_ms=%.1f db_ms=%.1f queries=%d render_ms=%.1f",
+        endpoint, request.method, response.status_code, duration * 1000,
+        g.metrics_db_time * 1000, query_count, g.metrics_render_time * 1000
+    )
+    return response
+
+
+def render_metrics(pool_stats=None, cache_stats=None, fragment_cache_stats=None):
+    """
+    Все метрики приложения: запросы, реестр SQL-запросов, пул, кеш данных
+    и кеш фрагментов шаблонов.
+
+    Счётчики хранятся в памяти процесса: под gunicorn каждый рабочий
+    процесс отдаёт только свои, а запрос через общий порт попадает
+    в случайный процесс. Поэтому каждая серия помечена host и pid
+    процесса: значения разных процессов — разные серии, которые не
+    выглядят для Prometheus сбросом счётчика, и суммируются по этим
+    меткам (sum without (host, pid)).
+    """
+    lines = _header('dnd_process_info', 'gauge', 'Process that served these metrics.')
+    lines.append(_sample('dnd_process_info', 1))
+    lines += request_metrics.render()
+
+    query_stats = queries.get_query_stats()
+    lines += _header('dnd_db_query_calls_total', 'counter', 'Executions of registered queries.')
+    for name, stats in sorted(query_stats.items()):
+        lines.append(_sample('dnd_db_query_calls_total', stats['calls'], query=name))
+    lines += _header('dnd_db_query_errors_total', 'counter', 'Failed executions of registered queries.')
+    for name, stats in sorted(query_stats.items()):
+        lines.append(_sample('dnd_db_query_errors_total', stats['errors'], query=name))
+    lines += _header('dnd_db_query_rows_total', 'counter', 'Rows returned or affected by registered queries.')
+    for name, stats in sorted(query_stats.items()):
+        lines.append(_sample('dnd_db_query_rows_total', stats['rows'], query=name))
+    lines += _header('dnd_db_query_duration_seconds', 'histogram', 'Latency of registered queries.')
+    for name, stats in sorted(query_stats.items()):
+        histogram = Histogram(queries.LATENCY_BUCKETS_MS)
+        histogram.buckets = stats['buckets'][:-1]
+        histogram.count = stats['calls']
+        histogram.sum = stats['total_ms']
+        lines += _histogram('dnd_db_query_duration_seconds', histogram, scale=0.001, query=name)
+
+    for prefix, values in (('dnd_db_pool', pool_stats or {}), ('dnd_cache', cache_stats or {}),
+                           ('dnd_fragment_cache', fragment_cache_stats or {})):
+        for key, value in sorted(values.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                lines += _header(f"{prefix}_{key}", 'gauge', f"{prefix} {key}.")
+                lines.append(_sample(f"{prefix}_{key}", value))
+
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """
+    Подключает сбор метрик к запросам, SQL-запросам реестра и шаблонам.
+    """
+    app.before_request(start_request)
+    app.after_request(finish_request)
+    queries.add_listener(_on_query)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_on_rendered, app)
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'migrations')
+
+_FILENAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# Произвольный ключ advisory-блокировки: миграции не применяются
+# одновременно из нескольких процессов (например, воркеров gunicorn)
+MIGRATION_LOCK_KEY = 72_160_514
+
+# Индексы, без которых запросы db_service читают таблицы целиком:
+# (таблица, ведущие колонки индекса, запросы реестра, которым он нужен)
+REQUIRED_INDEXES = (
+    ('adventures', ('userid',), ('delete_adventures', 'user_grants')),
+    ('npcs', ('adventureid',), ('adventure_view', 'campaign_view', 'delete_adventures')),
+    ('locations', ('adventureid',), ('adventure_view', 'campaign_view', 'delete_adventures')),
+    ('campaigns', ('adventureid',), ('adventure_campaign_ids', 'adventures_campaign_ids', 'delete_adventures')),
+    ('users_campaigns', ('userid', 'campaignid'), ('all_campaigns', 'user_grants')),
+    ('users_campaigns', ('campaignid',), ('campaign_view', 'delete_campaign', 'delete_adventures')),
+    ('player_characters', ('campaignid',), ('campaign_view', 'delete_campaign', 'delete_adventures')),
+    ('users', ('userlogin',), ('validate_user', 'campaign_players_resolve', 'import_resolve_authors')),
+    ('adventure_catalogue', ('campaign_count', 'adventureid'), ('adventures_page',)),
+    ('adventure_catalogue', ('updated_at', 'adventureid'), ('adventures_page',)),
+    ('sessions', ('userid',), ('session_revoke_user',)),
+    ('sessions', ('expires_at',), ('session_purge',)),
+    ('jobs', ('run_after', 'jobid'), ('job_claim',)),
+    ('jobs', ('locked_at',), ('job_requeue_stale',)),
+    ('jobs', ('finished_at',), ('job_purge',)),
+)
+
+
+class MigrationError(RuntimeError):
+    """
+    Файл миграции изменён после применения или каталог миграций некорректен.
+    """
+
+
+def list_migrations(directory=MIGRATIONS_DIR):
+    """
+    Миграции каталога в порядке номеров: список (version, name, path).
+    """
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError("Duplicate migration version numbers in " + directory)
+    return migrations
+
+
+def _checksum(sql):
+    return hashlib.sha256(sql.encode()).hexdigest()
+
+
+def _ensure_table(cursor):
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version    integer PRIMARY KEY,
+            name       text NOT NULL,
+            checksum   text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT now()
+        )
+        """
+    )
+
+
+def applied_migrations(connection):
+    """
+    Применённые миграции: {version: (name, checksum, applied_at)}.
+    """
+    with connection.cursor() as cursor:
+        _ensure_table(cursor)
+        cursor.execute("SELECT version, name, checksum, applied_at FROM schema_migrations")
+        rows = cursor.fetchall()
+    connection.commit()
+    return {version: (name, checksum, applied_at) for version, name, checksum, applied_at in rows}
+
+
+def migrate(connection, directory=MIGRATIONS_DIR, target=None):
+    """
+    Применяет ещё не применённые миграции по порядку, каждую в своей транзакции,
+    и возвращает список применённых (version, name).
+
+    Если уже применённый файл изменился, выбрасывает MigrationError:
+    схема базы и репозитория разошлись.
+    """
+    applied = []
+    for version, name, path in list_migrations(directory):
+        if target is not None and version > target:
+            break
+        with open(path, encoding='utf-8') as file:
+            sql = file.read()
+        checksum = _checksum(sql)
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+                _ensure_table(cursor)
+                cursor.execute("SELECT checksum FROM schema_migrations WHERE version = %s", (version,))
+                row = cursor.fetchone()
+                if row is not None:
+                    connection.rollback()
+                    if row[0] != checksum:
+                        raise MigrationError(f"Migration {version:03d}_{name} changed after it was applied")
+                    continue
+
+                logger.info("applying migration version=%03d name=%s", version, name)
+                cursor.execute(sql)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (version, name, checksum)
+                )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        applied.append((version, name))
+    return applied
+
+
+def pending_migrations(connection, directory=MIGRATIONS_DIR):
+    applied = applied_migrations(connection)
+    return [
+        (version, name) for version, name, _ in list_migrations(directory)
+        if version not in applied
+    ]
+
+
+def missing_indexes(connection):
+    """
+    Индексы из REQUIRED_INDEXES, которых нет в базе.
+
+    Подходит любой индекс таблицы, чьи ведущие колонки совпадают
+    с требуемыми, в том числе первичный ключ и уникальные ограничения.
+    Возвращает список (таблица, колонки, запросы).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT t.relname,
+                   array_agg(a.attname::text ORDER BY k.position)
+            FROM pg_index i
+            JOIN pg_class t ON t.oid = i.indrelid
+            JOIN pg_namespace ns ON ns.oid = t.relnamespace
+            JOIN pg_class ix ON ix.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = ix.relam
+            CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, position)
+            JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+            WHERE ns.nspname = current_schema() AND am.amname = 'btree'
+            GROUP BY t.relname, i.indexrelid
+            """
+        )
+        indexes = cursor.fetchall()
+    connection.commit()
+
+    existing = {}
+    for table, columns in indexes:
+        existing.setdefault(table, []).append(tuple(columns))
+
+    missing = []
+    for table, columns, query_names in REQUIRED_INDEXES:
+        if not any(index[:len(columns)] == columns for index in existing.get(table, [])):
+            missing.append((table, columns, query_names))
+    return missing
+
+
+def report_missing_indexes(connection):
+    missing = missing_indexes(connection)
+    for table, columns, query_names in missing:
+        logger.warning(
+            "missing index table=%s columns=%s queries=%s",
+            table, ','.join(columns), ','.join(query_names)
+        )
+    return missing
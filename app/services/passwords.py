@@ -0,0 +1,168 @@
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app, jsonify
+
+logger = logging.getLogger(__name__)
+
+SCHEME = 'scrypt'
+SALT_BYTES = 16
+HASH_BYTES = 32
+
+
+class PasswordHasherBusy(RuntimeError):
+    """
+    Слишком много паролей ждут проверки (или проверка не уложилась
+    в таймаут): запрос лучше отклонить сразу.
+    """
+
+
+def _b64encode(raw):
+    return base64.b64encode(raw).decode().rstrip('=')
+
+
+def _b64decode(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+class PasswordHasher:
+    """
+    Хеширование паролей scrypt (hashlib, без внешних зависимостей).
+
+    Хеш хранится как scrypt$N$r$p$соль$хеш, поэтому смена параметров
+    стоимости не ломает старые хеши: они проверяются со своими
+    параметрами, а `verify` сообщает, что хеш пора пересчитать.
+
+    Вычисления идут в ограниченном пуле потоков (hashlib.scrypt отпускает
+    GIL), число ожидающих задач ограничено: при всплеске входов лишние
+    запросы сразу получают PasswordHasherBusy, а не занимают потоки воркера.
+    """
+
+    def __init__(self, n=2 ** 14, r=8, p=1, workers=0, max_pending=64, timeout=10.0):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        # Хеш для проверки несуществующих пользователей: время ответа
+        # не должно выдавать, есть ли такой логин
+        self._dummy_hash = None
+
+    def _get_executor(self):
+        # Потоки не переживают fork (preload_app в gunicorn): пул создаётся
+        # заново в каждом процессе
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+                    self._slots = threading.BoundedSemaphore(self.max_pending)
+                    self._pid = os.getpid()
+        return self._executor
+
+    def _submit(self, func, *args):
+        executor = self._get_executor()
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy("Too many pending password checks")
+        try:
+            future = executor.submit(func, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Вычисление продолжится и освободит слот по завершении
+            raise PasswordHasherBusy("Password check timed out") from None
+
+    @staticmethod
+    def _derive(password, salt, n, r, p):
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=n, r=r, p=p,
+            maxmem=256 * n * r * p, dklen=HASH_BYTES
+        )
+
+    def _hash(self, password):
+        salt = secrets.token_bytes(SALT_BYTES)
+        derived = self._derive(password, salt, self.n, self.r, self.p)
+        return f"{SCHEME}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(derived)}"
+
+    def _verify(self, password, stored):
+        if stored is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self._hash(secrets.token_hex(8))
+            self._verify(password, self._dummy_hash)
+            return False, False
+
+        if not stored.startswith(SCHEME + '$'):
+            # Пароль, сохранённый до появления хеширования открытым текстом
+            return hmac.compare_digest(password.encode(), stored.encode()), True
+
+        parts = stored.split('$')
+        try:
+            if len(parts) != 6:
+                raise ValueError(f"expected 6 fields, got {len(parts)}")
+            n, r, p = int(parts[1]), int(parts[2]), int(parts[3])
+            salt, expected = _b64decode(parts[4]), _b64decode(parts[5])
+            derived = self._derive(password, salt, n, r, p)
+        except (ValueError, binascii.Error) as e:
+            # Повреждённый хеш не должен превращаться в 500: входа просто нет
+            logger.warning("malformed password hash: %s", e)
+            return False, False
+        if not hmac.compare_digest(derived, expected):
+            return False, False
+        return True, (n, r, p) != (self.n, self.r, self.p)
+
+    def hash(self, password):
+        return self._submit(self._hash, password)
+
+    def verify(self, password, stored):
+        """
+        Проверяет пароль по сохранённому хешу (None — пользователя нет).
+        Возвращает (подходит ли пароль, нужно ли пересчитать хеш).
+        """
+        return self._submit(self._verify, password, stored)
+
+
+def create_hasher(config):
+    return PasswordHasher(
+        n=config["PASSWORD_SCRYPT_N"],
+        r=config["PASSWORD_SCRYPT_R"],
+        p=config["PASSWORD_SCRYPT_P"],
+        workers=config["PASSWORD_HASH_WORKERS"],
+        max_pending=config["PASSWORD_HASH_MAX_PENDING"],
+        timeout=config["PASSWORD_HASH_TIMEOUT"],
+    )
+
+
+def _handle_busy(error):
+    response = jsonify({"error": "Server is busy, try again later"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
+
+def init_app(app):
+    app.extensions['password_hasher'] = create_hasher(app.config)
+    app.register_error_handler(PasswordHasherBusy, _handle_busy)
+
+
+def hash_password(password):
+    return current_app.extensions['password_hasher'].hash(password)
+
+
+def verify_password(password, stored):
+    return current_app.extensions['password_hasher'].verify(password, stored)
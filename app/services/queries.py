@@ -0,0 +1,312 @@
+import re
+import threading
+import time
+from collections import deque
+
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2.extras import execute_values
+
+# Границы корзин гистограммы задержек, мс
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+QUERIES = {}
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """
+    Соединение, помнящее, какие запросы реестра уже подготовлены на сервере.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+class Query:
+    """
+    Именованный запрос реестра.
+
+    Текст пишется в обычном для psycopg2 виде (%s или %(name)s), а для
+    PREPARE переводится в позиционные параметры $1, $2, ...
+    """
+
+    def __init__(self, name, sql, prepare=True):
+        self.name = name
+        self.sql = sql
+        self.prepare = prepare
+        self.parameters = []
+        self.is_select = sql.lstrip().upper().startswith(('SELECT', 'WITH')) and not re.search(
+            r"\b(INSERT|UPDATE|DELETE)\b", sql, re.IGNORECASE
+        )
+
+        named = {}
+        positional = 0
+
+        def replace(match):
+            nonlocal positional
+            token = match.group(0)
+            if token == '%%':
+                return '%'
+            if match.group(1):
+                key = match.group(1)
+                if key not in named:
+                    self.parameters.append(key)
+                    named[key] = len(self.parameters)
+                return f"${named[key]}"
+            self.parameters.append(positional)
+            positional += 1
+            return f"${len(self.parameters)}"
+
+        self.server_sql = _PLACEHOLDER.sub(replace, sql)
+
+    def execute_args(self, params):
+        return tuple(params[key] for key in self.parameters)
+
+    def __str__(self):
+        return self.sql
+
+
+def register(name, sql, prepare=True):
+    """
+    Регистрирует запрос в реестре и возвращает его.
+    """
+    if name in QUERIES:
+        raise ValueError(f"Query '{name}' is already registered")
+    query = Query(name, sql, prepare)
+    QUERIES[name] = query
+    return query
+
+
+class QueryStats:
+    """
+    Счётчики вызовов, строк и гистограммы задержек по именам запросов,
+    а также планы медленных запросов (EXPLAIN), если он включён.
+    """
+
+    def __init__(self, keep_plans=20):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._plans = {}
+        self.keep_plans = keep_plans
+
+    def record(self, name, duration, rows, error=False):
+        duration_ms = duration * 1000
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = {
+                    'calls': 0,
+                    'errors': 0,
+                    'rows': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            stats['calls'] += 1
+            stats['errors'] += int(error)
+            stats['rows'] += max(rows, 0)
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            for index, bound in enumerate(LATENCY_BUCKETS_MS):
+                if duration_ms <= bound:
+                    stats['buckets'][index] += 1
+                    break
+            else:
+                stats['buckets'][-1] += 1
+
+    def record_plan(self, name, duration, plan):
+        with self._lock:
+            plans = self._plans.setdefault(name, deque(maxlen=self.keep_plans))
+            plans.append({'duration_ms': round(duration * 1000, 3), 'plan': plan})
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: dict(stats, buckets=list(stats['buckets']))
+                for name, stats in self._stats.items()
+            }
+
+    def plans(self):
+        with self._lock:
+            return {name: list(plans) for name, plans in self._plans.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._plans.clear()
+
+
+stats = QueryStats()
+
+_listeners = []
+_settings = {'prepare': True, 'explain_slow_ms': None, 'explain_analyze': False, 'explain_interval': 60.0}
+
+# Время последнего EXPLAIN по именам запросов
+_explained_at = {}
+_explain_lock = threading.Lock()
+
+
+def init_app(app):
+    _settings['prepare'] = app.config["QUERY_PREPARE"]
+    _settings['explain_slow_ms'] = app.config["QUERY_EXPLAIN_SLOW_MS"]
+    _settings['explain_analyze'] = app.config["QUERY_EXPLAIN_ANALYZE"]
+    _settings['explain_interval'] = app.config["QUERY_EXPLAIN_INTERVAL"]
+    stats.keep_plans = app.config["QUERY_EXPLAIN_KEEP"]
+
+
+def add_listener(listener):
+    """
+    Подписывает `listener(name, duration, rows)` на каждый выполненный запрос.
+    """
+    _listeners.append(listener)
+
+
+def _report(cursor, name, started, error):
+    duration = time.perf_counter() - started
+    rows = -1 if error else cursor.rowcount
+    stats.record(name, duration, rows, error)
+    for listener in _listeners:
+        listener(name, duration, rows)
+    return duration
+
+
+def _explain_due(name):
+    # Не чаще раза в explain_interval секунд на запрос: под нагрузкой
+    # медленный запрос иначе объяснялся бы при каждом вызове
+    now = time.monotonic()
+    with _explain_lock:
+        if now - _explained_at.get(name, float('-inf')) < _settings['explain_interval']:
+            return False
+        _explained_at[name] = now
+    return True
+
+
+def _explain(cursor, name, sql, params, duration):
+    """
+    Сохраняет план медленного запроса. По умолчанию — план без выполнения
+    (EXPLAIN); EXPLAIN ANALYZE выполняет запрос повторно и включается
+    отдельно (фактические планы без повторов даёт расширение auto_explain).
+    """
+    threshold = _settings['explain_slow_ms']
+    if threshold is None or duration * 1000 < threshold or not _explain_due(name):
+        return
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if _settings['explain_analyze'] else "FORMAT JSON"
+    with cursor.connection.cursor() as explain_cursor:
+        explain_cursor.execute("SAVEPOINT explain_slow_query")
+        try:
+            explain_cursor.execute(f"EXPLAIN ({options}) " + sql, params)
+            plan = explain_cursor.fetchone()[0]
+        except psycopg2.Error:
+            explain_cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+            return
+        explain_cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+    stats.record_plan(name, duration, plan)
+
+
+def _prepare(cursor, query):
+    """
+    PREPARE запроса реестра. Если запрос уже подготовлен на соединении
+    (а набор prepared_statements о нём не знает), ошибка не должна прервать
+    транзакцию вызывающего кода: PREPARE идёт под точкой сохранения, и после
+    отката к ней запрос просто выполняется.
+    """
+    connection = cursor.connection
+    if connection.autocommit:
+        try:
+            cursor.execute(f"PREPARE {query.name} AS {query.server_sql}")
+        except psycopg2.errors.DuplicatePreparedStatement:
+            pass
+        return
+
+    cursor.execute("SAVEPOINT prepare_statement")
+    try:
+        cursor.execute(f"PREPARE {query.name} AS {query.server_sql}")
+    except psycopg2.errors.DuplicatePreparedStatement:
+        cursor.execute("ROLLBACK TO SAVEPOINT prepare_statement")
+    cursor.execute("RELEASE SAVEPOINT prepare_statement")
+
+
+def run(cursor, query, params=()):
+    """
+    Выполняет запрос реестра на курсоре.
+
+    При первом обращении на соединении запрос подготавливается (PREPARE),
+    дальше выполняется через EXECUTE без повторного разбора и
+    планирования. Время, число строк и вызовов попадают в `stats`.
+    """
+    if isinstance(query, str):
+        query = QUERIES[query]
+
+    connection = cursor.connection
+    prepared = getattr(connection, 'prepared_statements', None)
+    use_prepared = _settings['prepare'] and query.prepare and prepared is not None
+
+    started = time.perf_counter()
+    try:
+        if use_prepared:
+            if query.name not in prepared:
+                _prepare(cursor, query)
+                prepared.add(query.name)
+            args = query.execute_args(params)
+            placeholders = ', '.join(['%s'] * len(args))
+            cursor.execute(
+                f"EXECUTE {query.name} ({placeholders})" if args else f"EXECUTE {query.name}",
+                args
+            )
+        else:
+            cursor.execute(query.sql, params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # Соединение потеряло подготовленный запрос (например, после DISCARD)
+        prepared.discard(query.name)
+        _report(cursor, query.name, started, error=True)
+        raise
+    except Exception:
+        _report(cursor, query.name, started, error=True)
+        raise
+
+    duration = _report(cursor, query.name, started, error=False)
+    if query.is_select:
+        _explain(cursor, query.name, query.sql, params, duration)
+    return cursor
+
+
+def run_sql(cursor, name, sql, params=()):
+    """
+    Выполняет динамический запрос (без подготовки), учитывая его в `stats`
+    под именем `name`.
+    """
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, params)
+    except Exception:
+        _report(cursor, name, started, error=True)
+        raise
+    duration = _report(cursor, name, started, error=False)
+    if not cursor.name and sql.lstrip().upper().startswith('SELECT'):
+        _explain(cursor, name, sql, params, duration)
+    return cursor
+
+
+def run_values(cursor, name, sql, rows, **kwargs):
+    """
+    execute_values с учётом в `stats` под именем `name`.
+    """
+    started = time.perf_counter()
+    try:
+        result = execute_values(cursor, sql, rows, **kwargs)
+    except Exception:
+        _report(cursor, name, started, error=True)
+        raise
+    _report(cursor, name, started, error=False)
+    return result
+
+
+def get_query_stats():
+    return stats.snapshot()
+
+
+def get_slow_query_plans():
+    return stats.plans()
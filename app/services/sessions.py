@@ -0,0 +1,327 @@
+import logging
+import pickle
+import secrets
+import threading
+import time
+
+from flask import current_app, g, has_app_context
+from flask.sessions import SecureCookieSession, SessionInterface
+
+from app.services.db_service import get_db_connection
+from app.services.queries import register, run
+
+logger = logging.getLogger(__name__)
+
+# Длина id сессии в байтах случайности (в cookie — base64, 32 символа)
+SESSION_ID_BYTES = 24
+SESSION_ID_MAX_LENGTH = 64
+
+
+SESSION_LOAD_SQL = register('session_load', """
+    SELECT data, extract(epoch FROM expires_at - now())::float8
+    FROM sessions
+    WHERE sessionid = %s AND expires_at > now()
+""")
+
+SESSION_SAVE_SQL = register('session_save', """
+    INSERT INTO sessions (sessionid, userid, data, expires_at)
+    VALUES (%(session_id)s, %(user_id)s, %(data)s, now() + make_interval(secs => %(ttl)s))
+    ON CONFLICT (sessionid) DO UPDATE
+    SET userid = EXCLUDED.userid, data = EXCLUDED.data, expires_at = EXCLUDED.expires_at
+""")
+
+SESSION_DELETE_SQL = register('session_delete', """
+    DELETE FROM sessions WHERE sessionid = %s
+""")
+
+SESSION_REVOKE_USER_SQL = register('session_revoke_user', """
+    DELETE FROM sessions WHERE userid = %s
+""")
+
+SESSION_PURGE_SQL = register('session_purge', """
+    DELETE FROM sessions WHERE expires_at <= now()
+""")
+
+
+class MemorySessionStore:
+    """
+    Сессии в памяти процесса. Подходит для одного процесса и тестов:
+    при нескольких воркерах пользователь будет терять сессию.
+    """
+
+    # Просроченные записи удаляются не чаще раза в столько секунд
+    PURGE_INTERVAL = 60
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._next_purge = time.monotonic() + self.PURGE_INTERVAL
+
+    def load(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        expires_at, data, _ = entry
+        ttl_left = expires_at - time.monotonic()
+        if ttl_left <= 0:
+            return None
+        return data, ttl_left
+
+    def save(self, session_id, data, ttl, user_id):
+        now = time.monotonic()
+        with self._lock:
+            self._sessions[session_id] = (now + ttl, data, user_id)
+        if now >= self._next_purge:
+            self._next_purge = now + self.PURGE_INTERVAL
+            self.purge_expired()
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def revoke_user(self, user_id):
+        with self._lock:
+            revoked = [key for key, (_, _, owner) in self._sessions.items() if owner == user_id]
+            for key in revoked:
+                del self._sessions[key]
+        return len(revoked)
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires_at, _, _) in self._sessions.items() if expires_at <= now]
+            for key in expired:
+                del self._sessions[key]
+        return len(expired)
+
+
+class RedisSessionStore:
+    """
+    Сессии в Redis-совместимом сервере. Истечение — средствами сервера
+    (EX); id сессий пользователя хранятся в множестве для отзыва.
+
+    Требует пакет `redis`.
+    """
+
+    def __init__(self, url, prefix='dnd:session:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def _user_key(self, user_id):
+        return f"{self.prefix}user:{user_id}"
+
+    def load(self, session_id):
+        pipeline = self.client.pipeline(transaction=False)
+        pipeline.get(self.prefix + session_id)
+        pipeline.ttl(self.prefix + session_id)
+        data, ttl_left = pipeline.execute()
+        if data is None:
+            return None
+        return data, ttl_left
+
+    def save(self, session_id, data, ttl, user_id):
+        pipeline = self.client.pipeline()
+        pipeline.set(self.prefix + session_id, data, ex=ttl)
+        if user_id is not None:
+            pipeline.sadd(self._user_key(user_id), session_id)
+            pipeline.expire(self._user_key(user_id), ttl)
+        pipeline.execute()
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id)
+
+    def revoke_user(self, user_id):
+        session_ids = self.client.smembers(self._user_key(user_id))
+        keys = [self.prefix + session_id.decode() for session_id in session_ids]
+        revoked = self.client.delete(*keys) if keys else 0
+        self.client.delete(self._user_key(user_id))
+        return revoked
+
+    def purge_expired(self):
+        return 0
+
+
+class PostgresSessionStore:
+    """
+    Сессии в таблице sessions (миграция 004).
+
+    Операции идут через соединение текущего запроса. Второе соединение
+    из пула на время операции удваивало бы спрос на пул: при исчерпании
+    пула потоки, уже держащие соединение запроса, ждали бы друг друга.
+    Сессия читается до обработчика и сохраняется после него, когда
+    транзакции приложения уже завершены; внутри `transaction()` операция
+    фиксируется вместе с блоком. Вне контекста Flask (сессии ASGI-режима
+    открываются в пуле потоков) операция получает собственный контекст
+    приложения и возвращает соединение в пул по его завершении.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def _execute(self, query, params):
+        if not has_app_context():
+            with self.app.app_context():
+                return self._execute(query, params)
+        connection = get_db_connection()
+        try:
+            with connection.cursor() as cursor:
+                run(cursor, query, params)
+                result = cursor.fetchone() if cursor.description else cursor.rowcount
+            if not g.get('db_transaction_depth'):
+                connection.commit()
+            return result
+        except Exception:
+            if not g.get('db_transaction_depth'):
+                connection.rollback()
+            raise
+
+    def load(self, session_id):
+        return self._execute(SESSION_LOAD_SQL, (session_id,))
+
+    def save(self, session_id, data, ttl, user_id):
+        self._execute(SESSION_SAVE_SQL, {
+            'session_id': session_id,
+            'user_id': user_id,
+            'data': data,
+            'ttl': ttl,
+        })
+
+    def delete(self, session_id):
+        self._execute(SESSION_DELETE_SQL, (session_id,))
+
+    def revoke_user(self, user_id):
+        return self._execute(SESSION_REVOKE_USER_SQL, (user_id,))
+
+    def purge_expired(self):
+        return self._execute(SESSION_PURGE_SQL, ())
+
+
+class ServerSession(SecureCookieSession):
+    """
+    Сессия, данные которой хранятся на сервере под id из cookie.
+    """
+
+    def __init__(self, initial=None, session_id=None, ttl_left=None, stale_cookie=False):
+        super().__init__(initial)
+        self.session_id = session_id
+        self.ttl_left = ttl_left
+        # В запросе был cookie сессии, которой больше нет (истекла или отозвана)
+        self.stale_cookie = stale_cookie
+        self.regenerated = False
+
+    def regenerate(self):
+        """
+        Выдаёт сессии новый id при сохранении, удаляя старую запись
+        (защита от фиксации сессии при входе).
+        """
+        self.regenerated = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Сессии на сервере: в cookie только непрозрачный случайный id, данные
+    сериализуются pickle в хранилище.
+
+    Запись в хранилище — только при изменении сессии или когда до её
+    истечения осталось меньше половины TTL (скользящее продление).
+    Cookie выставляется лишь при выдаче нового id и для постоянных
+    сессий (session.permanent), которым нужно продлевать срок cookie.
+    """
+    session_class = ServerSession
+
+    def __init__(self, store, ttl):
+        self.store = store
+        self.ttl = ttl
+
+    def open_session(self, app, request):
+        session_id = request.cookies.get(self.get_cookie_name(app))
+        if not session_id or len(session_id) > SESSION_ID_MAX_LENGTH:
+            return self.session_class()
+
+        loaded = self.store.load(session_id)
+        if loaded is None:
+            return self.session_class(stale_cookie=True)
+        data, ttl_left = loaded
+        try:
+            initial = pickle.loads(data)
+        except Exception:
+            logger.warning("session unreadable, discarding")
+            return self.session_class(stale_cookie=True)
+        return self.session_class(initial, session_id, ttl_left)
+
+    def save_session(self, app, session, response):
+        cookie = {
+            'domain': self.get_cookie_domain(app),
+            'path': self.get_cookie_path(app),
+            'secure': self.get_cookie_secure(app),
+            'samesite': self.get_cookie_samesite(app),
+            'httponly': self.get_cookie_httponly(app),
+        }
+        name = self.get_cookie_name(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.session_id is not None and session.modified:
+                self.store.delete(session.session_id)
+            if session.modified or session.stale_cookie:
+                response.delete_cookie(name, **cookie)
+                response.vary.add('Cookie')
+            return
+
+        if session.regenerated and session.session_id is not None:
+            self.store.delete(session.session_id)
+            session.session_id = None
+        new = session.session_id is None
+        if new:
+            session.session_id = secrets.token_urlsafe(SESSION_ID_BYTES)
+
+        saved = new or session.modified or session.ttl_left < self.ttl / 2
+        if saved:
+            self.store.save(
+                session.session_id,
+                pickle.dumps(dict(session), protocol=pickle.HIGHEST_PROTOCOL),
+                self.ttl,
+                session.get('userid')
+            )
+
+        if new or (saved and session.permanent):
+            response.set_cookie(
+                name, session.session_id, expires=self.get_expiration_time(app, session), **cookie
+            )
+            response.vary.add('Cookie')
+
+
+def create_store(app):
+    backend = app.config["SESSION_BACKEND"]
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'redis':
+        return RedisSessionStore(app.config["SESSION_REDIS_URL"])
+    if backend == 'postgres':
+        return PostgresSessionStore(app)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+
+
+def init_app(app):
+    app.session_interface = ServerSessionInterface(create_store(app), app.config["SESSION_TTL"])
+
+
+def get_session_store():
+    return current_app.session_interface.store
+
+
+def revoke_user_sessions(user_id):
+    """
+    Завершает все сессии пользователя; возвращает их число.
+    """
+    return get_session_store().revoke_user(user_id)
+
+
+def purge_expired_sessions():
+    return get_session_store().purge_expired()
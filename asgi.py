@@ -0,0 +1,12 @@
+"""
+Точка входа асинхронного режима:
+
+    hypercorn asgi:app
+    uvicorn asgi:app
+
+Зависимости режима перечислены в requirements-async.txt.
+"""
+from app.asgi import create_asgi_app
+
+
+app = create_asgi_app()
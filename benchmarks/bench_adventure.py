@@ -0,0 +1,66 @@
+"""
+Регрессионный бенчмарк загрузки приключения с большим числом NPC и локаций.
+
+Сравнивает прежний путь (декартово произведение get_adventure_details
+и поиск дублей перебором списка) с раздельной агрегацией.
+
+    python -m benchmarks.bench_adventure --sizes 50 200 500
+"""
+from app.services.db_service import ADVENTURE_VIEW_SQL, adventure_view_from_row
+from benchmarks.common import base_parser, connect, measure, print_row, seed_adventures, seed_users, summarize
+
+
+def load_cartesian(cursor, adventure_id):
+    """
+    Прежняя реализация get_adventure.
+    """
+    cursor.execute("SELECT * FROM get_adventure_details(%s)", (adventure_id,))
+    details = cursor.fetchall()
+    adventure = {'id': details[0][0], 'name': details[0][1], 'story': details[0][2]}
+    npcs = []
+    locations = []
+    for row in details:
+        if row[3]:
+            if not {'name': row[3], 'description': row[4]} in npcs:
+                npcs.append({'name': row[3], 'description': row[4]})
+        if row[5]:
+            if not {'name': row[5], 'description': row[6]} in locations:
+                locations.append({'name': row[5], 'description': row[6]})
+    return adventure, npcs, locations
+
+
+def load_aggregated(cursor, adventure_id):
+    cursor.execute(ADVENTURE_VIEW_SQL.sql, (adventure_id,))
+    return adventure_view_from_row(cursor.fetchone())
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 200, 500])
+    args = parser.parse_args()
+
+    connection = connect(args.dsn)
+    try:
+        with connection.cursor() as cursor:
+            user_ids = seed_users(cursor, 1)
+            for size in args.sizes:
+                adventure_id = seed_adventures(cursor, user_ids, 1, size, size)[0]
+                legacy = load_cartesian(cursor, adventure_id)
+                aggregated = load_aggregated(cursor, adventure_id)
+                assert len(legacy[1]) == len(aggregated[1])
+                assert len(legacy[2]) == len(aggregated[2])
+
+                print(f"\n{size} npcs x {size} locations")
+                print_row("cartesian + list dedup", summarize(
+                    measure(lambda: load_cartesian(cursor, adventure_id), args.repeat)
+                ))
+                print_row("aggregated + hash dedup", summarize(
+                    measure(lambda: load_aggregated(cursor, adventure_id), args.repeat)
+                ))
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
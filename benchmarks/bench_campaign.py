@@ -0,0 +1,108 @@
+"""
+Загрузка страницы кампании: шесть последовательных запросов против одного.
+
+    python -m benchmarks.bench_campaign --npcs 50 --players 8 --characters 8
+"""
+from app.services.db_service import CAMPAIGN_VIEW_SQL, campaign_view_from_row
+from benchmarks.common import (
+    base_parser, connect, measure, print_row, seed_adventures, seed_campaign, seed_users, summarize
+)
+
+
+def load_sequential(cursor, user_id, campaign_id):
+    """
+    Прежняя реализация get_campaign: шесть запросов на каждый просмотр.
+    """
+    cursor.execute(
+        "SELECT uc.isauthor FROM users_campaigns uc WHERE uc.userid = %s AND uc.campaignid = %s",
+        (user_id, campaign_id)
+    )
+    is_author = cursor.fetchone()[0]
+    cursor.execute(
+        """
+        SELECT a.adventurename, a.story, u.userlogin
+        FROM campaigns c
+        JOIN adventures a ON c.adventureid = a.adventureid
+        JOIN users u ON a.userid = u.userid
+        WHERE c.campaignid = %s
+        """,
+        (campaign_id,)
+    )
+    campaign_info = cursor.fetchone()
+    cursor.execute(
+        """
+        SELECT npcname, npcdescription FROM npcs
+        WHERE adventureid = (SELECT adventureid FROM campaigns WHERE campaignid = %s)
+        """,
+        (campaign_id,)
+    )
+    npcs = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT locationname, locationdescription FROM locations
+        WHERE adventureid = (SELECT adventureid FROM campaigns WHERE campaignid = %s)
+        """,
+        (campaign_id,)
+    )
+    locations = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT u.userlogin, uc.isauthor FROM users_campaigns uc
+        JOIN users u ON uc.userid = u.userid WHERE uc.campaignid = %s
+        """,
+        (campaign_id,)
+    )
+    players = cursor.fetchall()
+    cursor.execute(
+        """
+        SELECT charactername, characterclass, characterlevel
+        FROM player_characters WHERE campaignid = %s
+        """,
+        (campaign_id,)
+    )
+    characters = cursor.fetchall()
+    return campaign_info, npcs, locations, players, characters, is_author, campaign_id
+
+
+def load_single(cursor, user_id, campaign_id):
+    # Участие и авторство приложение берёт из кеша прав пользователя
+    cursor.execute(CAMPAIGN_VIEW_SQL.sql, (campaign_id,))
+    return campaign_view_from_row(cursor.fetchone(), campaign_id, is_author=True)
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--npcs', type=int, default=50)
+    parser.add_argument('--locations', type=int, default=50)
+    parser.add_argument('--players', type=int, default=8)
+    parser.add_argument('--characters', type=int, default=8)
+    args = parser.parse_args()
+
+    connection = connect(args.dsn)
+    try:
+        with connection.cursor() as cursor:
+            user_ids = seed_users(cursor, args.players + 1)
+            author_id, player_ids = user_ids[0], user_ids[1:]
+            adventure_id = seed_adventures(cursor, [author_id], 1, args.npcs, args.locations)[0]
+            campaign_id = seed_campaign(cursor, adventure_id, author_id, player_ids, args.characters)
+
+            legacy = load_sequential(cursor, author_id, campaign_id)
+            single = load_single(cursor, author_id, campaign_id)
+            assert sorted(legacy[1]) == sorted(single.npcs)
+            assert sorted(legacy[3]) == sorted(single.players)
+
+            print(f"campaign with {args.npcs} npcs, {args.locations} locations, "
+                  f"{args.players + 1} players, {args.characters} characters")
+            print_row("6 sequential queries (6 round trips)", summarize(
+                measure(lambda: load_sequential(cursor, author_id, campaign_id), args.repeat)
+            ))
+            print_row("aggregated query (1 round trip)", summarize(
+                measure(lambda: load_single(cursor, author_id, campaign_id), args.repeat)
+            ))
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Удаление приключения с сотнями кампаний: прежний цикл против одного CTE.
+
+Прежний путь дополнительно открывал соединение и фиксировал транзакцию
+на каждую кампанию; здесь оба пути выполняются в одной транзакции,
+так что сравнивается только число операторов и их стоимость.
+
+    python -m benchmarks.bench_delete --campaigns 100 300 --players 6 --characters 6
+"""
+import time
+
+from app.services.db_service import DELETE_ADVENTURES_SQL
+from benchmarks.common import base_parser, connect, seed_adventures, seed_campaign, seed_users
+
+
+def delete_per_campaign(cursor, adventure_id):
+    """
+    Прежняя реализация delete_adventure/delete_campaign.
+    """
+    statements = 1
+    cursor.execute("SELECT campaignid FROM campaigns WHERE adventureid = %s", (adventure_id,))
+    for (campaign_id,) in cursor.fetchall():
+        cursor.execute("DELETE FROM users_campaigns WHERE campaignid = %s", (campaign_id,))
+        cursor.execute("DELETE FROM player_characters WHERE campaignid = %s", (campaign_id,))
+        cursor.execute("DELETE FROM campaigns WHERE campaignid = %s", (campaign_id,))
+        statements += 3
+    cursor.execute("DELETE FROM npcs WHERE adventureid = %s", (adventure_id,))
+    cursor.execute("DELETE FROM locations WHERE adventureid = %s", (adventure_id,))
+    cursor.execute("DELETE FROM adventures WHERE adventureid = %s", (adventure_id,))
+    return statements + 3
+
+
+def delete_set_based(cursor, adventure_id):
+    cursor.execute(DELETE_ADVENTURES_SQL.sql, {'adventure_ids': [adventure_id], 'user_id': None})
+    return 1
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--campaigns', type=int, nargs='+', default=[100, 300])
+    parser.add_argument('--players', type=int, default=6)
+    parser.add_argument('--characters', type=int, default=6)
+    args = parser.parse_args()
+
+    connection = connect(args.dsn)
+    try:
+        with connection.cursor() as cursor:
+            user_ids = seed_users(cursor, args.players + 1)
+            for campaigns in args.campaigns:
+                adventure_id = seed_adventures(cursor, user_ids[:1], 1, 20, 20)[0]
+                for _ in range(campaigns):
+                    seed_campaign(cursor, adventure_id, user_ids[0], user_ids[1:], args.characters)
+
+                print(f"\nadventure with {campaigns} campaigns")
+                for label, delete in (("per-campaign loop", delete_per_campaign),
+                                      ("single CTE statement", delete_set_based)):
+                    cursor.execute("SAVEPOINT bench")
+                    started = time.perf_counter()
+                    statements = delete(cursor, adventure_id)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    cursor.execute("ROLLBACK TO SAVEPOINT bench")
+                    print(f"{label:<25} {elapsed:10.2f} ms  {statements:5d} statements")
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Рендеринг страниц приключения и кампании с большими таблицами:
+без кеша фрагментов, с холодным и с прогретым кешем.
+
+База не нужна: шаблоны рендерятся на синтетических данных.
+
+    python -m benchmarks.bench_fragments --rows 100 1000 5000
+"""
+from flask import render_template
+
+from app import create_app
+from app.services.cache import MemoryCache
+from benchmarks.common import WORDS, base_parser, measure, print_row, summarize
+
+
+def phrase(seed, count=4):
+    return ' '.join(WORDS[(seed * prime) % len(WORDS)] for prime in (7, 13, 17, 19, 23)[:count])
+
+
+def adventure_context(rows, revision):
+    return dict(
+        adventure={'id': 1, 'name': phrase(1, 3), 'story': phrase(2, 5)},
+        npcs=[{'name': f'npc {i} {phrase(i, 1)}', 'description': phrase(i)} for i in range(rows)],
+        locations=[{'name': f'location {i} {phrase(i, 1)}', 'description': phrase(i + 1)} for i in range(rows)],
+        user_is_logged_in=True,
+        user_role='master',
+        is_author=True,
+        revision=revision,
+    )
+
+
+def campaign_context(rows, revision):
+    return dict(
+        campaign_info=(phrase(1, 3), phrase(2, 5), 'bench_author'),
+        npcs=[(f'npc {i}', phrase(i)) for i in range(rows)],
+        locations=[(f'location {i}', phrase(i + 1)) for i in range(rows)],
+        players=[(f'player {i}', i == 0) for i in range(min(rows, 50))],
+        characters=[(f'hero {i}', phrase(i, 1), 1 + i % 20) for i in range(rows)],
+        is_author=True,
+        campaign_id=1,
+        revision=revision,
+    )
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 5000],
+                        help="Строк в каждой таблице (NPC, локации, персонажи)")
+    args = parser.parse_args()
+
+    app = create_app()
+    pages = (
+        ('adventure_detail.html', adventure_context, '/adventures/1'),
+        ('campaign_detail.html', campaign_context, '/campaigns/1'),
+    )
+
+    for rows in args.rows:
+        for template, make_context, path in pages:
+            with app.test_request_context(path):
+                app.extensions.pop('fragment_cache', None)
+                context = make_context(rows, revision='1')
+                uncached = measure(lambda: render_template(template, **context), args.repeat)
+
+                app.extensions['fragment_cache'] = MemoryCache(max_entries=args.repeat + 1, default_ttl=0)
+                revisions = iter(range(args.repeat))
+                # Каждый рендер с новой версией — всегда промах кеша
+                cold = measure(
+                    lambda: render_template(template, **dict(context, revision=str(next(revisions)))),
+                    args.repeat
+                )
+
+                render_template(template, **context)
+                warm = measure(lambda: render_template(template, **context), args.repeat)
+
+            print_row(f"{template} rows={rows} no cache", summarize(uncached))
+            print_row(f"{template} rows={rows} cold", summarize(cold))
+            print_row(f"{template} rows={rows} warm", summarize(warm))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Пропускная способность создания приключений: построчные INSERT против пакетных.
+
+    python -m benchmarks.bench_import --adventures 2000 --npcs 10 --locations 10
+"""
+import time
+
+from app.services.db_service import insert_adventures
+from benchmarks.common import base_parser, connect, seed_users
+
+
+def make_records(userid, count, npcs, locations):
+    return [
+        {
+            'userid': userid,
+            'name': f"import {index}",
+            'story': f"story of adventure {index}",
+            'npcs': [(f"npc {index}.{n}", "description") for n in range(npcs)],
+            'locations': [(f"location {index}.{n}", "description") for n in range(locations)],
+        }
+        for index in range(count)
+    ]
+
+
+def insert_per_row(cursor, records):
+    """
+    Прежняя реализация create_adventure: INSERT на каждую строку.
+    """
+    for record in records:
+        cursor.execute(
+            "INSERT INTO adventures (userid, adventurename, story) VALUES (%s, %s, %s) RETURNING adventureid",
+            (record['userid'], record['name'], record['story'])
+        )
+        adventure_id = cursor.fetchone()[0]
+        for name, description in record['npcs']:
+            cursor.execute(
+                "INSERT INTO npcs (adventureid, npcname, npcdescription) VALUES (%s, %s, %s)",
+                (adventure_id, name, description)
+            )
+        for name, description in record['locations']:
+            cursor.execute(
+                "INSERT INTO locations (adventureid, locationname, locationdescription) VALUES (%s, %s, %s)",
+                (adventure_id, name, description)
+            )
+
+
+def insert_batched(cursor, records, batch_size=1000):
+    for start in range(0, len(records), batch_size):
+        insert_adventures(cursor, records[start:start + batch_size])
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--adventures', type=int, default=2000)
+    parser.add_argument('--npcs', type=int, default=10)
+    parser.add_argument('--locations', type=int, default=10)
+    args = parser.parse_args()
+
+    connection = connect(args.dsn)
+    try:
+        with connection.cursor() as cursor:
+            userid = seed_users(cursor, 1)[0]
+            records = make_records(userid, args.adventures, args.npcs, args.locations)
+            print(f"{args.adventures} adventures with {args.npcs} npcs and {args.locations} locations each")
+
+            for label, insert in (("per-row INSERT", insert_per_row), ("batched execute_values", insert_batched)):
+                cursor.execute("SAVEPOINT bench")
+                started = time.perf_counter()
+                insert(cursor, records)
+                elapsed = time.perf_counter() - started
+                cursor.execute("ROLLBACK TO SAVEPOINT bench")
+                print(f"{label:<30} {elapsed:8.2f} s  {args.adventures / elapsed:10.0f} adventures/sec")
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Проверка паролей scrypt: время одной проверки и пропускная способность
+(входов в секунду) при разной стоимости N и числе потоков пула.
+
+База не нужна: замеряется только хеширование.
+
+    python -m benchmarks.bench_passwords --cost 14 15 16 --workers 1 2 4
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.passwords import PasswordHasher
+from benchmarks.common import base_parser, measure, print_row, summarize
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--cost', type=int, nargs='+', default=[13, 14, 15],
+                        help="log2 N для scrypt")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1],
+                        help="Потоков в пуле хеширования")
+    parser.add_argument('--logins', type=int, default=200, help="Проверок на замер пропускной способности")
+    args = parser.parse_args()
+
+    for cost in args.cost:
+        for workers in args.workers:
+            hasher = PasswordHasher(n=2 ** cost, workers=workers, max_pending=args.logins)
+            stored = hasher.hash('correct horse battery staple')
+
+            latency = measure(lambda: hasher.verify('correct horse battery staple', stored), args.repeat)
+
+            # Клиентов больше, чем потоков пула: запросы ждут в очереди
+            with ThreadPoolExecutor(args.logins) as clients:
+                started = time.perf_counter()
+                list(clients.map(lambda _: hasher.verify('wrong password', stored), range(args.logins)))
+                elapsed = time.perf_counter() - started
+
+            logins_per_second = args.logins / elapsed
+            print_row(f"N=2^{cost} workers={workers}", summarize(latency))
+            print(f"{'':<40} {logins_per_second:>9.1f} logins/s  "
+                  f"{logins_per_second / workers:>9.1f} logins/s per core")
+
+
+if __name__ == '__main__':
+    main()
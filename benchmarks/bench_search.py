@@ -0,0 +1,82 @@
+"""
+Задержка поиска по каталогу приключений на 10k/100k/1M записей.
+
+Сравнивает полный просмотр (как до миграции 001, индексы выключены)
+с триграммными индексами и ранжированным полнотекстовым поиском, а также
+сортировки сводной таблицы каталога по популярности и времени изменения.
+
+    python -m benchmarks.bench_search --scales 10000 100000 1000000
+"""
+from app.services.adventure_search import AdventureQuery
+from benchmarks.common import base_parser, connect, measure, print_row, seed_adventures, seed_users, summarize
+
+
+def run_query(cursor, query):
+    sql, params = query.build()
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+
+def bench_scale(connection, scale, repeat):
+    results = {}
+    with connection.cursor() as cursor:
+        cursor.execute("ALTER TABLE npcs DISABLE TRIGGER npcs_search_vector")
+        cursor.execute("ALTER TABLE locations DISABLE TRIGGER locations_search_vector")
+        user_ids = seed_users(cursor, max(1, scale // 10))
+        adventure_ids = seed_adventures(cursor, user_ids, scale)
+        cursor.execute(
+            """
+            UPDATE adventures
+            SET search_vector = adventure_search_document(adventureid, adventurename, story, userid)
+            WHERE adventureid = ANY(%s)
+            """,
+            (adventure_ids,)
+        )
+        cursor.execute("ANALYZE adventures")
+        cursor.execute("ANALYZE users")
+        cursor.execute("ANALYZE adventure_catalogue")
+
+        cases = {
+            'name ILIKE, no indexes': (AdventureQuery().name_contains('dragon cas').limit(20), True),
+            'name ILIKE, trigram index': (AdventureQuery().name_contains('dragon cas').limit(20), False),
+            'author ILIKE, trigram index': (AdventureQuery().author_contains('bench_42_').limit(20), False),
+            'full text, first page': (AdventureQuery().matching('goblin tavern').limit(20), False),
+            'most played, first page': (AdventureQuery().sorted_by('popular').limit(20), False),
+            'recently updated, first page': (AdventureQuery().sorted_by('recent').limit(20), False),
+        }
+
+        first_page = run_query(cursor, AdventureQuery().matching('goblin tavern').limit(20))
+        if first_page:
+            query = AdventureQuery().matching('goblin tavern')
+            cases['full text, next page by cursor'] = (
+                query.after(query.cursor_for(first_page[-1])).limit(20), False
+            )
+
+        for label, (query, full_scan) in cases.items():
+            cursor.execute("SET LOCAL enable_indexscan = %s", ('off' if full_scan else 'on',))
+            cursor.execute("SET LOCAL enable_bitmapscan = %s", ('off' if full_scan else 'on',))
+            results[label] = summarize(measure(lambda: run_query(cursor, query), repeat))
+    return results
+
+
+def main():
+    parser = base_parser(__doc__)
+    parser.add_argument('--scales', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    connection = connect(args.dsn)
+    try:
+        for scale in args.scales:
+            print(f"\n{scale} adventures")
+            try:
+                results = bench_scale(connection, scale, args.repeat)
+            finally:
+                connection.rollback()
+            for label, summary in results.items():
+                print_row(label, summary)
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Общие помощники для бенчмарков: подключение, синтетические данные и замеры.
+
+Все бенчмарки заполняют базу внутри транзакции и откатывают её в конце,
+поэтому их можно запускать против базы со схемой приложения, не оставляя
+после себя данных.
+"""
+import argparse
+import statistics
+import time
+
+import psycopg2
+
+from config import Config
+
+WORDS = [
+    'dragon', 'goblin', 'castle', 'forest', 'tavern', 'wizard', 'crypt',
+    'harbor', 'desert', 'temple', 'orc', 'paladin', 'swamp', 'tower',
+    'mine', 'lich', 'village', 'bandit', 'ruins', 'storm',
+]
+
+
+def base_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        '--dsn',
+        default=(
+            f"host={Config.POSTGRES_HOST} port={Config.POSTGRES_PORT} "
+            f"dbname={Config.POSTGRES_DB} user={Config.POSTGRES_USER} "
+            f"password={Config.POSTGRES_PASSWORD}"
+        ),
+        help="Строка подключения к базе со схемой приложения",
+    )
+    parser.add_argument('--repeat', type=int, default=50, help="Повторов на замер")
+    return parser
+
+
+def connect(dsn):
+    return psycopg2.connect(dsn)
+
+
+def words_sql(seed_expression, count=3):
+    """
+    SQL-выражение, собирающее псевдослучайную фразу из WORDS по целому seed.
+
+    Знак процента экранирован: выражение предназначено для запросов с параметрами.
+    """
+    array = "ARRAY[" + ", ".join(f"'{word}'" for word in WORDS) + "]"
+    parts = [
+        f"({array})[1 + (({seed_expression}) * {prime} %% {len(WORDS)})]"
+        for prime in (7, 13, 17, 19, 23)[:count]
+    ]
+    return " || ' ' || ".join(parts)
+
+
+def seed_users(cursor, count, role='master'):
+    cursor.execute(
+        """
+        INSERT INTO users (userlogin, userpassword, userrole)
+        SELECT 'bench_' || g || '_' || txid_current(), 'bench', %s
+        FROM generate_series(1, %s) AS g
+        RETURNING userid
+        """,
+        (role, count)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def seed_adventures(cursor, user_ids, count, npcs_per_adventure=3, locations_per_adventure=3):
+    """
+    Создаёт `count` приключений с NPC и локациями, возвращает их id.
+    """
+    cursor.execute(
+        f"""
+        INSERT INTO adventures (userid, adventurename, story)
+        SELECT (%s::int[])[1 + g %% array_length(%s::int[], 1)],
+               {words_sql('g', 3)},
+               {words_sql('g + 1', 5)} || ' ' || {words_sql('g + 2', 5)}
+        FROM generate_series(1, %s) AS g
+        RETURNING adventureid
+        """,
+        (user_ids, user_ids, count)
+    )
+    adventure_ids = [row[0] for row in cursor.fetchall()]
+
+    if npcs_per_adventure:
+        cursor.execute(
+            f"""
+            INSERT INTO npcs (adventureid, npcname, npcdescription)
+            SELECT a, 'npc ' || n || ' ' || {words_sql('a + n', 1)}, {words_sql('a * n', 4)}
+            FROM unnest(%s::int[]) AS a, generate_series(1, %s) AS n
+            """,
+            (adventure_ids, npcs_per_adventure)
+        )
+    if locations_per_adventure:
+        cursor.execute(
+            f"""
+            INSERT INTO locations (adventureid, locationname, locationdescription)
+            SELECT a, 'location ' || n || ' ' || {words_sql('a + n', 1)}, {words_sql('a * n + 1', 4)}
+            FROM unnest(%s::int[]) AS a, generate_series(1, %s) AS n
+            """,
+            (adventure_ids, locations_per_adventure)
+        )
+    return adventure_ids
+
+
+def measure(func, repeat):
+    """
+    Вызывает func `repeat` раз и возвращает список длительностей в миллисекундах.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(timings):
+    return {
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+    }
+
+
+def print_row(label, summary):
+    print(
+        f"{label:<40} mean {summary['mean_ms']:>9.3f} ms  "
+        f"p50 {summary['p50_ms']:>9.3f}  p95 {summary['p95_ms']:>9.3f}  "
+        f"p99 {summary['p99_ms']:>9.3f}"
+    )
+
+
+def seed_campaign(cursor, adventure_id, author_id, player_ids=(), characters=0):
+    """
+    Создаёт кампанию по приключению через create_campaign_with_user,
+    добавляет игроков и `characters` персонажей, возвращает id кампании.
+    """
+    cursor.execute("CALL create_campaign_with_user(%s, %s)", (adventure_id, author_id))
+    cursor.execute(
+        "SELECT max(campaignid) FROM campaigns WHERE adventureid = %s",
+        (adventure_id,)
+    )
+    campaign_id = cursor.fetchone()[0]
+
+    if player_ids:
+        cursor.execute(
+            """
+            INSERT INTO users_campaigns (userid, campaignid, isauthor)
+            SELECT p, %s, FALSE FROM unnest(%s::int[]) AS p
+            """,
+            (campaign_id, list(player_ids))
+        )
+    if characters:
+        cursor.execute(
+            f"""
+            INSERT INTO player_characters (campaignid, charactername, characterdescription, characterlevel,
+                                           characterclass, characterskills, characterarmor, characterhp)
+            SELECT %s, 'hero ' || g, {words_sql('g', 4)}, 1 + g %% 20, {words_sql('g', 1)},
+                   {words_sql('g + 3', 3)}, 10 + g %% 8, 8 + g %% 40
+            FROM generate_series(1, %s) AS g
+            """,
+            (campaign_id, characters)
+        )
+    return campaign_id
@@ -0,0 +1,103 @@
+"""
+Нагрузочный тест продакшн-режима: запросов в секунду в зависимости от числа
+процессов gunicorn.
+
+Для каждого значения --workers запускает `gunicorn -c gunicorn.conf.py wsgi:app`,
+нагружает указанные пути параллельными клиентами в течение --duration секунд
+и печатает пропускную способность и задержки.
+
+    python -m benchmarks.loadtest --workers 1 2 4 8 --clients 64 --paths /adventures /adventures/1
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import percentile
+
+
+def wait_until_ready(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=1)
+            connection.request('GET', '/login')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not start in time")
+
+
+def client(host, port, paths, stop_at, latencies, errors):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    index = 0
+    while time.monotonic() < stop_at:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            connection.request('GET', path)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append(None)
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+    connection.close()
+
+
+def run(workers, args):
+    host, port = args.bind.rsplit(':', 1)
+    env = dict(os.environ, WSGI_WORKERS=str(workers), WSGI_BIND=args.bind,
+               WSGI_THREADS=str(args.threads))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(host, int(port))
+        latencies, errors = [], []
+        stop_at = time.monotonic() + args.duration
+        threads = [
+            threading.Thread(target=client, args=(host, int(port), args.paths, stop_at, latencies, errors))
+            for _ in range(args.clients)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    rps = len(latencies) / args.duration
+    p50 = percentile(latencies, 0.50) if latencies else 0
+    p99 = percentile(latencies, 0.99) if latencies else 0
+    print(f"{workers:>3} workers  {rps:10.1f} req/s  p50 {p50:8.2f} ms  p99 {p99:8.2f} ms  errors {len(errors)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--bind', default='127.0.0.1:8765')
+    parser.add_argument('--paths', nargs='+', default=['/adventures'])
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, {args.clients} clients, paths: {' '.join(args.paths)}")
+    for workers in args.workers:
+        run(workers, args)
+
+
+if __name__ == '__main__':
+    main()
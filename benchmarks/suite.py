@@ -0,0 +1,552 @@
+"""
+Нагрузочный прогон всех маршрутов main_bp на синтетических данных.
+
+Заполняет базу пользователями, приключениями с NPC и локациями,
+кампаниями с игроками и персонажами в выбранном масштабе, прогоняет каждый
+маршрут параллельными клиентами (тестовый клиент Flask в потоках, с пулом
+соединений и кешем приложения) и сохраняет p50/p95/p99, пропускную способность
+и число SQL-запросов на HTTP-запрос в JSON. Созданные данные удаляются
+в конце прогона.
+
+    python -m benchmarks.suite run --scale medium --clients 16 --output before.json
+    python -m benchmarks.suite compare before.json after.json --threshold 10
+
+Без доступной базы можно поднять временный кластер PostgreSQL (нужны initdb
+и pg_ctl в PATH), схема создаётся миграциями из migrations/:
+
+    python -m benchmarks.suite run --initdb --output run.json
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import psycopg2
+import psycopg2.extensions
+
+from app.services.migrations import migrate
+from benchmarks.common import base_parser, connect, percentile, seed_adventures, seed_campaign, seed_users
+
+SCALES = {
+    'small': dict(masters=10, players=20, adventures=200, npcs=3, locations=3,
+                  campaigns=20, campaign_players=3, characters=5),
+    'medium': dict(masters=50, players=200, adventures=5000, npcs=5, locations=5,
+                   campaigns=200, campaign_players=5, characters=10),
+    'large': dict(masters=200, players=2000, adventures=50000, npcs=8, locations=8,
+                  campaigns=2000, campaign_players=8, characters=20),
+}
+
+
+class Dataset:
+    """
+    Идентификаторы созданных данных, из которых сценарии берут параметры.
+
+    Одноразовые приключения выдаются сценариям удаления по одному.
+    """
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.user_ids = []
+        self.master_id = None
+        self.player_id = None
+        self.admin_id = None
+        self.player_logins = []
+        self.adventure_ids = []
+        self.campaign_ids = []
+        self.members = {}
+        self._disposable = []
+        self._rows = {'npcs': [], 'locations': []}
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+
+    def unique(self, prefix):
+        return f"{prefix}_{self.tag}_{next(self._counter)}"
+
+    def take_disposable(self, count=1):
+        with self._lock:
+            taken, self._disposable = self._disposable[:count], self._disposable[count:]
+        return taken
+
+    def take_row(self, kind):
+        """
+        Пара (приключение, id строки) NPC или локации для удаления, None,
+        если строки кончились.
+        """
+        with self._lock:
+            rows = self._rows[kind]
+            return rows.pop() if rows else None
+
+    def free_membership(self):
+        """
+        Пара (кампания, логин игрока), ещё не связанная участием.
+        """
+        with self._lock:
+            for campaign_id in self.campaign_ids:
+                members = self.members[campaign_id]
+                for login in self.player_logins:
+                    if login not in members:
+                        members.add(login)
+                        return campaign_id, login
+        return None
+
+
+def seed(dsn, scale, tag):
+    """
+    Заполняет базу данными масштаба `scale` и фиксирует транзакцию:
+    приложение читает их через собственные соединения.
+    """
+    sizes = SCALES[scale]
+    dataset = Dataset(tag)
+    connection = connect(dsn)
+    try:
+        with connection.cursor() as cursor:
+            masters = seed_users(cursor, sizes['masters'], role='master')
+            players = seed_users(cursor, sizes['players'], role='player')
+            admins = seed_users(cursor, 1, role='admin')
+            dataset.user_ids = masters + players + admins
+            dataset.master_id, dataset.player_id, dataset.admin_id = masters[0], players[0], admins[0]
+
+            cursor.execute(
+                "SELECT userid, userlogin FROM users WHERE userid = ANY(%s)",
+                (players,)
+            )
+            logins = dict(cursor.fetchall())
+            dataset.player_logins = [logins[player_id] for player_id in players]
+
+            dataset.adventure_ids = seed_adventures(
+                cursor, masters, sizes['adventures'], sizes['npcs'], sizes['locations']
+            )
+            dataset._disposable = seed_adventures(cursor, masters, sizes['adventures'] // 10 + 100, 1, 1)
+            # Первое приключение перезаписывает сценарий adventure_save
+            for kind, id_column in (('npcs', 'npcid'), ('locations', 'locationid')):
+                cursor.execute(
+                    f"SELECT adventureid, {id_column} FROM {kind} WHERE adventureid = ANY(%s)",
+                    (dataset.adventure_ids[1:],)
+                )
+                dataset._rows[kind] = cursor.fetchall()
+
+            campaign_players = sizes['campaign_players']
+            for index in range(sizes['campaigns']):
+                adventure_id = dataset.adventure_ids[index % len(dataset.adventure_ids)]
+                author_id = masters[index % len(masters)]
+                start = (index * campaign_players) % len(players)
+                member_ids = (players + players)[start:start + campaign_players]
+                if dataset.player_id not in member_ids:
+                    member_ids.append(dataset.player_id)
+                campaign_id = seed_campaign(cursor, adventure_id, author_id, member_ids, sizes['characters'])
+                dataset.campaign_ids.append(campaign_id)
+                dataset.members[campaign_id] = {logins[member_id] for member_id in member_ids}
+        connection.commit()
+    finally:
+        connection.close()
+    return dataset
+
+
+def cleanup(dsn, dataset):
+    """
+    Удаляет всё, что создали посев и сценарии: приключения (вместе
+    с кампаниями) и кампании созданных пользователей, их фоновые задачи,
+    самих пользователей и учётные записи, заведённые сценарием регистрации.
+    """
+    from app.services.db_service import DELETE_ADVENTURES_SQL
+
+    connection = connect(dsn)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT userid FROM users WHERE userlogin LIKE %s",
+                (f"bench_register_{dataset.tag}_%",)
+            )
+            user_ids = dataset.user_ids + [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                "SELECT adventureid FROM adventures WHERE userid = ANY(%s)",
+                (user_ids,)
+            )
+            adventure_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute(DELETE_ADVENTURES_SQL.sql, {'adventure_ids': adventure_ids, 'user_id': None})
+            cursor.execute(
+                "DELETE FROM player_characters WHERE campaignid IN "
+                "(SELECT campaignid FROM users_campaigns WHERE userid = ANY(%s))",
+                (user_ids,)
+            )
+            cursor.execute("DELETE FROM users_campaigns WHERE userid = ANY(%s)", (user_ids,))
+            # Задачи удаления и импорта, поставленные сценариями
+            cursor.execute("DELETE FROM jobs WHERE userid = ANY(%s)", (user_ids,))
+            cursor.execute("DELETE FROM users WHERE userid = ANY(%s)", (user_ids,))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def scenarios(dataset):
+    """
+    Сценарии по маршрутам main_bp: (имя, роль сессии, функция запроса).
+
+    Функция получает тестовый клиент и номер итерации и возвращает ответ
+    или None, если для итерации не осталось данных (например, одноразовых
+    приключений для удаления).
+    """
+    adventures = dataset.adventure_ids
+    campaigns = dataset.campaign_ids
+
+    def pick(items, index):
+        return items[index % len(items)]
+
+    def delete_one(client, index):
+        taken = dataset.take_disposable()
+        return client.post(f'/adventures/{taken[0]}/delete') if taken else None
+
+    def bulk_delete(client, index):
+        taken = dataset.take_disposable(5)
+        return client.post('/admin/adventures/delete', json={'adventure_ids': taken}) if taken else None
+
+    def add_player(client, index):
+        pair = dataset.free_membership()
+        if pair is None:
+            return None
+        campaign_id, login = pair
+        return client.post(f'/campaigns/{campaign_id}/add_player', data={'username': login})
+
+    def import_file(client, index):
+        payload = json.dumps([{
+            'name': dataset.unique('bench_import'),
+            'story': 'imported by the benchmark suite',
+            'npcs': [{'name': 'npc', 'description': 'imported'}],
+            'locations': [{'name': 'location', 'description': 'imported'}],
+        }]).encode()
+        return client.post('/adventures/import', data={'file': (io.BytesIO(payload), 'bench.json')},
+                           content_type='multipart/form-data')
+
+    def delete_row(kind, path, id_field):
+        def request(client, index):
+            row = dataset.take_row(kind)
+            if row is None:
+                return None
+            adventure_id, row_id = row
+            return client.post(path, data={'adventureid': adventure_id, id_field: row_id})
+        return request
+
+    def item_form(index):
+        return {'adventureid': pick(adventures, index), 'name': f'bench item {index}', 'description': 'bench'}
+
+    return [
+        ('index', None, lambda c, i: c.get('/')),
+        ('login_form', None, lambda c, i: c.get('/login')),
+        ('login', None, lambda c, i: c.post('/login', data={'name': dataset.player_logins[0], 'password': 'bench'})),
+        ('register', None, lambda c, i: c.post('/register', data={
+            'name': dataset.unique('bench_register'), 'password': 'bench', 'role': 'player'})),
+        ('me', 'player', lambda c, i: c.get('/me')),
+        ('logout', 'player', lambda c, i: c.get('/logout')),
+        ('adventures', 'player', lambda c, i: c.get('/adventures')),
+        ('adventures_search', 'player', lambda c, i: c.get('/adventures', query_string={'q': 'dragon tavern'})),
+        ('adventures_filter', 'player', lambda c, i: c.get('/adventures', query_string={'search_name': 'or'})),
+        ('adventures_export', 'player', lambda c, i: c.get('/adventures/export.csv')),
+        ('adventure_view', 'player', lambda c, i: c.get(f'/adventures/{pick(adventures, i)}')),
+        ('adventure_new_form', 'master', lambda c, i: c.get('/adventures/new')),
+        ('adventure_create', 'master', lambda c, i: c.post('/adventures/new', data={
+            'adventurename': dataset.unique('bench_adventure'), 'story': 'created by the benchmark suite',
+            'npc[]': ['npc one', 'npc two'], 'npc_description[]': ['first', 'second'],
+            'location[]': ['location one'], 'location_description[]': ['first'],
+        })),
+        ('adventure_import', 'master', import_file),
+        ('adventure_edit_form', 'master', lambda c, i: c.get(f'/adventures/{adventures[0]}/edit')),
+        ('adventure_edit', 'master', lambda c, i: c.post(f'/adventures/{adventures[0]}/edit', data={
+            'adventurename': f'bench edited {i}', 'story': 'edited by the benchmark suite'})),
+        # Редактор отправляет весь набор строк: прежние NPC и локации удаляются
+        ('adventure_save', 'master', lambda c, i: c.post(f'/adventures/{adventures[0]}/edit', data={
+            'adventurename': f'bench saved {i}', 'story': 'saved by the benchmark suite',
+            'npc_id[]': ['', ''], 'npc_name[]': [f'npc {i}', f'npc {i + 1}'], 'npc_description[]': ['first', 'second'],
+            'location_id[]': [''], 'location_name[]': [f'location {i}'], 'location_description[]': ['first'],
+        })),
+        ('adventure_delete', 'master', delete_one),
+        ('admin_bulk_delete', 'admin', bulk_delete),
+        ('npc_create', 'master', lambda c, i: c.post('/npc/create', data=item_form(i))),
+        ('npc_delete', 'master', delete_row('npcs', '/npc/delete', 'npcid')),
+        ('location_create', 'master', lambda c, i: c.post('/locations/create', data=item_form(i))),
+        ('location_delete', 'master', delete_row('locations', '/locations/delete', 'locationid')),
+        ('campaigns', 'player', lambda c, i: c.get('/campaigns')),
+        ('campaign_create', 'master', lambda c, i: c.post('/campaigns/new', data={
+            'adventureid': pick(adventures, i)})),
+        ('campaign_view', 'player', lambda c, i: c.get(f'/campaigns/{pick(campaigns, i)}')),
+        ('campaign_add_player', 'master', add_player),
+        # Пакет логинов: после первой итерации все уже участники
+        ('campaign_add_players', 'master', lambda c, i: c.post(
+            f'/campaigns/{campaigns[0]}/add_player', data={'username': ', '.join(dataset.player_logins[:8])})),
+        ('campaign_add_character', 'master', lambda c, i: c.post(
+            f'/campaigns/{pick(campaigns, i)}/add_character', data={
+                'charactername': f'bench hero {i}', 'characterdescription': 'bench',
+                'characterlevel': '3', 'characterclass': 'fighter', 'characterskills': 'athletics',
+                'characterarmor': '15', 'characterhp': '28'})),
+        ('stats_pool', 'admin', lambda c, i: c.get('/stats/pool')),
+        ('stats_cache', 'admin', lambda c, i: c.get('/stats/cache')),
+        ('stats_queries', 'admin', lambda c, i: c.get('/stats/queries')),
+        ('metrics', 'admin', lambda c, i: c.get('/metrics')),
+    ]
+
+
+def make_client(app, dataset, role):
+    client = app.test_client()
+    if role is not None:
+        user_id = {'player': dataset.player_id, 'master': dataset.master_id, 'admin': dataset.admin_id}[role]
+        with client.session_transaction() as session:
+            session['userid'] = user_id
+            session['login'] = f'bench_{role}'
+            session['role'] = role
+    return client
+
+
+def run_scenario(app, dataset, role, request, requests, clients, query_counter):
+    """
+    Выполняет `requests` запросов сценария `clients` потоками и возвращает
+    сводку: задержки, пропускную способность и SQL-запросы на HTTP-запрос.
+    """
+    iterations = itertools.count()
+    lock = threading.Lock()
+    latencies, query_counts, errors = [], [], []
+
+    def worker():
+        client = make_client(app, dataset, role)
+        while True:
+            with lock:
+                index = next(iterations)
+            if index >= requests:
+                return
+            query_counter.value = 0
+            started = time.perf_counter()
+            try:
+                response = request(client, index)
+                if response is None:
+                    return
+                # Потоковые ответы (шаблоны, CSV) отдаются только при чтении тела
+                response.get_data()
+            except Exception as e:
+                errors.append(repr(e))
+                continue
+            elapsed = (time.perf_counter() - started) * 1000
+            response.close()
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+            with lock:
+                latencies.append(elapsed)
+                query_counts.append(query_counter.value)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    if not latencies:
+        return {'requests': 0, 'errors': len(errors)}
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': round(len(latencies) / wall, 2),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries_per_request': round(sum(query_counts) / len(query_counts), 2),
+    }
+
+
+def create_bench_app(dsn, cache_backend):
+    from app import create_app
+    from app.services import queries
+
+    app = create_app()
+    parameters = psycopg2.extensions.parse_dsn(dsn)
+    app.config.update(
+        POSTGRES_HOST=parameters.get('host', app.config["POSTGRES_HOST"]),
+        POSTGRES_PORT=parameters.get('port', app.config["POSTGRES_PORT"]),
+        POSTGRES_DB=parameters.get('dbname', app.config["POSTGRES_DB"]),
+        POSTGRES_USER=parameters.get('user', app.config["POSTGRES_USER"]),
+        POSTGRES_PASSWORD=parameters.get('password', app.config["POSTGRES_PASSWORD"]),
+        CACHE_BACKEND=cache_backend,
+    )
+    from app.services import cache
+    cache.init_app(app)
+
+    query_counter = threading.local()
+
+    def count_query(name, duration, rows):
+        query_counter.value = getattr(query_counter, 'value', 0) + 1
+
+    queries.add_listener(count_query)
+    return app, query_counter
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def temporary_cluster():
+    """
+    Временный кластер PostgreSQL в каталоге /tmp на свободном порту со схемой
+    из migrations/. Возвращает строку подключения.
+    """
+    for binary in ('initdb', 'pg_ctl'):
+        if shutil.which(binary) is None:
+            raise SystemExit(f"{binary} not found in PATH")
+
+    directory = tempfile.mkdtemp(prefix='dnd-bench-')
+    data = os.path.join(directory, 'data')
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    subprocess.run(['initdb', '-D', data, '-U', 'postgres', '--auth=trust'],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run(['pg_ctl', '-D', data, '-w', '-l', os.path.join(directory, 'postgres.log'),
+                    '-o', f"-p {port} -k {directory} -c listen_addresses=''", 'start'],
+                   check=True, stdout=subprocess.DEVNULL)
+    dsn = f"host={directory} port={port} dbname=postgres user=postgres"
+    try:
+        connection = connect(dsn)
+        try:
+            migrate(connection)
+        finally:
+            connection.close()
+        yield dsn
+    finally:
+        subprocess.run(['pg_ctl', '-D', data, '-m', 'fast', 'stop'], stdout=subprocess.DEVNULL)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_suite(args):
+    tag = f"{int(time.time())}_{os.getpid()}"
+    print(f"seeding scale={args.scale} ...", file=sys.stderr)
+    dataset = seed(args.dsn, args.scale, tag)
+    app, query_counter = create_bench_app(args.dsn, args.cache)
+
+    results = {}
+    try:
+        for name, role, request in scenarios(dataset):
+            if args.only and name not in args.only:
+                continue
+            summary = run_scenario(app, dataset, role, request, args.requests, args.clients, query_counter)
+            results[name] = summary
+            if summary['requests']:
+                print(
+                    f"{name:<24} {summary['throughput_rps']:>9.1f} req/s  p50 {summary['p50_ms']:>8.2f}  "
+                    f"p95 {summary['p95_ms']:>8.2f}  p99 {summary['p99_ms']:>8.2f} ms  "
+                    f"queries {summary['queries_per_request']:>5.1f}  errors {summary['errors']}"
+                )
+            else:
+                print(f"{name:<24} no requests completed, errors {summary['errors']}")
+    finally:
+        if not args.keep:
+            cleanup(args.dsn, dataset)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'scale': args.scale,
+            'sizes': SCALES[args.scale],
+            'clients': args.clients,
+            'requests_per_route': args.requests,
+            'cache': args.cache,
+            'python': sys.version.split()[0],
+        },
+        'routes': results,
+    }
+
+
+def run_command(args):
+    if args.initdb:
+        with temporary_cluster() as dsn:
+            args.dsn = dsn
+            report = run_suite(args)
+    else:
+        report = run_suite(args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(report, output, indent=2, ensure_ascii=False)
+        print(f"results written to {args.output}", file=sys.stderr)
+
+
+def compare_command(args):
+    """
+    Сравнивает два прогона и завершается с кодом 1, если p95 или число
+    запросов на HTTP-запрос выросли больше порога.
+    """
+    with open(args.baseline, encoding='utf-8') as baseline_file:
+        baseline = json.load(baseline_file)
+    with open(args.candidate, encoding='utf-8') as candidate_file:
+        candidate = json.load(candidate_file)
+
+    print(f"baseline {baseline['meta'].get('commit')}  candidate {candidate['meta'].get('commit')}")
+    regressions = []
+    for name, after in candidate['routes'].items():
+        before = baseline['routes'].get(name)
+        if not before or not before.get('requests') or not after.get('requests'):
+            continue
+        p95_change = (after['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        rps_change = (
+            (after['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] * 100
+            if before['throughput_rps'] else 0.0
+        )
+        more_queries = after['queries_per_request'] > before['queries_per_request']
+        regressed = p95_change > args.threshold or more_queries
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{'!' if regressed else ' '} {name:<24} p95 {before['p95_ms']:>8.2f} -> {after['p95_ms']:>8.2f} ms "
+            f"({p95_change:+6.1f}%)  req/s {rps_change:+6.1f}%  "
+            f"queries {before['queries_per_request']:.1f} -> {after['queries_per_request']:.1f}"
+        )
+
+    if regressions:
+        print(f"regressions: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', parents=[base_parser(None)], add_help=False,
+                                     help="Прогнать маршруты и сохранить результаты")
+    run_parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    run_parser.add_argument('--clients', type=int, default=8, help="Параллельных клиентов")
+    run_parser.add_argument('--requests', type=int, default=200, help="Запросов на маршрут")
+    run_parser.add_argument('--cache', default='memory', help="CACHE_BACKEND приложения (memory, null)")
+    run_parser.add_argument('--only', nargs='+', help="Прогнать только указанные сценарии")
+    run_parser.add_argument('--output', help="Файл для результатов в JSON")
+    run_parser.add_argument('--keep', action='store_true', help="Не удалять созданные данные")
+    run_parser.add_argument('--initdb', action='store_true',
+                            help="Поднять временный кластер PostgreSQL вместо --dsn")
+    run_parser.set_defaults(handler=run_command)
+
+    compare_parser = commands.add_parser('compare', help="Сравнить два JSON-файла результатов")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help="Допустимый рост p95, проценты")
+    compare_parser.set_defaults(handler=compare_command)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,162 @@
+import os
+import secrets
+
+
 class Config:
     POSTGRES_HOST = "localhost"
     POSTGRES_PORT = "5432"
     POSTGRES_DB = "dnd"
     POSTGRES_USER = "postgres"
     POSTGRES_PASSWORD = "postgres"
+
+    # Пул соединений с PostgreSQL
+    POSTGRES_POOL_MIN_SIZE = 1
+    POSTGRES_POOL_MAX_SIZE = 10
+    POSTGRES_POOL_MAX_OVERFLOW = 5
+    POSTGRES_POOL_TIMEOUT = 30.0
+    POSTGRES_POOL_MAX_LIFETIME = 3600.0
+    POSTGRES_POOL_PRE_PING = True
+
+    # Реплики для чтения: "host[:port]" через запятую, например
+    # POSTGRES_REPLICAS=localhost:5433,localhost:5434 (пусто — всё читается
+    # с основного сервера). Реплика, к которой не удалось подключиться
+    # за POSTGRES_REPLICA_CONNECT_TIMEOUT секунд или получить соединение
+    # из пула за POSTGRES_REPLICA_POOL_TIMEOUT, пропускается
+    # POSTGRES_REPLICA_RETRY секунд. После записи сессия читает с основного
+    # сервера REPLICA_READ_YOUR_WRITES_SECONDS секунд — окно должно быть
+    # больше отставания реплик. Промахи кеша читаются с основного сервера.
+    POSTGRES_REPLICAS = [
+        replica.strip() for replica in os.environ.get("POSTGRES_REPLICAS", "").split(",") if replica.strip()
+    ]
+    POSTGRES_REPLICA_CONNECT_TIMEOUT = 2
+    POSTGRES_REPLICA_POOL_TIMEOUT = 1.0
+    POSTGRES_REPLICA_RETRY = 10.0
+    REPLICA_READ_YOUR_WRITES_SECONDS = 5.0
+
+    # Каталог приключений: размер страницы и порция серверного курсора выгрузки
+    ADVENTURES_PAGE_SIZE = 50
+    ADVENTURES_EXPORT_ITERSIZE = 1000
+
+    # Кеш: 'memory' (LRU+TTL в процессе), 'redis' или 'null'.
+    # Сбросы кеша в памяти рассылаются остальным процессам (рабочим
+    # процессам gunicorn, jobs-worker) через LISTEN/NOTIFY, если включён
+    # CACHE_SYNC; без него при нескольких процессах используйте 'redis'.
+    # Слушатель после обрыва переподключается через
+    # CACHE_SYNC_RETRY_INTERVAL секунд и очищает кеш процесса.
+    CACHE_BACKEND = "memory"
+    CACHE_DEFAULT_TTL = 300
+    CACHE_MAX_ENTRIES = 10000
+    CACHE_REDIS_URL = "redis://localhost:6379/0"
+    CACHE_KEY_PREFIX = "dnd:"
+    CACHE_SYNC = True
+    CACHE_SYNC_RETRY_INTERVAL = 5.0
+
+    # Кеш фрагментов шаблонов: LRU в памяти процесса, ключи включают
+    # версию сущности, поэтому TTL лишь ограничивает время жизни записи
+    FRAGMENT_CACHE_ENABLED = True
+    FRAGMENT_CACHE_MAX_ENTRIES = 5000
+    FRAGMENT_CACHE_TTL = 3600
+
+    # JSON API: предельное число операций в одном пакетном запросе
+    API_BATCH_MAX_OPERATIONS = 500
+
+    # Права пользователя (авторство приключений, участие в кампаниях)
+    # кешируются на столько секунд; изменения сбрасывают кеш
+    AUTHZ_CACHE_TTL = 60
+
+    # Сессии: 'postgres' (таблица sessions), 'redis' или 'memory' (только
+    # для одного процесса и тестов). В cookie хранится лишь непрозрачный id,
+    # сессия живёт SESSION_TTL секунд с последнего продления, а отзыв
+    # не требует смены SECRET_KEY.
+    SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "postgres")
+    SESSION_TTL = int(os.environ.get("SESSION_TTL", 7 * 24 * 3600))
+    SESSION_REDIS_URL = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/1")
+    SESSION_COOKIE_SAMESITE = "Lax"
+    # Ключ подписи Flask; без переменной окружения — случайный на процесс
+    SECRET_KEY = os.environ.get("SECRET_KEY") or secrets.token_hex(32)
+
+    # Пароли: scrypt со стоимостью N (степень двойки), r, p. Хеши с другими
+    # параметрами пересчитываются при входе. Проверка идёт в пуле из
+    # PASSWORD_HASH_WORKERS потоков (0 — по числу ядер); если ждут больше
+    # PASSWORD_HASH_MAX_PENDING проверок, вход сразу отвечает 503.
+    PASSWORD_SCRYPT_N = int(os.environ.get("PASSWORD_SCRYPT_N", 2 ** 14))
+    PASSWORD_SCRYPT_R = 8
+    PASSWORD_SCRYPT_P = 1
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 0))
+    PASSWORD_HASH_MAX_PENDING = 64
+    PASSWORD_HASH_TIMEOUT = 10.0
+
+    # Фоновые задачи (таблица jobs): каскадные удаления, импорт и пересчёт
+    # сводок выполняет отдельный процесс flask jobs-worker. Одновременно
+    # выполняется не больше JOBS_CONCURRENCY[вид] задач вида на все
+    # воркеры; упавшая задача повторяется через JOBS_RETRY_BACKOFF * 2^n
+    # секунд (не дольше JOBS_RETRY_BACKOFF_MAX), всего до JOBS_MAX_ATTEMPTS
+    # попыток. Задачи воркера, молчащего JOBS_STALE_AFTER секунд,
+    # возвращаются в очередь. Сброс кеша из воркера доходит до веб-процессов
+    # через Redis или CACHE_SYNC. Задача ждёт в очереди, пока её не возьмёт
+    # воркер; JOBS_RUN_INLINE=1 (только для разработки и тестов) разрешает
+    # веб-процессу выполнить её сам в том же запросе, если живых воркеров
+    # для её вида нет.
+    JOBS_CONCURRENCY = {
+        'delete_adventures': 2,
+        'delete_campaign': 2,
+        'import_adventures': 1,
+        'refresh_catalogue': 1,
+    }
+    JOBS_DEFAULT_CONCURRENCY = 1
+    JOBS_MAX_ATTEMPTS = 5
+    JOBS_RETRY_BACKOFF = 5.0
+    JOBS_RETRY_BACKOFF_MAX = 600.0
+    JOBS_STALE_AFTER = 300
+    JOBS_POLL_INTERVAL = 5.0
+    JOBS_KEEP_DAYS = 7
+    JOBS_RUN_INLINE = os.environ.get("JOBS_RUN_INLINE", "0") == "1"
+
+    # Роль пользователя с доступом к административным эндпоинтам
+    ADMIN_ROLE = "admin"
+
+    # Служебные эндпоинты (/stats/*, /metrics) доступны ADMIN_ROLE, а
+    # сборщику метрик — с заголовком "Authorization: Bearer <STATS_TOKEN>"
+    # (без переменной окружения доступ по токену отключён)
+    STATS_TOKEN = os.environ.get("STATS_TOKEN")
+
+    # Применять миграции из migrations/ при создании приложения
+    MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "0") == "1"
+
+    # Соль ETag страниц: сменить при изменении шаблонов, чтобы клиенты
+    # не получили 304 на устаревшую разметку
+    HTTP_CACHE_SALT = os.environ.get("HTTP_CACHE_SALT", "1")
+
+    # Реестр запросов: подготовка на сервере (PREPARE) и EXPLAIN запросов
+    # медленнее порога в мс (None — отключено), не чаще раза в
+    # QUERY_EXPLAIN_INTERVAL секунд на запрос; хранится не более
+    # QUERY_EXPLAIN_KEEP последних планов на запрос. QUERY_EXPLAIN_ANALYZE
+    # выполняет медленный запрос повторно ради фактических цифр — в продакшне
+    # для этого лучше расширение auto_explain.
+    QUERY_PREPARE = os.environ.get("QUERY_PREPARE", "1") == "1"
+    QUERY_EXPLAIN_SLOW_MS = float(os.environ["QUERY_EXPLAIN_SLOW_MS"]) if os.environ.get("QUERY_EXPLAIN_SLOW_MS") else None
+    QUERY_EXPLAIN_ANALYZE = os.environ.get("QUERY_EXPLAIN_ANALYZE", "0") == "1"
+    QUERY_EXPLAIN_INTERVAL = 60.0
+    QUERY_EXPLAIN_KEEP = 20
+
+    # Уровень логирования и бюджет запросов к БД на один HTTP-запрос:
+    # при превышении пишется предупреждение (признак N+1)
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    METRICS_QUERY_BUDGET = int(os.environ.get("METRICS_QUERY_BUDGET", "20"))
+
+    # Асинхронный режим (asgi.py): предельный размер тела запроса,
+    # передаваемого синхронным маршрутам
+    ASGI_MAX_BODY_SIZE = 16 * 1024 * 1024
+
+    # Продакшн-сервер (gunicorn.conf.py). Значения можно переопределить
+    # переменными окружения с теми же именами.
+    WSGI_BIND = os.environ.get("WSGI_BIND", "0.0.0.0:8000")
+    # 0 — по числу ядер: 2 * CPU + 1
+    WSGI_WORKERS = int(os.environ.get("WSGI_WORKERS", 0))
+    # Потоков на процесс; не больше POSTGRES_POOL_MAX_SIZE + POSTGRES_POOL_MAX_OVERFLOW
+    WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 4))
+    WSGI_KEEPALIVE = int(os.environ.get("WSGI_KEEPALIVE", 5))
+    WSGI_TIMEOUT = int(os.environ.get("WSGI_TIMEOUT", 30))
+    WSGI_GRACEFUL_TIMEOUT = int(os.environ.get("WSGI_GRACEFUL_TIMEOUT", 30))
+    WSGI_MAX_REQUESTS = int(os.environ.get("WSGI_MAX_REQUESTS", 10000))
+    WSGI_MAX_REQUESTS_JITTER = int(os.environ.get("WSGI_MAX_REQUESTS_JITTER", 1000))
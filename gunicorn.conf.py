@@ -0,0 +1,35 @@
+"""
+Конфигурация gunicorn для продакшн-режима, см. wsgi.py.
+
+Приложение загружается в мастер-процессе до форка (preload_app), поэтому
+импортированные модули и шаблоны разделяются процессами copy-on-write.
+Пул соединений создаётся лениво в каждом рабочем процессе. В мастере
+соединение открывается только для миграций при MIGRATE_ON_STARTUP, и пул
+закрывается сразу после них (create_app).
+"""
+import multiprocessing
+
+from config import Config
+
+bind = Config.WSGI_BIND
+workers = Config.WSGI_WORKERS or multiprocessing.cpu_count() * 2 + 1
+worker_class = 'gthread'
+threads = Config.WSGI_THREADS
+keepalive = Config.WSGI_KEEPALIVE
+timeout = Config.WSGI_TIMEOUT
+graceful_timeout = Config.WSGI_GRACEFUL_TIMEOUT
+max_requests = Config.WSGI_MAX_REQUESTS
+max_requests_jitter = Config.WSGI_MAX_REQUESTS_JITTER
+preload_app = True
+
+
+def post_fork(server, worker):
+    # Пул, если мастер всё же успел его создать, принадлежит мастеру:
+    # процесс-потомок должен открыть собственные соединения.
+    server.app.wsgi().extensions.pop('db_pool', None)
+
+
+def worker_exit(server, worker):
+    pool = server.app.wsgi().extensions.get('db_pool')
+    if pool is not None:
+        pool.closeall()
@@ -0,0 +1,90 @@
+-- Базовая схема приложения.
+--
+-- Таблицы создаются только если их ещё нет, поэтому миграция безопасна
+-- для баз, созданных до появления миграций: на них она лишь добавляет
+-- недостающие функцию и процедуру. Индексы горячих запросов — в 002.
+
+CREATE TABLE IF NOT EXISTS users (
+    userid       serial PRIMARY KEY,
+    userlogin    text NOT NULL,
+    userpassword text NOT NULL,
+    userrole     text NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS adventures (
+    adventureid   serial PRIMARY KEY,
+    userid        integer NOT NULL REFERENCES users (userid),
+    adventurename text NOT NULL,
+    story         text
+);
+
+CREATE TABLE IF NOT EXISTS npcs (
+    npcid          serial PRIMARY KEY,
+    adventureid    integer NOT NULL REFERENCES adventures (adventureid),
+    npcname        text NOT NULL,
+    npcdescription text
+);
+
+CREATE TABLE IF NOT EXISTS locations (
+    locationid          serial PRIMARY KEY,
+    adventureid         integer NOT NULL REFERENCES adventures (adventureid),
+    locationname        text NOT NULL,
+    locationdescription text
+);
+
+CREATE TABLE IF NOT EXISTS campaigns (
+    campaignid  serial PRIMARY KEY,
+    adventureid integer NOT NULL REFERENCES adventures (adventureid)
+);
+
+CREATE TABLE IF NOT EXISTS users_campaigns (
+    userid     integer NOT NULL REFERENCES users (userid),
+    campaignid integer NOT NULL REFERENCES campaigns (campaignid),
+    isauthor   boolean NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS player_characters (
+    characterid          serial PRIMARY KEY,
+    campaignid           integer NOT NULL REFERENCES campaigns (campaignid),
+    charactername        text NOT NULL,
+    characterdescription text,
+    characterlevel       integer,
+    characterclass       text,
+    characterskills      text,
+    characterarmor       integer,
+    characterhp          integer
+);
+
+CREATE OR REPLACE FUNCTION get_adventure_details(p_adventureid integer)
+RETURNS TABLE (
+    adventureid         integer,
+    adventurename       text,
+    story               text,
+    npcname             text,
+    npcdescription      text,
+    locationname        text,
+    locationdescription text
+)
+LANGUAGE sql STABLE AS $$
+    SELECT a.adventureid, a.adventurename, a.story,
+           n.npcname, n.npcdescription,
+           l.locationname, l.locationdescription
+    FROM adventures a
+    LEFT JOIN npcs n ON n.adventureid = a.adventureid
+    LEFT JOIN locations l ON l.adventureid = a.adventureid
+    WHERE a.adventureid = p_adventureid
+$$;
+
+CREATE OR REPLACE PROCEDURE create_campaign_with_user(p_adventureid integer, p_userid integer)
+LANGUAGE plpgsql AS $$
+DECLARE
+    v_campaignid integer;
+BEGIN
+    INSERT INTO campaigns (adventureid)
+    VALUES (p_adventureid)
+    RETURNING campaignid INTO v_campaignid;
+
+    INSERT INTO users_campaigns (userid, campaignid, isauthor)
+    VALUES (p_userid, v_campaignid, TRUE);
+END
+$$;
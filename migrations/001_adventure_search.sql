@@ -0,0 +1,100 @@
+-- Полнотекстовый и триграммный поиск по приключениям.
+--
+-- adventures.search_vector хранит взвешенный tsvector по названию, автору,
+-- сюжету, NPC и локациям и поддерживается триггерами. Триграммные индексы
+-- позволяют использовать индекс для LIKE '%...%' по названию и логину автора.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE adventures ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION adventure_search_document(
+    p_adventureid integer,
+    p_adventurename text,
+    p_story text,
+    p_userid integer
+) RETURNS tsvector
+LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(p_adventurename, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(
+               (SELECT userlogin FROM users WHERE userid = p_userid), '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(p_story, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(
+               (SELECT string_agg(npcname || ' ' || coalesce(npcdescription, ''), ' ')
+                FROM npcs WHERE adventureid = p_adventureid), '')), 'C')
+        || setweight(to_tsvector('simple', coalesce(
+               (SELECT string_agg(locationname || ' ' || coalesce(locationdescription, ''), ' ')
+                FROM locations WHERE adventureid = p_adventureid), '')), 'C')
+$$;
+
+CREATE OR REPLACE FUNCTION refresh_adventure_search_vector(p_adventureid integer)
+RETURNS void
+LANGUAGE sql AS $$
+    UPDATE adventures
+    SET search_vector = adventure_search_document(adventureid, adventurename, story, userid)
+    WHERE adventureid = p_adventureid
+$$;
+
+CREATE OR REPLACE FUNCTION adventures_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.search_vector := adventure_search_document(
+        NEW.adventureid, NEW.adventurename, NEW.story, NEW.userid
+    );
+    RETURN NEW;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION adventure_children_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_adventure_search_vector(OLD.adventureid);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM refresh_adventure_search_vector(NEW.adventureid);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION users_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE adventures
+    SET search_vector = adventure_search_document(adventureid, adventurename, story, userid)
+    WHERE userid = NEW.userid;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS adventures_search_vector ON adventures;
+CREATE TRIGGER adventures_search_vector
+    BEFORE INSERT OR UPDATE OF adventurename, story, userid ON adventures
+    FOR EACH ROW EXECUTE FUNCTION adventures_search_vector_trigger();
+
+DROP TRIGGER IF EXISTS npcs_search_vector ON npcs;
+CREATE TRIGGER npcs_search_vector
+    AFTER INSERT OR UPDATE OR DELETE ON npcs
+    FOR EACH ROW EXECUTE FUNCTION adventure_children_search_vector_trigger();
+
+DROP TRIGGER IF EXISTS locations_search_vector ON locations;
+CREATE TRIGGER locations_search_vector
+    AFTER INSERT OR UPDATE OR DELETE ON locations
+    FOR EACH ROW EXECUTE FUNCTION adventure_children_search_vector_trigger();
+
+DROP TRIGGER IF EXISTS users_search_vector ON users;
+CREATE TRIGGER users_search_vector
+    AFTER UPDATE OF userlogin ON users
+    FOR EACH ROW EXECUTE FUNCTION users_search_vector_trigger();
+
+UPDATE adventures
+SET search_vector = adventure_search_document(adventureid, adventurename, story, userid)
+WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS adventures_search_vector_idx
+    ON adventures USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS adventures_adventurename_trgm_idx
+    ON adventures USING gin (adventurename gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS users_userlogin_trgm_idx
+    ON users USING gin (userlogin gin_trgm_ops);
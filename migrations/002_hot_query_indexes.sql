@@ -0,0 +1,17 @@
+-- Индексы под запросы db_service.
+--
+-- Дочерние таблицы читаются и удаляются по adventureid/campaignid,
+-- участие проверяется по паре (userid, campaignid), пользователь
+-- ищется по логину. Уникальные индексы на users.userlogin и
+-- users_campaigns(userid, campaignid) не дают завести дубликаты;
+-- если они уже есть в данных, миграция упадёт и их нужно убрать вручную.
+
+CREATE INDEX IF NOT EXISTS adventures_userid_idx ON adventures (userid);
+CREATE INDEX IF NOT EXISTS npcs_adventureid_idx ON npcs (adventureid);
+CREATE INDEX IF NOT EXISTS locations_adventureid_idx ON locations (adventureid);
+CREATE INDEX IF NOT EXISTS campaigns_adventureid_idx ON campaigns (adventureid);
+CREATE UNIQUE INDEX IF NOT EXISTS users_campaigns_userid_campaignid_key
+    ON users_campaigns (userid, campaignid);
+CREATE INDEX IF NOT EXISTS users_campaigns_campaignid_idx ON users_campaigns (campaignid);
+CREATE INDEX IF NOT EXISTS player_characters_campaignid_idx ON player_characters (campaignid);
+CREATE UNIQUE INDEX IF NOT EXISTS users_userlogin_key ON users (userlogin);
@@ -0,0 +1,128 @@
+-- Версии сущностей для условных HTTP-запросов (ETag / Last-Modified).
+--
+-- adventures.revision и campaigns.revision увеличиваются при любом
+-- изменении строки, а также при изменении зависимых строк: NPC и локаций
+-- для приключения, участников и персонажей для кампании. Версия каталога
+-- приключений хранится в entity_versions и увеличивается раз на оператор,
+-- изменивший adventures.
+
+ALTER TABLE adventures ADD COLUMN IF NOT EXISTS revision bigint NOT NULL DEFAULT 1;
+ALTER TABLE adventures ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS revision bigint NOT NULL DEFAULT 1;
+ALTER TABLE campaigns ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+
+CREATE TABLE IF NOT EXISTS entity_versions (
+    name       text PRIMARY KEY,
+    revision   bigint NOT NULL DEFAULT 1,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+INSERT INTO entity_versions (name) VALUES ('adventures') ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_revision_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.revision := OLD.revision + 1;
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS adventures_bump_revision ON adventures;
+CREATE TRIGGER adventures_bump_revision
+    BEFORE UPDATE ON adventures
+    FOR EACH ROW EXECUTE FUNCTION bump_revision_trigger();
+
+DROP TRIGGER IF EXISTS campaigns_bump_revision ON campaigns;
+CREATE TRIGGER campaigns_bump_revision
+    BEFORE UPDATE ON campaigns
+    FOR EACH ROW EXECUTE FUNCTION bump_revision_trigger();
+
+-- Дочерние строки: одно обновление родителя на оператор, а не на строку
+
+CREATE OR REPLACE FUNCTION touch_adventures_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE adventures SET updated_at = clock_timestamp()
+    WHERE adventureid IN (SELECT adventureid FROM changed_rows);
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION touch_campaigns_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE campaigns SET updated_at = clock_timestamp()
+    WHERE campaignid IN (SELECT campaignid FROM changed_rows);
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS npcs_touch_insert ON npcs;
+CREATE TRIGGER npcs_touch_insert
+    AFTER INSERT ON npcs REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_adventures_trigger();
+DROP TRIGGER IF EXISTS npcs_touch_update ON npcs;
+CREATE TRIGGER npcs_touch_update
+    AFTER UPDATE ON npcs REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_adventures_trigger();
+DROP TRIGGER IF EXISTS npcs_touch_delete ON npcs;
+CREATE TRIGGER npcs_touch_delete
+    AFTER DELETE ON npcs REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_adventures_trigger();
+
+DROP TRIGGER IF EXISTS locations_touch_insert ON locations;
+CREATE TRIGGER locations_touch_insert
+    AFTER INSERT ON locations REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_adventures_trigger();
+DROP TRIGGER IF EXISTS locations_touch_update ON locations;
+CREATE TRIGGER locations_touch_update
+    AFTER UPDATE ON locations REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_adventures_trigger();
+DROP TRIGGER IF EXISTS locations_touch_delete ON locations;
+CREATE TRIGGER locations_touch_delete
+    AFTER DELETE ON locations REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_adventures_trigger();
+
+DROP TRIGGER IF EXISTS users_campaigns_touch_insert ON users_campaigns;
+CREATE TRIGGER users_campaigns_touch_insert
+    AFTER INSERT ON users_campaigns REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_campaigns_trigger();
+DROP TRIGGER IF EXISTS users_campaigns_touch_update ON users_campaigns;
+CREATE TRIGGER users_campaigns_touch_update
+    AFTER UPDATE ON users_campaigns REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_campaigns_trigger();
+DROP TRIGGER IF EXISTS users_campaigns_touch_delete ON users_campaigns;
+CREATE TRIGGER users_campaigns_touch_delete
+    AFTER DELETE ON users_campaigns REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_campaigns_trigger();
+
+DROP TRIGGER IF EXISTS player_characters_touch_insert ON player_characters;
+CREATE TRIGGER player_characters_touch_insert
+    AFTER INSERT ON player_characters REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_campaigns_trigger();
+DROP TRIGGER IF EXISTS player_characters_touch_update ON player_characters;
+CREATE TRIGGER player_characters_touch_update
+    AFTER UPDATE ON player_characters REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_campaigns_trigger();
+DROP TRIGGER IF EXISTS player_characters_touch_delete ON player_characters;
+CREATE TRIGGER player_characters_touch_delete
+    AFTER DELETE ON player_characters REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION touch_campaigns_trigger();
+
+-- Версия каталога: строки каталога зависят от названия, автора и поискового
+-- документа приключения, поэтому учитывается любое изменение adventures
+
+CREATE OR REPLACE FUNCTION bump_catalogue_version_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE entity_versions
+    SET revision = revision + 1, updated_at = clock_timestamp()
+    WHERE name = 'adventures';
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS adventures_catalogue_version ON adventures;
+CREATE TRIGGER adventures_catalogue_version
+    AFTER INSERT OR UPDATE OR DELETE ON adventures
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalogue_version_trigger();
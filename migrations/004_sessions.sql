@@ -0,0 +1,16 @@
+-- Серверные сессии (SESSION_BACKEND = 'postgres').
+--
+-- В cookie хранится только непрозрачный id сессии, данные — здесь,
+-- сериализованные pickle. Просроченные строки не читаются и удаляются
+-- командой flask sessions-purge; userid нужен для отзыва всех сессий
+-- пользователя.
+
+CREATE TABLE IF NOT EXISTS sessions (
+    sessionid  text PRIMARY KEY,
+    userid     integer REFERENCES users (userid) ON DELETE CASCADE,
+    data       bytea NOT NULL,
+    expires_at timestamptz NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS sessions_userid_idx ON sessions (userid);
+CREATE INDEX IF NOT EXISTS sessions_expires_at_idx ON sessions (expires_at);
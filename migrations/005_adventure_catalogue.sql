@@ -0,0 +1,141 @@
+-- Сводная таблица каталога приключений.
+--
+-- adventure_catalogue хранит по строке на приключение всё, что нужно
+-- выдаче каталога: название, логин автора, число NPC, локаций и кампаний
+-- и время последнего изменения. Таблица поддерживается триггерами
+-- уровня оператора: счётчики меняются на величину изменения, без
+-- пересчёта, поэтому стоимость не зависит от размера приключения.
+-- Индексы по (campaign_count, adventureid) и (updated_at, adventureid)
+-- дают сортировки «популярные» и «недавно изменённые» с keyset-пагинацией.
+
+CREATE TABLE IF NOT EXISTS adventure_catalogue (
+    adventureid    integer PRIMARY KEY REFERENCES adventures (adventureid) ON DELETE CASCADE,
+    adventurename  text NOT NULL,
+    author         text NOT NULL,
+    npc_count      integer NOT NULL DEFAULT 0,
+    location_count integer NOT NULL DEFAULT 0,
+    campaign_count integer NOT NULL DEFAULT 0,
+    updated_at     timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE OR REPLACE FUNCTION adventure_catalogue_insert_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO adventure_catalogue (adventureid, adventurename, author, updated_at)
+    SELECT n.adventureid, n.adventurename, u.userlogin, n.updated_at
+    FROM changed_rows n
+    JOIN users u ON u.userid = n.userid;
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION adventure_catalogue_update_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE adventure_catalogue c
+    SET adventurename = n.adventurename, author = u.userlogin, updated_at = n.updated_at
+    FROM changed_rows n
+    JOIN users u ON u.userid = n.userid
+    WHERE c.adventureid = n.adventureid
+      AND (c.adventurename, c.author, c.updated_at) IS DISTINCT FROM (n.adventurename, u.userlogin, n.updated_at);
+    RETURN NULL;
+END
+$$;
+
+-- Счётчик TG_ARGV[0] меняется на число затронутых строк со знаком TG_ARGV[1]
+CREATE OR REPLACE FUNCTION adventure_catalogue_count_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format(
+        'UPDATE adventure_catalogue c SET %1$I = c.%1$I + d.delta
+         FROM (SELECT adventureid, count(*) * %2$s AS delta FROM changed_rows GROUP BY adventureid) d
+         WHERE c.adventureid = d.adventureid',
+        TG_ARGV[0], TG_ARGV[1]::integer
+    );
+    RETURN NULL;
+END
+$$;
+
+CREATE OR REPLACE FUNCTION adventure_catalogue_author_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE adventure_catalogue c
+    SET author = NEW.userlogin
+    FROM adventures a
+    WHERE a.userid = NEW.userid AND c.adventureid = a.adventureid;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS adventures_catalogue_insert ON adventures;
+CREATE TRIGGER adventures_catalogue_insert
+    AFTER INSERT ON adventures REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_catalogue_insert_trigger();
+DROP TRIGGER IF EXISTS adventures_catalogue_update ON adventures;
+CREATE TRIGGER adventures_catalogue_update
+    AFTER UPDATE ON adventures REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_catalogue_update_trigger();
+
+-- Строки каталога удаляются вместе с приключением (ON DELETE CASCADE);
+-- NPC, локации и кампании не переносятся между приключениями
+DROP TRIGGER IF EXISTS npcs_catalogue_insert ON npcs;
+CREATE TRIGGER npcs_catalogue_insert
+    AFTER INSERT ON npcs REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_catalogue_count_trigger('npc_count', '1');
+DROP TRIGGER IF EXISTS npcs_catalogue_delete ON npcs;
+CREATE TRIGGER npcs_catalogue_delete
+    AFTER DELETE ON npcs REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_catalogue_count_trigger('npc_count', '-1');
+
+DROP TRIGGER IF EXISTS locations_catalogue_insert ON locations;
+CREATE TRIGGER locations_catalogue_insert
+    AFTER INSERT ON locations REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_catalogue_count_trigger('location_count', '1');
+DROP TRIGGER IF EXISTS locations_catalogue_delete ON locations;
+CREATE TRIGGER locations_catalogue_delete
+    AFTER DELETE ON locations REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_catalogue_count_trigger('location_count', '-1');
+
+DROP TRIGGER IF EXISTS campaigns_catalogue_insert ON campaigns;
+CREATE TRIGGER campaigns_catalogue_insert
+    AFTER INSERT ON campaigns REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_catalogue_count_trigger('campaign_count', '1');
+DROP TRIGGER IF EXISTS campaigns_catalogue_delete ON campaigns;
+CREATE TRIGGER campaigns_catalogue_delete
+    AFTER DELETE ON campaigns REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_catalogue_count_trigger('campaign_count', '-1');
+
+DROP TRIGGER IF EXISTS users_catalogue_author ON users;
+CREATE TRIGGER users_catalogue_author
+    AFTER UPDATE OF userlogin ON users
+    FOR EACH ROW EXECUTE FUNCTION adventure_catalogue_author_trigger();
+
+-- Число кампаний показывается в каталоге: его версия меняется и при
+-- создании или удалении кампании
+DROP TRIGGER IF EXISTS campaigns_catalogue_version ON campaigns;
+CREATE TRIGGER campaigns_catalogue_version
+    AFTER INSERT OR DELETE ON campaigns
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalogue_version_trigger();
+
+INSERT INTO adventure_catalogue (
+    adventureid, adventurename, author, npc_count, location_count, campaign_count, updated_at
+)
+SELECT a.adventureid,
+       a.adventurename,
+       u.userlogin,
+       (SELECT count(*) FROM npcs n WHERE n.adventureid = a.adventureid),
+       (SELECT count(*) FROM locations l WHERE l.adventureid = a.adventureid),
+       (SELECT count(*) FROM campaigns c WHERE c.adventureid = a.adventureid),
+       a.updated_at
+FROM adventures a
+JOIN users u ON u.userid = a.userid
+ON CONFLICT (adventureid) DO NOTHING;
+
+CREATE INDEX IF NOT EXISTS adventure_catalogue_popular_idx
+    ON adventure_catalogue (campaign_count DESC, adventureid DESC);
+CREATE INDEX IF NOT EXISTS adventure_catalogue_recent_idx
+    ON adventure_catalogue (updated_at DESC, adventureid DESC);
+CREATE INDEX IF NOT EXISTS adventure_catalogue_adventurename_trgm_idx
+    ON adventure_catalogue USING gin (adventurename gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS adventure_catalogue_author_trgm_idx
+    ON adventure_catalogue USING gin (author gin_trgm_ops);
@@ -0,0 +1,35 @@
+-- Очередь фоновых задач (app/services/jobs.py).
+--
+-- Тяжёлые операции — каскадное удаление, пакетный импорт, пересчёт
+-- сводок — HTTP-запрос только ставит в очередь, выполняет их воркер
+-- flask jobs-worker. Задача проходит статусы queued → running → done
+-- или failed; при ошибке возвращается в queued с отложенным run_after.
+-- locked_by/locked_at — воркер, выполняющий задачу, и его последний
+-- сигнал жизни: зависшие задачи возвращаются в очередь.
+
+CREATE TABLE IF NOT EXISTS jobs (
+    jobid        bigserial PRIMARY KEY,
+    kind         text NOT NULL,
+    payload      jsonb NOT NULL DEFAULT '{}',
+    status       text NOT NULL DEFAULT 'queued'
+                 CHECK (status IN ('queued', 'running', 'done', 'failed')),
+    userid       integer REFERENCES users (userid) ON DELETE SET NULL,
+    attempts     integer NOT NULL DEFAULT 0,
+    max_attempts integer NOT NULL DEFAULT 5,
+    run_after    timestamptz NOT NULL DEFAULT now(),
+    locked_by    text,
+    locked_at    timestamptz,
+    last_error   text,
+    result       jsonb,
+    created_at   timestamptz NOT NULL DEFAULT now(),
+    finished_at  timestamptz
+);
+
+-- Выбор следующей задачи и подсчёт выполняющихся читают только
+-- небольшие частичные индексы, сколько бы завершённых задач ни накопилось
+CREATE INDEX IF NOT EXISTS jobs_queued_idx
+    ON jobs (run_after, jobid) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS jobs_running_idx
+    ON jobs (locked_at) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS jobs_finished_idx
+    ON jobs (finished_at) WHERE status IN ('done', 'failed');
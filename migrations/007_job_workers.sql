@@ -0,0 +1,11 @@
+-- Живые воркеры очереди (app/services/jobs.py).
+--
+-- Воркер продлевает свою строку вместе с locked_at своих задач. Если
+-- для вида задачи живых воркеров нет, веб-процесс выполняет её сам,
+-- а не оставляет в очереди до появления воркера.
+
+CREATE TABLE IF NOT EXISTS job_workers (
+    workerid     text PRIMARY KEY,
+    kinds        text[] NOT NULL,
+    heartbeat_at timestamptz NOT NULL DEFAULT now()
+);
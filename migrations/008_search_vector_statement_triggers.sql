@@ -0,0 +1,55 @@
+-- Поисковый документ приключения при изменении NPC и локаций
+-- пересчитывается раз на оператор, а не на каждую строку.
+--
+-- Построчный триггер из 001 пересобирал документ (и обновлял строку
+-- adventures) для каждой вставленной NPC: импорт приключения с сотней
+-- NPC делал сотню одинаковых пересчётов. Как touch_adventures_trigger
+-- из 003, триггеры читают таблицы переходов и обновляют каждое
+-- затронутое приключение один раз.
+
+CREATE OR REPLACE FUNCTION adventure_children_search_vector_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' THEN
+        -- Строка могла перейти к другому приключению: пересчитываются оба
+        UPDATE adventures
+        SET search_vector = adventure_search_document(adventureid, adventurename, story, userid)
+        WHERE adventureid IN (SELECT adventureid FROM changed_rows
+                              UNION
+                              SELECT adventureid FROM old_rows);
+    ELSE
+        UPDATE adventures
+        SET search_vector = adventure_search_document(adventureid, adventurename, story, userid)
+        WHERE adventureid IN (SELECT adventureid FROM changed_rows);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS npcs_search_vector ON npcs;
+DROP TRIGGER IF EXISTS npcs_search_vector_insert ON npcs;
+CREATE TRIGGER npcs_search_vector_insert
+    AFTER INSERT ON npcs REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_children_search_vector_trigger();
+DROP TRIGGER IF EXISTS npcs_search_vector_update ON npcs;
+CREATE TRIGGER npcs_search_vector_update
+    AFTER UPDATE ON npcs REFERENCING OLD TABLE AS old_rows NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_children_search_vector_trigger();
+DROP TRIGGER IF EXISTS npcs_search_vector_delete ON npcs;
+CREATE TRIGGER npcs_search_vector_delete
+    AFTER DELETE ON npcs REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_children_search_vector_trigger();
+
+DROP TRIGGER IF EXISTS locations_search_vector ON locations;
+DROP TRIGGER IF EXISTS locations_search_vector_insert ON locations;
+CREATE TRIGGER locations_search_vector_insert
+    AFTER INSERT ON locations REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_children_search_vector_trigger();
+DROP TRIGGER IF EXISTS locations_search_vector_update ON locations;
+CREATE TRIGGER locations_search_vector_update
+    AFTER UPDATE ON locations REFERENCING OLD TABLE AS old_rows NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_children_search_vector_trigger();
+DROP TRIGGER IF EXISTS locations_search_vector_delete ON locations;
+CREATE TRIGGER locations_search_vector_delete
+    AFTER DELETE ON locations REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventure_children_search_vector_trigger();
@@ -0,0 +1,31 @@
+-- Версия каталога без общего счётчика.
+--
+-- Триггеры из 003 и 005 увеличивали единственную строку entity_versions
+-- ('adventures') при каждом изменении приключений и кампаний: все пишущие
+-- транзакции выстраивались в очередь за её блокировкой до фиксации.
+-- Теперь каждая строка adventure_catalogue хранит свою ревизию и время
+-- изменения, а версия каталога выводится из самой таблицы: число строк,
+-- сумма ревизий (растёт при любом изменении строки, независимо от порядка
+-- фиксации транзакций) и последнее время изменения для Last-Modified.
+
+ALTER TABLE adventure_catalogue ADD COLUMN IF NOT EXISTS revision bigint NOT NULL DEFAULT 1;
+ALTER TABLE adventure_catalogue ADD COLUMN IF NOT EXISTS changed_at timestamptz NOT NULL DEFAULT clock_timestamp();
+
+CREATE OR REPLACE FUNCTION bump_catalogue_row_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.revision := OLD.revision + 1;
+    NEW.changed_at := clock_timestamp();
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS adventure_catalogue_bump_revision ON adventure_catalogue;
+CREATE TRIGGER adventure_catalogue_bump_revision
+    BEFORE UPDATE ON adventure_catalogue
+    FOR EACH ROW EXECUTE FUNCTION bump_catalogue_row_trigger();
+
+DROP TRIGGER IF EXISTS adventures_catalogue_version ON adventures;
+DROP TRIGGER IF EXISTS campaigns_catalogue_version ON campaigns;
+DROP FUNCTION IF EXISTS bump_catalogue_version_trigger();
+DROP TABLE IF EXISTS entity_versions;
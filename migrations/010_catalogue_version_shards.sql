@@ -0,0 +1,59 @@
+-- Версия каталога из нескольких строк-счётчиков.
+--
+-- Версия из 009 считалась агрегатом по всей adventure_catalogue
+-- (count, sum(revision), max(changed_at)): каждая проверка ETag
+-- каталога читала таблицу целиком. Теперь оператор, изменивший строки
+-- каталога, увеличивает один из 16 счётчиков catalogue_version —
+-- выбранный по pid обслуживающего процесса, поэтому параллельные
+-- транзакции обычно не ждут блокировок друг друга, а одна транзакция
+-- блокирует только одну строку. Версия — сумма счётчиков: она растёт при
+-- каждой фиксации в любом порядке, а читается по 16 строкам, сколько бы
+-- приключений ни было.
+
+CREATE TABLE IF NOT EXISTS catalogue_version (
+    shard      smallint PRIMARY KEY,
+    revision   bigint NOT NULL DEFAULT 0,
+    changed_at timestamptz NOT NULL DEFAULT now()
+);
+
+INSERT INTO catalogue_version (shard)
+SELECT shard FROM generate_series(0, 15) AS shard
+ON CONFLICT (shard) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_catalogue_version_trigger() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- Оператор мог не затронуть ни одной строки (например, upsert
+    -- пересчёта сводки без расхождений): версия не меняется
+    IF EXISTS (SELECT 1 FROM changed_rows) THEN
+        UPDATE catalogue_version
+        SET revision = revision + 1, changed_at = clock_timestamp()
+        WHERE shard = pg_backend_pid() % 16;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS adventure_catalogue_version_insert ON adventure_catalogue;
+CREATE TRIGGER adventure_catalogue_version_insert
+    AFTER INSERT ON adventure_catalogue
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalogue_version_trigger();
+
+DROP TRIGGER IF EXISTS adventure_catalogue_version_update ON adventure_catalogue;
+CREATE TRIGGER adventure_catalogue_version_update
+    AFTER UPDATE ON adventure_catalogue
+    REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalogue_version_trigger();
+
+DROP TRIGGER IF EXISTS adventure_catalogue_version_delete ON adventure_catalogue;
+CREATE TRIGGER adventure_catalogue_version_delete
+    AFTER DELETE ON adventure_catalogue
+    REFERENCING OLD TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_catalogue_version_trigger();
+
+-- Построчные ревизии из 009 больше не нужны
+DROP TRIGGER IF EXISTS adventure_catalogue_bump_revision ON adventure_catalogue;
+DROP FUNCTION IF EXISTS bump_catalogue_row_trigger();
+ALTER TABLE adventure_catalogue DROP COLUMN IF EXISTS revision;
+ALTER TABLE adventure_catalogue DROP COLUMN IF EXISTS changed_at;
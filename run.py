@@ -1,7 +1,10 @@
+import os
+
 from app import create_app
 
 
 app = create_app()
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    # Сервер разработки. Для продакшна: gunicorn -c gunicorn.conf.py wsgi:app
+    app.run(debug=os.environ.get("FLASK_DEBUG", "1") == "1")
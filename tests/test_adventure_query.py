@@ -0,0 +1,25 @@
+from app.services.adventure_search import AdventureQuery
+
+
+def test_filters_are_combined():
+    sql, params = AdventureQuery().name_contains('crypt').author_contains('alice').build()
+    assert 'c.adventurename ILIKE %s AND c.author ILIKE %s' in sql
+    assert params == ('%crypt%', '%alice%')
+
+
+def test_text_search_ranks_results():
+    sql, params = AdventureQuery().matching('  dragon tavern ').limit(10).build()
+    assert 'JOIN adventures a' in sql
+    assert sql.index('ORDER BY rank DESC') > sql.index('WHERE')
+    assert params == ('dragon tavern', 'dragon tavern', 10)
+
+
+def test_explicit_order_disables_ranking():
+    query = AdventureQuery().matching('dragon').sorted_by('popular')
+    assert not query.ranked
+    assert 'ORDER BY c.campaign_count DESC' in query.build()[0]
+
+
+def test_like_patterns_are_escaped():
+    _, params = AdventureQuery().name_contains('50%_off').build()
+    assert params == ('%50\\%\\_off%',)
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+
+from app.services.adventure_search import AdventureQuery, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    values = [0.25, 17]
+    assert decode_cursor(encode_cursor(values)) == values
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(['2024-01-01T00:00:00+00:00', 123456789])
+    assert '=' not in cursor and '+' not in cursor and '/' not in cursor
+
+
+def test_malformed_cursor_decodes_to_none():
+    assert decode_cursor(None) is None
+    assert decode_cursor('') is None
+    assert decode_cursor('not base64 at all!') is None
+    assert decode_cursor(encode_cursor([1])[:-1] + '%') is None
+    # Корректный JSON, но не список
+    assert decode_cursor('eyJhIjoxfQ') is None
+
+
+def test_default_order_accepts_only_an_integer_id():
+    assert AdventureQuery().after(encode_cursor([5]))._cursor_key() == (5,)
+    assert AdventureQuery().after(encode_cursor(['5']))._cursor_key() is None
+    assert AdventureQuery().after(encode_cursor([True]))._cursor_key() is None
+    assert AdventureQuery().after(encode_cursor([1, 2]))._cursor_key() is None
+
+
+def test_popular_order_needs_two_integers():
+    query = AdventureQuery().sorted_by('popular')
+    assert query.after(encode_cursor([3, 10]))._cursor_key() == (3, 10)
+    assert query.after(encode_cursor([3.5, 10]))._cursor_key() is None
+
+
+def test_recent_order_parses_timestamp():
+    query = AdventureQuery().sorted_by('recent')
+    moment = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+    assert query.after(encode_cursor([moment.isoformat(), 7]))._cursor_key() == (moment, 7)
+    assert query.after(encode_cursor(['yesterday', 7]))._cursor_key() is None
+
+
+def test_ranked_order_needs_rank_and_id():
+    query = AdventureQuery().matching('dragon')
+    assert query.after(encode_cursor([1, 7]))._cursor_key() == (1.0, 7)
+    assert query.after(encode_cursor(['high', 7]))._cursor_key() is None
+
+
+def test_cursor_from_another_order_opens_first_page():
+    sql, params = AdventureQuery().sorted_by('recent').after(encode_cursor([3, 10])).limit(20).build()
+    assert '<' not in sql
+    assert params == (20,)
+
+
+def test_cursor_for_matches_cursor_key():
+    moment = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    row = (42, 'name', 'author', 1, 2, 3, moment)
+    for order, expected in (('id', (42,)), ('popular', (3, 42)), ('recent', (moment, 42))):
+        query = AdventureQuery().sorted_by(order)
+        assert query.after(query.cursor_for(row))._cursor_key() == expected
+
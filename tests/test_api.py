@@ -0,0 +1,59 @@
+import pytest
+from flask import Flask
+
+from app.routes.api import ApiError, select_fields, validate_operations
+
+ITEM = {'id': 1, 'name': 'Crypt', 'story': 'Dark'}
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['API_BATCH_MAX_OPERATIONS'] = 100
+    return app
+
+
+def test_select_fields_without_parameter_returns_item(app):
+    with app.test_request_context('/'):
+        assert select_fields(ITEM, tuple(ITEM)) is ITEM
+
+
+def test_select_fields_keeps_requested_fields_in_order(app):
+    with app.test_request_context('/?fields=story, id,'):
+        assert list(select_fields(ITEM, tuple(ITEM)).items()) == [('story', 'Dark'), ('id', 1)]
+
+
+def test_select_fields_rejects_unknown_fields(app):
+    with app.test_request_context('/?fields=id,secret'):
+        with pytest.raises(ApiError) as error:
+            select_fields(ITEM, ('id', 'name'))
+    assert error.value.status == 400
+    assert str(error.value) == 'Unknown fields: secret'
+    assert error.value.details == {'allowed': ['id', 'name']}
+
+
+@pytest.mark.parametrize('operation, message', [
+    ({'op': {'name': 'create_npc'}, 'adventure_id': 1, 'name': 'Lich'}, 'Unknown operation'),
+    ({'op': ['create_npc'], 'adventure_id': 1, 'name': 'Lich'}, 'Unknown operation'),
+    ({'op': 'create_npc', 'adventure_id': 1, 'name': {'first': 'Lich'}}, "'name' must be a string"),
+    ({'op': 'create_npc', 'adventure_id': 1, 'name': 'Lich', 'description': 7}, "'description' must be a string"),
+    ({'op': 'delete_npc', 'adventure_id': True, 'id': 3}, "'adventure_id' must be an integer"),
+    ({'op': 'delete_npc', 'adventure_id': 1, 'id': [3]}, "'id' must be an integer"),
+])
+def test_validate_operations_rejects_bad_types_with_index(app, operation, message):
+    operations = [{'op': 'delete_npc', 'adventure_id': 1, 'id': 2}, operation]
+    with app.test_request_context('/'):
+        with pytest.raises(ApiError) as error:
+            validate_operations(operations)
+    assert error.value.status == 400
+    assert str(error.value) == message
+    assert error.value.details['index'] == 1
+
+
+def test_validate_operations_accepts_numeric_strings(app):
+    with app.test_request_context('/'):
+        validate_operations([
+            {'op': 'delete_location', 'adventure_id': 1, 'id': '4'},
+            {'op': 'create_character', 'campaign_id': 2, 'name': 'Ada', 'class': 'wizard',
+             'level': '3', 'armor': 12, 'hp': '9', 'skills': None},
+        ])
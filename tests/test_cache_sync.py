@@ -0,0 +1,84 @@
+import json
+
+import psycopg2
+import pytest
+from flask import Flask, g
+
+from app.services import cache_sync
+from app.services.cache import MemoryCache
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if self.connection.fail:
+            raise psycopg2.OperationalError('server closed the connection')
+        self.connection.executed.append(params)
+
+
+class FakeConnection:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.executed = []
+        self.commits = self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.returned = []
+
+    def getconn(self):
+        return self.connection
+
+    def putconn(self, connection):
+        self.returned.append(connection)
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config['CACHE_SYNC'] = True
+    app.extensions['cache'] = MemoryCache()
+    monkeypatch.setattr(cache_sync, 'run', lambda cursor, query, params: cursor.execute(query, params))
+    return app
+
+
+def test_publish_leaves_request_transaction_alone(app, monkeypatch):
+    pool = FakePool(FakeConnection())
+    monkeypatch.setattr(cache_sync, 'get_pool', lambda: pool)
+    request_connection = FakeConnection()
+    with app.test_request_context('/'):
+        g.db_connection = request_connection
+        cache_sync.publish(('adventure:1', 'adventures'))
+    assert request_connection.commits == request_connection.rollbacks == 0
+    assert pool.connection.commits == 1
+    assert pool.returned == [pool.connection]
+    (payload,), = pool.connection.executed
+    assert json.loads(payload)['namespaces'] == ['adventure:1', 'adventures']
+
+
+def test_publish_error_returns_connection_to_pool(app, monkeypatch):
+    pool = FakePool(FakeConnection(fail=True))
+    monkeypatch.setattr(cache_sync, 'get_pool', lambda: pool)
+    with app.test_request_context('/'):
+        cache_sync.publish(('adventure:1',))
+    assert pool.connection.commits == 0
+    assert pool.returned == [pool.connection]
@@ -0,0 +1,146 @@
+import threading
+
+import psycopg2
+import pytest
+
+from app.services import db_pool
+from app.services.db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql):
+        if self.connection.broken:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.broken:
+            raise psycopg2.InterfaceError("connection already closed")
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """
+    Соединения, открытые пулом, в порядке открытия.
+    """
+    opened = []
+
+    def connect(**kwargs):
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', connect)
+    return opened
+
+
+def test_checkout_and_return_reuse_the_connection(connections):
+    pool = ConnectionPool({}, min_size=1, max_size=2, max_overflow=0)
+    connection = pool.getconn()
+    assert connection is connections[0]
+    assert pool.stats()['in_use'] == 1
+
+    pool.putconn(connection)
+    assert connection.rollbacks >= 1
+    assert pool.getconn() is connection
+    stats = pool.stats()
+    assert (stats['connects'], stats['checkouts'], stats['checkins']) == (1, 2, 1)
+
+
+def test_exhausted_pool_times_out(connections):
+    pool = ConnectionPool({}, min_size=0, max_size=1, max_overflow=0, timeout=0.05)
+    pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_waiting_checkout_gets_returned_connection(connections):
+    pool = ConnectionPool({}, min_size=0, max_size=1, max_overflow=0, timeout=5)
+    connection = pool.getconn()
+    timer = threading.Timer(0.05, pool.putconn, (connection,))
+    timer.start()
+    assert pool.getconn() is connection
+    timer.join()
+    assert pool.stats()['wait_time_max'] > 0
+
+
+def test_overflow_connections_are_closed_on_return(connections):
+    pool = ConnectionPool({}, min_size=0, max_size=1, max_overflow=1, timeout=0.05)
+    regular = pool.getconn()
+    overflow = pool.getconn()
+    assert pool.stats()['overflow'] == 1
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+    pool.putconn(overflow)
+    pool.putconn(regular)
+    assert overflow.closed and not regular.closed
+    stats = pool.stats()
+    assert (stats['size'], stats['idle'], stats['overflow_checkouts']) == (1, 1, 1)
+
+
+def test_broken_idle_connection_is_replaced(connections):
+    pool = ConnectionPool({}, min_size=1, max_size=1, max_overflow=0)
+    connections[0].broken = True
+    connection = pool.getconn()
+    assert connection is connections[1]
+    assert connections[0].closed
+    assert pool.stats()['failed_pings'] == 1
+
+
+def test_broken_connection_is_dropped_on_return(connections):
+    pool = ConnectionPool({}, min_size=0, max_size=1, max_overflow=0)
+    connection = pool.getconn()
+    connection.broken = True
+    pool.putconn(connection)
+    assert pool.stats()['size'] == 0
+    assert pool.getconn() is connections[1]
+
+
+def test_expired_connection_is_recycled(connections):
+    pool = ConnectionPool({}, min_size=1, max_size=1, max_overflow=0, max_lifetime=0.01)
+    pool._created_at[id(connections[0])] -= 1
+    assert pool.getconn() is connections[1]
+    assert pool.stats()['recycled'] == 1
+
+
+def test_failed_connect_frees_the_slot(connections, monkeypatch):
+    pool = ConnectionPool({}, min_size=0, max_size=1, max_overflow=0, timeout=0.05)
+
+    def refuse(**kwargs):
+        raise psycopg2.OperationalError("could not connect to server")
+
+    monkeypatch.setattr(db_pool.psycopg2, 'connect', refuse)
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn()
+    assert pool.stats()['size'] == 0
+
+
+def test_closed_pool_refuses_checkouts(connections):
+    pool = ConnectionPool({}, min_size=1, max_size=1, max_overflow=0)
+    pool.closeall()
+    assert connections[0].closed
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from app.services.import_service import AdventureImportError, parse_csv, parse_file, parse_json, validate_records
+
+
+def test_parse_json():
+    text = json.dumps([{
+        'name': 'Crypt', 'story': 'Dark', 'author': 'alice',
+        'npcs': [{'name': 'Lich', 'description': 'Old'}],
+        'locations': [{'name': 'Hall'}],
+    }])
+    assert parse_json(text) == [{
+        'author': 'alice', 'name': 'Crypt', 'story': 'Dark',
+        'npcs': [('Lich', 'Old')], 'locations': [('Hall', None)],
+    }]
+
+
+def test_parse_json_without_items():
+    record, = parse_json('[{"name": "Crypt", "story": "Dark", "npcs": null}]')
+    assert record['npcs'] == [] and record['locations'] == [] and record['author'] is None
+
+
+@pytest.mark.parametrize('text, message', [
+    ('{', 'Invalid JSON'),
+    ('{"name": "Crypt"}', 'JSON array'),
+    ('[{"name": "Crypt"}, 1]', 'Adventure #1 is not an object'),
+    ('[{"name": ["Crypt"]}]', 'Adventure #0: name must be a string'),
+    ('[{"name": "Crypt", "npcs": {"name": "Lich"}}]', 'Adventure #0: npcs must be an array'),
+    ('[{"name": "Crypt", "npcs": ["Lich"]}]', 'Adventure #0: npcs[0] is not an object'),
+    ('[{"name": "Crypt", "locations": [{"name": "Hall"}, {"name": 5}]}]', 'Adventure #0: locations[1] name'),
+])
+def test_parse_json_rejects_malformed_input(text, message):
+    with pytest.raises(AdventureImportError, match=message.replace('[', r'\[').replace(']', r'\]')):
+        parse_json(text)
+
+
+def test_import_error_is_value_error():
+    assert issubclass(AdventureImportError, ValueError)
+
+
+def test_parse_csv_groups_items_by_adventure():
+    text = (
+        "type,adventure,author,story,name,description\n"
+        "adventure,Crypt,alice,Dark,,\n"
+        "npc,Crypt,alice,,Lich,Old\n"
+        "location,Crypt,alice,,Hall,Cold\n"
+        "adventure,Crypt,bob,Other,,\n"
+    )
+    alice, bob = parse_csv(text)
+    assert alice == {'author': 'alice', 'name': 'Crypt', 'story': 'Dark',
+                     'npcs': [('Lich', 'Old')], 'locations': [('Hall', 'Cold')]}
+    assert bob['author'] == 'bob' and bob['npcs'] == []
+
+
+@pytest.mark.parametrize('text, message', [
+    ("name,description\nLich,Old\n", "'type' and 'adventure'"),
+    ("type,adventure,name\nnpc,Crypt,Lich\n", "Line 2: npc refers to unknown adventure"),
+    ("type,adventure\nmonster,Crypt\n", "Line 2: unknown type 'monster'"),
+])
+def test_parse_csv_rejects_malformed_input(text, message):
+    with pytest.raises(AdventureImportError, match=message):
+        parse_csv(text)
+
+
+def test_parse_file_picks_format_by_extension():
+    assert parse_file('ADVENTURES.CSV', "type,adventure\nadventure,Crypt\n")[0]['name'] == 'Crypt'
+    assert parse_file('adventures.json', '[{"name": "Crypt"}]')[0]['name'] == 'Crypt'
+
+
+def test_validate_records_requires_name_and_story():
+    validate_records([{'name': 'Crypt', 'story': 'Dark'}])
+    with pytest.raises(AdventureImportError, match='Adventure #1'):
+        validate_records([{'name': 'Crypt', 'story': 'Dark'}, {'name': 'Empty', 'story': ''}])
@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+from flask import Flask
+
+from app.services import jobs
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    app.config.update(
+        JOBS_RUN_INLINE=False, JOBS_CONCURRENCY={}, JOBS_DEFAULT_CONCURRENCY=1, JOBS_STALE_AFTER=300,
+        JOBS_POLL_INTERVAL=0.01, JOBS_MAX_ATTEMPTS=5, JOBS_RETRY_BACKOFF=5.0, JOBS_RETRY_BACKOFF_MAX=600.0,
+        POSTGRES_HOST='db', POSTGRES_PORT=5432, POSTGRES_DB='dnd', POSTGRES_USER='u', POSTGRES_PASSWORD='p',
+    )
+    ran = []
+    monkeypatch.setattr(jobs, 'enqueue', lambda kind, payload, user_id=None: 42)
+    monkeypatch.setattr(jobs, 'worker_alive', lambda kind: False)
+    monkeypatch.setattr(jobs.JobWorker, 'run_job', lambda self, job_id: ran.append(job_id))
+    app.ran = ran
+    return app
+
+
+def test_submit_only_enqueues_without_live_workers(app):
+    with app.test_request_context('/'):
+        assert jobs.submit('delete_adventures', {'adventure_ids': [1]}) == 42
+    assert app.ran == []
+
+
+def test_submit_runs_inline_when_enabled(app):
+    app.config['JOBS_RUN_INLINE'] = True
+    with app.test_request_context('/'):
+        assert jobs.submit('delete_adventures', {'adventure_ids': [1]}) == 42
+    assert app.ran == [42]
+
+
+def test_listener_uses_dedicated_connection(app, monkeypatch):
+    worker = jobs.JobWorker(app, kinds=['delete_adventures'])
+    connected = threading.Event()
+
+    class FakeConnection:
+        closed = False
+
+        def cursor(self):
+            raise jobs.psycopg2.OperationalError('server closed the connection')
+
+        def close(self):
+            self.closed = True
+            worker._stopping.set()
+            connected.set()
+
+    connection = FakeConnection()
+    monkeypatch.setattr(jobs.psycopg2, 'connect', lambda **kwargs: connection)
+
+    listener = threading.Thread(target=worker._listen)
+    listener.start()
+    assert connected.wait(5)
+    listener.join(5)
+    assert connection.closed
@@ -0,0 +1,23 @@
+import os
+import re
+
+from flask import Flask
+
+from app.services.metrics import render_metrics, request_metrics
+
+
+def test_every_series_carries_process_labels():
+    app = Flask(__name__)
+    request_metrics.reset()
+    request_metrics.record('main.adventures', 'GET', 200, 0.02, 0.01, 3, 0.005, 512, False)
+    with app.app_context():
+        text = render_metrics({'size': 2}, {'hits': 5}, {})
+
+    samples = [line for line in text.splitlines() if line and not line.startswith('#')]
+    assert samples
+    process = f'host="[^"]*",pid="{os.getpid()}"'
+    for line in samples:
+        assert re.match(rf'^\w+\{{{process}(,|\}})', line), line
+    assert 'dnd_http_requests_total{' in text
+    assert re.search(rf'dnd_db_pool_size\{{{process}\}} 2', text)
+    request_metrics.reset()
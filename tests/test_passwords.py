@@ -0,0 +1,53 @@
+import pytest
+
+from app.services.passwords import PasswordHasher, PasswordHasherBusy
+
+
+@pytest.fixture
+def hasher():
+    # Минимальная стоимость: тесты проверяют формат и логику, а не стойкость
+    return PasswordHasher(n=2 ** 4, r=1, p=1, workers=1)
+
+
+def test_hash_round_trip(hasher):
+    stored = hasher.hash('secret')
+    assert stored.startswith('scrypt$16$1$1$')
+    assert hasher.verify('secret', stored) == (True, False)
+    assert hasher.verify('wrong', stored) == (False, False)
+
+
+def test_hashes_are_salted(hasher):
+    assert hasher.hash('secret') != hasher.hash('secret')
+
+
+def test_changed_cost_asks_for_rehash(hasher):
+    stored = hasher.hash('secret')
+    stronger = PasswordHasher(n=2 ** 5, r=1, p=1, workers=1)
+    assert stronger.verify('secret', stored) == (True, True)
+
+
+def test_legacy_plaintext_password_asks_for_rehash(hasher):
+    assert hasher.verify('secret', 'secret') == (True, True)
+    assert hasher.verify('wrong', 'secret') == (False, True)
+
+
+def test_unknown_user_is_rejected(hasher):
+    assert hasher.verify('secret', None) == (False, False)
+
+
+@pytest.mark.parametrize('stored', [
+    'scrypt$16$1$1$c2FsdA',
+    'scrypt$16$1$1$c2FsdA$aGFzaA$extra',
+    'scrypt$x$1$1$c2FsdA$aGFzaA',
+    'scrypt$16$1$1$@@@$aGFzaA',
+])
+def test_malformed_hash_is_rejected(hasher, stored):
+    assert hasher.verify('secret', stored) == (False, False)
+
+
+def test_full_queue_is_rejected():
+    hasher = PasswordHasher(n=2 ** 4, r=1, p=1, workers=1, max_pending=1)
+    hasher._get_executor()
+    hasher._slots.acquire()
+    with pytest.raises(PasswordHasherBusy):
+        hasher.hash('secret')
@@ -0,0 +1,59 @@
+import pytest
+
+from app.services import db_service
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+@pytest.fixture
+def statements(monkeypatch):
+    """
+    Запросы, которые выполнил бы `_save_adventure_rows`: (имя, параметры или строки).
+    """
+    executed = []
+    monkeypatch.setattr(db_service, 'run', lambda cursor, query, params: executed.append((query.name, params)))
+    monkeypatch.setattr(db_service, 'run_values',
+                        lambda cursor, name, sql, rows, **kwargs: executed.append((name, rows)))
+    return executed
+
+
+def save(rows, current):
+    return db_service._save_adventure_rows(FakeCursor(current), 'npcs', 7, rows)
+
+
+def test_unchanged_rows_run_no_writes(statements):
+    changes = save([{'id': 1, 'name': 'Lich', 'description': 'Old'}], [(1, 'Lich', 'Old')])
+    assert changes == {'inserted': 0, 'updated': 0, 'deleted': 0}
+    assert [name for name, _ in statements] == ['adventure_npcs']
+
+
+@pytest.mark.parametrize('form, stored', [('', None), (None, ''), ('', '')])
+def test_empty_and_null_descriptions_are_equal(statements, form, stored):
+    changes = save([{'id': 1, 'name': 'Lich', 'description': form}], [(1, 'Lich', stored)])
+    assert changes['updated'] == 0
+
+
+def test_diff_inserts_updates_and_deletes(statements):
+    changes = save(
+        [{'id': 1, 'name': 'Lich', 'description': 'Older'},
+         {'id': 2, 'name': 'Ghoul', 'description': 'Hungry'},
+         {'id': None, 'name': 'Bat', 'description': ''}],
+        [(1, 'Lich', 'Old'), (2, 'Ghoul', 'Hungry'), (3, 'Rat', None)]
+    )
+    assert changes == {'inserted': 1, 'updated': 1, 'deleted': 1}
+    assert statements[1:] == [
+        ('delete_adventure_npcs', (7, [3])),
+        ('update_adventure_npcs', [(1, 7, 'Lich', 'Older')]),
+        ('insert_npcs', [(7, 'Bat', None)]),
+    ]
+
+
+def test_foreign_row_is_rejected(statements):
+    with pytest.raises(ValueError, match='npcs 9 does not belong to adventure 7'):
+        save([{'id': 9, 'name': 'Lich'}], [(1, 'Lich', None)])
@@ -0,0 +1,13 @@
+"""
+Точка входа для продакшн-запуска под gunicorn:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Число процессов, потоков, keepalive и таймауты задаются в Config
+(переменные окружения WSGI_*). Плавная перезагрузка без потери запросов:
+`kill -HUP <pid мастера>`. Для разработки по-прежнему используется run.py.
+"""
+from app import create_app
+
+
+app = create_app()